@@ -57,14 +57,55 @@ class TagSet(namedtuple('TagSet', 'add remove blocked_by blocks if_present')):
                                                blocks or set(),
                                                if_present or set())
 
+class Generation(namedtuple('Generation', 'phu extensions structure')):
+    """
+    Generation(phu, extensions, structure)
+
+    Named tuple of counters returned by `DataProvider.generation`. Each one
+    is increased whenever the corresponding part of the dataset is modified
+    through the provider's interface, which lets `AstroData` know when the
+    values it has cached (eg. the tag set) need to be recomputed.
+
+    Attributes
+    ----------
+    phu : int
+        Changes to the primary header
+    extensions : int
+        Changes to the extension headers
+    structure : int
+        Extensions added to, or removed from, the dataset
+    """
+    pass
+
+class DescriptorCacheInfo(namedtuple('DescriptorCacheInfo', 'hits misses currsize')):
+    """
+    DescriptorCacheInfo(hits, misses, currsize)
+
+    Named tuple returned by `AstroData.descriptor_cache_info`.
+
+    Attributes
+    -----------
+    hits : int
+        Number of descriptor calls answered from the cache
+    misses : int
+        Number of descriptor calls that had to be computed
+    currsize : int
+        Number of results currently held in the cache
+    """
+    pass
+
 def astro_data_descriptor(fn):
     """
     Decorator that will mark a class method as an AstroData descriptor.
     Useful to produce list of descriptors, for example.
 
     If used in combination with other decorators, this one **must** be the
-    one on the top (ie. the last one applying). It doesn't modify the
-    method in any other way.
+    one on the top (ie. the last one applying).
+
+    The wrapper returns the result of the method unchanged, unless the
+    instance has the descriptor cache turned on (see
+    `AstroData.enable_descriptor_cache`), in which case the results are
+    memoized, keyed on the descriptor name and arguments.
 
     Args
     -----
@@ -73,10 +114,17 @@ def astro_data_descriptor(fn):
 
     Returns
     --------
-    The tagged method (not a wrapper)
+    A wrapper function
     """
-    fn.descriptor_method = True
-    return fn
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        cache = self.__dict__.get('_descriptor_cache')
+        if cache is None:
+            return fn(self, *args, **kwargs)
+        return cache.call(self, fn, args, kwargs)
+
+    wrapper.descriptor_method = True
+    return wrapper
 
 # Ensures descriptors coded to return a list (one value per extension)
 # only return a value if sent a slice with a single extension
@@ -205,6 +253,20 @@ class DataProvider(with_metaclass(ABCMeta, object)):
         """
         return False
 
+    @property
+    def generation(self):
+        """
+        A `Generation` tuple of counters that change whenever the metadata
+        or the structure of the dataset are modified. Providers that can't
+        track these changes return `None`, which disables any caching based
+        on it.
+
+        Returns
+        --------
+        A `Generation` instance, or `None`
+        """
+        return None
+
     @abstractmethod
     def is_settable(self, attribute):
         """
@@ -459,7 +521,68 @@ class DataProvider(with_metaclass(ABCMeta, object)):
 #         return cls
 #     return decorator
 
-class AstroData(object):
+class _DescriptorCache(object):
+    """
+    Per-instance store of descriptor results. The cached values are only
+    valid for a given `Generation` of the data provider: any change to the
+    headers, or to the structure of the dataset, empties the cache.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._generation = None
+
+    def call(self, ad, fn, args, kwargs):
+        generation = ad._dataprov.generation
+        if generation is None:
+            # Changes can't be tracked, so nothing can be cached
+            self.misses += 1
+            return fn(ad, *args, **kwargs)
+        if generation != self._generation:
+            self._results.clear()
+            self._generation = generation
+
+        try:
+            key = (fn.__name__, args, frozenset(kwargs.items()))
+            hash(key)
+        except TypeError:
+            # Unhashable arguments
+            self.misses += 1
+            return fn(ad, *args, **kwargs)
+
+        try:
+            ret = self._results[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            ret = fn(ad, *args, **kwargs)
+            # Exceptions are not cached, but the generation might have moved
+            # if the descriptor itself modified the headers
+            if ad._dataprov.generation == self._generation:
+                self._results[key] = ret
+        # Don't let the caller modify the cached lists
+        return list(ret) if isinstance(ret, list) else ret
+
+    def clear(self):
+        self._results.clear()
+
+    def info(self):
+        return DescriptorCacheInfo(self.hits, self.misses, len(self._results))
+
+class AstroDataMeta(type):
+    """
+    Metaclass for `AstroData`. When a new class is created, it collects the
+    methods that have been decorated as tag methods (including the inherited
+    ones), so that computing the tag set of an instance doesn't need to
+    inspect the class every time.
+    """
+    def __init__(cls, name, bases, namespace):
+        super(AstroDataMeta, cls).__init__(name, bases, namespace)
+        cls._tag_methods = tuple(method for (mname, method) in
+                                 inspect.getmembers(cls, lambda x: hasattr(x, 'tag_method')))
+
+class AstroData(with_metaclass(AstroDataMeta, object)):
     """
     AstroData(provider)
 
@@ -480,6 +603,9 @@ class AstroData(object):
             raise ValueError("AstroData is initialized with a DataProvider object. You may want to use ad.open('...') instead")
         self._dataprov = provider
         self._processing_tags = False
+        self._tags_cache = None
+        self._tags_generation = None
+        self._descriptor_cache = None
 
     def __deepcopy__(self, memo):
         """
@@ -515,14 +641,10 @@ class AstroData(object):
             self._processing_tags = True
             try:
                 results = []
-                # Calling inspect.getmembers on `self` would trigger all the properties (tags,
-                # phu, hdr, etc.), and that's undesirable. To prevent that, we'll inspect the
-                # *class*. But that returns us unbound methods. We use `method.__get__(self)` to
-                # get a bound version.
-                #
-                # It's a bit of a roundabout way to get to what we want, but it's better than
-                # the option...
-                for mname, method in inspect.getmembers(self.__class__, lambda x: hasattr(x, 'tag_method')):
+                # The tag methods are collected from the *class* when it is created (see
+                # `AstroDataMeta`), which gives us unbound methods. We use `method.__get__(self)`
+                # to get a bound version.
+                for method in self.__class__._tag_methods:
                     ts = method.__get__(self)()
                     plus, minus, blocked_by, blocks, if_present = ts
                     if plus or minus or blocks:
@@ -561,12 +683,75 @@ class AstroData(object):
     def tags(self):
         """
         A set of strings that represent the tags defining this instance
+
+        The tag set is computed only once, and cached until the PHU or the
+        structure of the dataset (the number of extensions) are modified
+        """
+        generation = self._dataprov.generation
+        if generation is None:
+            return self.__process_tags()
+
+        key = (generation.phu, generation.structure)
+        if self._tags_cache is None or self._tags_generation != key:
+            tags = self.__process_tags()
+            if self._processing_tags:
+                # Tags requested while computing the tags; don't cache this
+                return tags
+            self._tags_cache = frozenset(tags)
+            self._tags_generation = key
+        return set(self._tags_cache)
+
+    def enable_descriptor_cache(self, enabled=True):
         """
-        return self.__process_tags()
+        Turns the memoization of descriptor results on or off for this
+        instance. Slices taken from it inherit the setting (but each one
+        keeps its own cache).
+
+        The cached results are dropped whenever a keyword is set or removed
+        through `phu` or `hdr`, or extensions are added or removed. Headers
+        modified directly through the `astropy.io.fits.Header` objects (eg.
+        `ad.header[0]`) are *not* detected; call `clear_descriptor_cache`
+        after doing that.
+
+        Args
+        -----
+        enabled : bool
+            Whether to cache the descriptor results
+        """
+        if not enabled:
+            self._descriptor_cache = None
+        elif self._descriptor_cache is None:
+            self._descriptor_cache = _DescriptorCache()
+
+    def clear_descriptor_cache(self):
+        """
+        Empties the descriptor cache of this instance, if it's enabled. The
+        hit/miss counters are kept.
+        """
+        if self._descriptor_cache is not None:
+            self._descriptor_cache.clear()
+
+    def descriptor_cache_info(self):
+        """
+        Statistics about the descriptor cache of this instance.
+
+        Returns
+        --------
+        A `DescriptorCacheInfo` instance, or `None` if the cache is not enabled
+        """
+        if self._descriptor_cache is None:
+            return None
+        return self._descriptor_cache.info()
+
+    def _new_slice(self, provider):
+        ad = self.__class__(provider)
+        if self._descriptor_cache is not None:
+            ad.enable_descriptor_cache()
+        return ad
 
     def __iter__(self):
         for single in self._dataprov:
-            yield self.__class__(single)
+            yield self._new_slice(single)
 
     def __getitem__(self, slicing):
         """
@@ -595,7 +780,7 @@ class AstroData(object):
         >>> single = ad[0]
         >>> multiple = ad[:5]
         """
-        return self.__class__(self._dataprov[slicing])
+        return self._new_slice(self._dataprov[slicing])
 
     def __delitem__(self, idx):
         """
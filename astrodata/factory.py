@@ -1,6 +1,8 @@
 from builtins import object
 from future.builtins import str
 
+from importlib import import_module
+
 from .core import AstroDataError
 from .fits import FitsLoader
 from astropy.io.fits import HDUList, PrimaryHDU, ImageHDU, Header, DELAYED
@@ -8,6 +10,7 @@ from astropy.io.fits import HDUList, PrimaryHDU, ImageHDU, Header, DELAYED
 class AstroDataFactory(object):
     def __init__(self):
         self._registry = set()
+        self._pending = []
 
     def addClass(self, cls):
         """
@@ -18,6 +21,21 @@ class AstroDataFactory(object):
             raise AttributeError("Class '{}' has no '_matches_data' method".format(cls.__name__))
         self._registry.add(cls)
 
+    def addLazyModule(self, name):
+        """
+        Add a module to be imported the first time the factory has to find a
+        class for some data. Importing the module is expected to register its
+        classes with addClass. This way, packages with many AstroData classes
+        (e.g., one per instrument) don't need to import all of them up front.
+        """
+        if name not in self._pending:
+            self._pending.append(name)
+
+    def _importPending(self):
+        while self._pending:
+            import_module(self._pending[0])
+            self._pending.pop(0)
+
     def _getAstroData(self, data_provider):
         """
         Searches the internal registry for an AstroData derivative matching
@@ -26,6 +44,7 @@ class AstroDataFactory(object):
         Returns an instantiated object, or raises AstroDataError if it was
         not possible to find a match.
         """
+        self._importPending()
         candidates = [x for x in self._registry if x._matches_data(data_provider)]
 
         # For every candidate in the list, remove the ones that are base classes
@@ -43,17 +62,25 @@ class AstroDataFactory(object):
 
         return final_candidates[0](data_provider)
 
-    def getAstroData(self, source):
+    def getAstroData(self, source, headers_only=False):
         """
         Takes either a string (with the path to a file) or an HDUList as input, and
         tries to return an AstroData instance.
 
         It will raise exceptions if the file is not found, or if there is no match
         for the HDUList, among the registered AstroData classes.
+
+        If `headers_only` is True (only used when `source` is a path), just
+        the headers are read from the file. The tags and the descriptors
+        that depend only on the headers work as usual, but any access to
+        the pixel data (or the tables, or individual extensions) raises an
+        AstroDataError. This is faster for the many tools that need only
+        the metadata.
         """
 
         if isinstance(source, (str, bytes)):
-            return self._getAstroData(FitsLoader.from_path(source))
+            return self._getAstroData(FitsLoader.from_path(source,
+                                                           headers_only=headers_only))
         else:
             # NOTE: This should be tested against the appropriate class.
             return self._getAstroData(FitsLoader.from_hdulist(source))
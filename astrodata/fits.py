@@ -4,7 +4,9 @@ from builtins import object
 from abc import abstractmethod
 from copy import deepcopy
 from collections import namedtuple, OrderedDict
+import io
 import os
+import gzip
 from functools import partial, wraps
 import logging
 import warnings
@@ -15,7 +17,8 @@ try:
 except ImportError:
     from itertools import izip_longest as zip_longest
 
-from .core import AstroData, DataProvider, astro_data_descriptor
+from .core import AstroData, AstroDataError, DataProvider, Generation
+from .core import astro_data_descriptor
 
 from astropy.io import fits
 from astropy.io.fits import HDUList, Header, DELAYED
@@ -25,7 +28,8 @@ from astropy.io.fits.hdu.table import _TableBaseHDU
 # NDDataRef is still not in the stable astropy, but this should be the one
 # we use in the future...
 from astropy.nddata import NDData, NDDataRef as NDDataObject
-from astropy.nddata import StdDevUncertainty
+from astropy.nddata import NDUncertainty
+from astropy.nddata.nduncertainty import IncompatibleUncertaintiesException
 from astropy.table import Table
 import numpy as np
 
@@ -55,13 +59,20 @@ class KeywordCallableWrapper(object):
         return wrapper
 
 class FitsKeywordManipulator(object):
-    def __init__(self, headers, on_extensions=False, single=False):
+    def __init__(self, headers, on_extensions=False, single=False, on_change=None):
+        # on_change is called with no arguments every time that a keyword is
+        # modified or removed through this manipulator
         self.__dict__.update({
             "_headers": headers,
             "_single": single,
-            "_on_ext": on_extensions
+            "_on_ext": on_extensions,
+            "_on_change": on_change
         })
 
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
+
     def _ret_ext(self, values):
         if self._single and len(self._headers) == 1:
             return values[0]
@@ -92,6 +103,7 @@ class FitsKeywordManipulator(object):
     def set(self, key, value=None, comment=None):
         for header in self._headers:
             header.set(key, value=value, comment=comment)
+        self._changed()
 
     def __getitem__(self, key):
         if self._on_ext:
@@ -145,6 +157,7 @@ class FitsKeywordManipulator(object):
                 del self._headers[0][key]
             except KeyError:
                 raise KeyError("'{}' is not on the PHU".format(key))
+        self._changed()
 
     def get_comment(self, key):
         if self._on_ext:
@@ -321,18 +334,248 @@ def normalize_indices(slc, nitems):
 
     return indices, multiple
 
-class StdDevAsVariance(object):
+class VarianceUncertainty(NDUncertainty):
+    """
+    Uncertainty stored as a variance, which is what we keep in the VAR
+    extensions. Storing it as such (instead of the standard deviation) means
+    that no square roots or squares need to be computed when reading the
+    files, accessing `.variance`, or writing them back.
+
+    Propagation through the NDData arithmetic assumes first order gaussian
+    errors, like `StdDevUncertainty`. Other uncertainties are accepted as
+    operands as long as they can be converted into a variance.
+    """
+    @property
+    def uncertainty_type(self):
+        return 'var'
+
+    @property
+    def supports_correlated(self):
+        return True
+
     def as_variance(self):
-        if self.array is not None:
-            return self.array ** 2
-        else:
-            return None
+        return self.array
+
+    def _data_unit_to_uncertainty_unit(self, value):
+        return value ** 2
+
+    def _convert_uncertainty(self, other_uncert):
+        if isinstance(other_uncert, VarianceUncertainty):
+            return other_uncert
+        variance = variance_of(other_uncert)
+        if variance is None and getattr(other_uncert, 'array', None) is not None:
+            raise IncompatibleUncertaintiesException
+        converted = VarianceUncertainty(variance, copy=False)
+        converted._parent_data = _parent_data(other_uncert)
+        return converted
+
+    def _variance_pair(self, other_uncert):
+        this, other = self.array, other_uncert.array
+        if this is None:
+            this = 0.
+        if other is None:
+            other = 0.
+        return this, other
+
+    def _covariance(self, other_uncert, correlation):
+        if (isinstance(correlation, np.ndarray) or correlation != 0) and \
+                self.array is not None and other_uncert.array is not None:
+            return correlation * np.sqrt(self.array * other_uncert.array)
+        return 0.
+
+    def _propagate_add(self, other_uncert, result_data, correlation):
+        this, other = self._variance_pair(other_uncert)
+        return this + other + 2 * self._covariance(other_uncert, correlation)
+
+    def _propagate_subtract(self, other_uncert, result_data, correlation):
+        this, other = self._variance_pair(other_uncert)
+        return this + other - 2 * self._covariance(other_uncert, correlation)
+
+    def _propagate_multiply(self, other_uncert, result_data, correlation):
+        # var(ab) = b^2 var(a) + a^2 var(b) + 2ab cov(a, b)
+        this, other = self._variance_pair(other_uncert)
+        a, b = _parent_data(self), _parent_data(other_uncert)
+        return (b * b * this + a * a * other +
+                2 * a * b * self._covariance(other_uncert, correlation))
+
+    def _propagate_divide(self, other_uncert, result_data, correlation):
+        # var(a/b) = (var(a) + (a/b)^2 var(b) - 2(a/b) cov(a, b)) / b^2
+        this, other = self._variance_pair(other_uncert)
+        a, b = _parent_data(self), _parent_data(other_uncert)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = a / b
+            return ((this + ratio * ratio * other -
+                     2 * ratio * self._covariance(other_uncert, correlation)) /
+                    (b * b))
+
+def _parent_data(uncertainty):
+    data = getattr(uncertainty, '_parent_data', None)
+    if data is None:
+        data = uncertainty.parent_nddata.data
+    return np.asanyarray(getattr(data, 'value', data))
+
+def variance_of(uncertainty):
+    """
+    Returns the variance corresponding to an uncertainty object, or `None`
+    if there is no uncertainty. The array of a `VarianceUncertainty` is
+    returned as is (not a copy).
+    """
+    if uncertainty is None or uncertainty.array is None:
+        return None
+    uncertainty_type = uncertainty.uncertainty_type
+    if uncertainty_type == 'var':
+        return uncertainty.array
+    elif uncertainty_type == 'std':
+        return uncertainty.array ** 2
+    elif uncertainty_type == 'ivar':
+        return 1. / uncertainty.array
+    return None
 
 def new_variance_uncertainty_instance(array):
-    obj = StdDevUncertainty(np.sqrt(array))
-    cls = obj.__class__
-    obj.__class__ = cls.__class__(cls.__name__ + "WithAsVariance", (cls, StdDevAsVariance), {})
-    return obj
+    """
+    Wraps a variance array in a `VarianceUncertainty`, without copying it
+    """
+    return VarianceUncertainty(array, copy=False)
+
+def _operand_planes(operand):
+    """
+    Returns the (data, variance, mask) of an arithmetic operand, or `None`
+    if it's of a type that the in-place kernels don't handle. Python
+    scalars are returned as they are, so that they don't upcast the data.
+    """
+    if isinstance(operand, (int, float, np.number)) and not isinstance(operand, bool):
+        return operand, None, None
+    elif type(operand) is np.ndarray:
+        return operand, None, None
+    elif isinstance(operand, NDData):
+        if operand.unit is not None or getattr(operand.data, 'unit', None) is not None:
+            return None
+        uncertainty = operand.uncertainty
+        variance = variance_of(uncertainty)
+        if variance is None and uncertainty is not None and uncertainty.array is not None:
+            return None
+        return operand.data, variance, operand.mask
+    return None
+
+def _inplace_nddata_op(name, nd, operand):
+    """
+    Performs an arithmetic operation on an `NDData` object in place, updating
+    its data, variance and mask arrays with `out=` ufuncs, instead of
+    allocating a new object like the `NDData` arithmetic does. The results
+    are the same as for `NDDataRef.<name>(operand, handle_mask=np.bitwise_or,
+    handle_meta='first_found')`, with uncorrelated errors.
+
+    Nothing is done when the operation can't be performed in place (eg. the
+    result would need a different type or shape, or the operand shares
+    memory with `nd`), and the caller has to fall back to the `NDData`
+    arithmetic.
+
+    Args
+    -----
+    name : str
+        One of 'add', 'subtract', 'multiply', 'divide'
+
+    nd : NDData
+        The left operand, which is modified
+
+    operand : number, ndarray, or NDData
+        The right operand
+
+    Returns
+    --------
+    A boolean, True if the operation was done
+    """
+    planes = _operand_planes(operand)
+    if planes is None:
+        return False
+    b, vb, mb = planes
+    a, ma = nd.data, nd.mask
+    if type(a) not in (np.ndarray, np.memmap) or not a.flags.writeable or nd.unit is not None:
+        return False
+    if nd.uncertainty is None or nd.uncertainty.array is None:
+        va = None
+    elif isinstance(nd.uncertainty, VarianceUncertainty):
+        va = nd.uncertainty.array
+    else:
+        return False
+
+    # The result must fit in the existing arrays
+    mine = [x for x in (a, va, ma) if isinstance(x, np.ndarray)]
+    theirs = [x for x in (b, vb, mb) if isinstance(x, np.ndarray)]
+    if any(np.may_share_memory(x, y) for x in mine for y in theirs):
+        return False
+    if any(np.broadcast(x, a).shape != a.shape for x in theirs):
+        return False
+    if np.result_type(a, b) != a.dtype or (name == 'divide' and a.dtype.kind not in 'fc'):
+        return False
+    if va is not None:
+        if va.shape != a.shape or not va.flags.writeable:
+            return False
+        if np.result_type(va, *[x for x in (b, vb) if x is not None]) != va.dtype:
+            return False
+    if ma is not None and mb is not None:
+        if ma.shape != a.shape or not ma.flags.writeable or \
+                np.result_type(ma, mb) != ma.dtype:
+            return False
+
+    # Variance first, as the propagation may need the original data
+    variance = va
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if name in ('add', 'subtract'):
+            if vb is not None:
+                if va is None:
+                    variance = np.array(np.broadcast_to(vb, a.shape))
+                else:
+                    np.add(va, vb, out=va)
+        elif name == 'multiply':
+            # var(ab) = b^2 var(a) + a^2 var(b)
+            if vb is not None:
+                other = np.multiply(a, a)
+                other *= vb
+            if va is not None:
+                np.multiply(va, b, out=va)
+                np.multiply(va, b, out=va)
+            if vb is not None:
+                if va is None:
+                    variance = other.astype(np.result_type(a, vb), copy=False)
+                else:
+                    va += other
+        elif name == 'divide':
+            # var(a/b) = (var(a) + (a/b)^2 var(b)) / b^2
+            if vb is not None:
+                other = np.divide(a, b)
+                other *= other
+                other *= vb
+            if va is not None:
+                if vb is not None:
+                    va += other
+                np.divide(va, b, out=va)
+                np.divide(va, b, out=va)
+            elif vb is not None:
+                variance = other
+                variance /= b
+                variance /= b
+        else:
+            raise ValueError("Unsupported operation: {}".format(name))
+
+    _INPLACE_UFUNCS[name](a, b, out=a)
+
+    if variance is not va:
+        nd.uncertainty = new_variance_uncertainty_instance(variance)
+    if mb is not None:
+        if ma is None:
+            nd.mask = np.array(np.broadcast_to(mb, a.shape))
+        else:
+            np.bitwise_or(ma, mb, out=ma)
+
+    return True
+
+_INPLACE_UFUNCS = {
+    'add': np.add,
+    'subtract': np.subtract,
+    'multiply': np.multiply,
+    'divide': np.true_divide,
+}
 
 class FitsProviderProxy(DataProvider):
     # TODO: CAVEAT. Not all methods are intercepted. Some, like "info", may not make
@@ -357,6 +600,10 @@ class FitsProviderProxy(DataProvider):
     def is_single(self):
         return self._single
 
+    @property
+    def generation(self):
+        return self._provider.generation
+
     def __deepcopy__(self, memo):
         return self._provider._clone(mapping=self._mapping)
 
@@ -524,14 +771,10 @@ class FitsProviderProxy(DataProvider):
 
     @property
     def variance(self):
-        def variance_for(un):
-            if un is not None:
-                return un.array**2
-
         if self.is_single:
-            return variance_for(self.uncertainty)
+            return variance_of(self.uncertainty)
         else:
-            return [variance_for(un) for un in self.uncertainty]
+            return [variance_of(un) for un in self.uncertainty]
 
     @variance.setter
     def variance(self, value):
@@ -552,7 +795,8 @@ class FitsProviderProxy(DataProvider):
 
     @property
     def ext_manipulator(self):
-        return FitsKeywordManipulator(self.header[1:], on_extensions=True, single=self.is_single)
+        return FitsKeywordManipulator(self.header[1:], on_extensions=True, single=self.is_single,
+                                      on_change=partial(self._provider._touch, 'extensions'))
 
     def set_name(self, ext, name):
         self._provider.set_name(self._mapping[ext], name)
@@ -616,6 +860,8 @@ class FitsProvider(DataProvider):
             '_tables': {},
             '_exposed': set(),
             '_resetting': False,
+            '_headers_only': False,
+            '_changes': {'phu': 0, 'extensions': 0, 'structure': 0},
             '_fixed_settable': set([
                 'data',
                 'uncertainty',
@@ -630,7 +876,7 @@ class FitsProvider(DataProvider):
         nfp = FitsProvider()
         to_copy = ('_sliced', '_single', '_header', '_nddata', '_hdulist',
                    '_path', '_orig_filename', '_tables', '_exposed',
-                   '_resetting')
+                   '_resetting', '_headers_only')
         for attr in to_copy:
             nfp.__dict__[attr] = deepcopy(self.__dict__[attr])
 
@@ -653,6 +899,19 @@ class FitsProvider(DataProvider):
     def is_settable(self, attr):
         return attr in self._fixed_settable or attr.isupper()
 
+    @property
+    def generation(self):
+        return Generation(**self._changes)
+
+    def _touch(self, what):
+        """
+        Records a modification of the 'phu', the 'extensions' headers, or the
+        'structure' of the dataset. Changes made while populating the object
+        from a file are not modifications, and are not recorded.
+        """
+        if not self._resetting:
+            self._changes[what] += 1
+
     @force_load
     def _getattr_impl(self, attribute, nds):
         # Exposed objects are part of the normal object interface. We may have
@@ -703,9 +962,19 @@ class FitsProvider(DataProvider):
             del self._tables[attribute]
         except KeyError:
             raise AttributeError("'{}' is not a global table for this instance".format(attribute))
+        self._touch('structure')
 
     @force_load
-    def _oper(self, operator, operand, indices=None):
+    def _oper(self, operator, operand, indices=None, inplace=None):
+        """
+        Applies `operator(nddata, operand)` to the selected extensions. If
+        `inplace` is given, it is tried first as `inplace(nddata, operand)`,
+        which must return True if it was able to modify `nddata` in place.
+        """
+        def apply(n, other):
+            if inplace is None or not inplace(self._nddata[n], other):
+                self._set_nddata(n, operator(self._nddata[n], other))
+
         if indices is None:
             indices = tuple(range(len(self._nddata)))
         if isinstance(operand, AstroData):
@@ -713,21 +982,24 @@ class FitsProvider(DataProvider):
                 raise ValueError("Operands are not the same size")
             for n in indices:
                 try:
-                    self._set_nddata(n, operator(self._nddata[n], operand.nddata[n]))
+                    other = operand.nddata[n]
                 except TypeError:
                     # This may happen if operand is a sliced, single AstroData object
-                    self._set_nddata(n, operator(self._nddata[n], operand.nddata))
+                    other = operand.nddata
+                apply(n, other)
             op_table = operand.table()
             ltab, rtab = set(self._tables), set(op_table)
             for tab in (rtab - ltab):
                 self._tables[tab] = op_table[tab]
         else:
             for n in indices:
-                self._set_nddata(n, operator(self._nddata[n], operand))
+                apply(n, operand)
 
     def _standard_nddata_op(self, fn, operand, indices=None):
+        name = fn.__name__
+        inplace = partial(_inplace_nddata_op, name) if name in _INPLACE_UFUNCS else None
         return self._oper(partial(fn, handle_mask=np.bitwise_or, handle_meta='first_found'),
-                          operand, indices)
+                          operand, indices, inplace=inplace)
 
     def __iadd__(self, operand):
         self._standard_nddata_op(NDDataObject.add, operand)
@@ -791,7 +1063,7 @@ class FitsProvider(DataProvider):
             header = obj.meta['header']
             other_objects = []
             uncer = obj.uncertainty
-            fixed = (('variance', None if uncer is None else uncer.as_variance()), ('mask', obj.mask))
+            fixed = (('variance', variance_of(uncer)), ('mask', obj.mask))
             for name, other in fixed + tuple(sorted(obj.meta['other'].items())):
                 if other is not None:
                     if isinstance(other, Table):
@@ -865,6 +1137,7 @@ class FitsProvider(DataProvider):
 
         del self._header[idx + 1]
         del self._nddata[idx]
+        self._touch('structure')
 
     def __len__(self):
 #        self._lazy_populate_object()
@@ -1074,6 +1347,10 @@ class FitsProvider(DataProvider):
 
     def _lazy_populate_object(self):
         prev_reset = self._resetting
+        if self._nddata is None and self._headers_only:
+            raise AstroDataError("{} was opened with headers_only=True, its "
+                                 "pixel data are not available".format(
+                                     self.filename))
         if self._nddata is None:
             self._resetting = True
             try:
@@ -1091,6 +1368,15 @@ class FitsProvider(DataProvider):
             finally:
                 self._resetting = prev_reset
 
+    @property
+    def is_loaded(self):
+        """
+        True if the pixel data have been read (or created) in memory. False
+        if this object has been opened from a file and its pixel planes are
+        still waiting to be lazily loaded.
+        """
+        return self._nddata is not None
+
     @property
     @force_load
     def nddata(self):
@@ -1102,12 +1388,13 @@ class FitsProvider(DataProvider):
 
     @property
     def phu_manipulator(self):
-        return FitsKeywordManipulator(self.header[:1])
+        return FitsKeywordManipulator(self.header[:1], on_change=partial(self._touch, 'phu'))
 
     @property
     def ext_manipulator(self):
         assert len(self.header) > 1, "There are no SCI extensions"
-        return FitsKeywordManipulator(self.header[1:], on_extensions=True)
+        return FitsKeywordManipulator(self.header[1:], on_extensions=True,
+                                      on_change=partial(self._touch, 'extensions'))
 
     @force_load
     def set_name(self, ext, name):
@@ -1125,7 +1412,7 @@ class FitsProvider(DataProvider):
 
             hlst.append(new_imagehdu(ext.data, header))
             if ext.uncertainty is not None:
-                hlst.append(new_imagehdu(ext.uncertainty.array ** 2, header, 'VAR'))
+                hlst.append(new_imagehdu(variance_of(ext.uncertainty), header, 'VAR'))
             if ext.mask is not None:
                 hlst.append(new_imagehdu(ext.mask, header, 'DQ'))
 
@@ -1183,11 +1470,7 @@ class FitsProvider(DataProvider):
     @property
     @force_load
     def variance(self):
-        def variance_for(nd):
-            if nd.uncertainty is not None:
-                return nd.uncertainty.array**2
-
-        return [variance_for(nd) for nd in self._nddata]
+        return [variance_of(nd.uncertainty) for nd in self._nddata]
 
     @variance.setter
     def variance(self, value):
@@ -1309,6 +1592,7 @@ class FitsProvider(DataProvider):
             if reset_ver:
                 self._reset_ver(new_nddata)
             self._nddata.append(new_nddata)
+            self._touch('structure')
         else:
             raise ValueError("Arbitrary image extensions can only be added in association to a '{}'".format(def_ext))
 
@@ -1328,6 +1612,7 @@ class FitsProvider(DataProvider):
             self.__dict__[hname] = tb
             self._tables[hname] = tb
             self._exposed.add(hname)
+            self._touch('structure')
         else:
             setattr(add_to, hname, tb)
             self._add_to_other(add_to, hname, tb, tb.meta['header'])
@@ -1431,6 +1716,65 @@ def fits_ext_comp_key(ext):
 
     return ret
 
+# Size of a FITS block, in bytes
+FITS_BLOCK = 2880
+
+_xtension_classes = {
+    'IMAGE': ImageHDU,
+    'BINTABLE': BinTableHDU,
+    'TABLE': fits.TableHDU
+}
+
+def _data_size(header):
+    """
+    Size, in bytes and padded to whole FITS blocks, of the data that follow
+    `header` in a file.
+    """
+    naxis = header.get('NAXIS', 0)
+    if naxis == 0:
+        return 0
+    dims = [header.get('NAXIS{}'.format(n), 0) for n in range(1, naxis + 1)]
+    if dims[0] == 0 and header.get('GROUPS'):
+        # Random groups
+        dims = dims[1:]
+    npix = 1
+    for dim in dims:
+        npix *= dim
+    size = (abs(header['BITPIX']) // 8 * header.get('GCOUNT', 1) *
+            (header.get('PCOUNT', 0) + npix))
+    return -(-size // FITS_BLOCK) * FITS_BLOCK
+
+def read_headers(path):
+    """
+    Returns the headers of the HDUs in a FITS file (optionally gzipped),
+    reading the header blocks and seeking over the data.
+
+    Returns None for files with tile-compressed images, whose headers on disk
+    are not the ones astropy presents.
+    """
+    opener = gzip.open if path.endswith('.gz') else io.open
+    headers = []
+    with opener(path, 'rb') as fd:
+        while True:
+            try:
+                header = Header.fromfile(fd)
+            except EOFError:
+                break
+            except (IOError, OSError, ValueError):
+                # Trailing garbage after the last HDU is ignored, as astropy
+                # does
+                if headers:
+                    break
+                raise
+            if header.get('ZIMAGE'):
+                return None
+            headers.append(header)
+            fd.seek(_data_size(header), os.SEEK_CUR)
+
+    if not headers:
+        raise IOError("Empty or corrupt FITS file: {}".format(path))
+    return headers
+
 class FitsLoader(object):
     @staticmethod
     def provider_for_hdulist(hdulist):
@@ -1442,7 +1786,7 @@ class FitsLoader(object):
         return FitsProvider()
 
     @staticmethod
-    def _prepare_hdulist(hdulist):
+    def _prepare_hdulist(hdulist, headers_only=False):
         new_list = []
         highest_ver = 0
         recognized = set()
@@ -1475,7 +1819,17 @@ class FitsLoader(object):
         else:
             # Uh-oh, a single image FITS file
             new_list.append(PrimaryHDU(header=hdulist[0].header))
-            image = ImageHDU(header=hdulist[0].header, data=hdulist[0].data)
+            if headers_only:
+                # The cards that astropy adds when given the data
+                header = hdulist[0].header.copy()
+                header.insert(0, ('XTENSION', 'IMAGE', 'Image extension'))
+                naxis = header['NAXIS']
+                last = 'NAXIS{}'.format(naxis) if naxis else 'NAXIS'
+                header.set('PCOUNT', 0, 'number of parameters', after=last)
+                header.set('GCOUNT', 1, 'number of groups', after='PCOUNT')
+                image = ImageHDU(header=header, data=DELAYED)
+            else:
+                image = ImageHDU(header=hdulist[0].header, data=hdulist[0].data)
             for keyw in ('SIMPLE', 'EXTEND'):
                 if keyw in image.header:
                     del image.header[keyw]
@@ -1486,12 +1840,33 @@ class FitsLoader(object):
         return HDUList(sorted(new_list, key=fits_ext_comp_key))
 
     @staticmethod
-    def from_path(path):
-        hdulist = fits.open(path, memmap=True, do_not_scale_image_data=True)
-        hdulist = FitsLoader._prepare_hdulist(hdulist)
+    def _header_hdulist(path):
+        """
+        Returns an HDUList for the file at `path` whose HDUs have headers,
+        but no data.
+        """
+        headers = read_headers(path)
+        if headers is None:
+            # Let astropy make sense of it. The data won't be read anyway
+            return fits.open(path, memmap=True, do_not_scale_image_data=True)
+
+        units = [PrimaryHDU(header=headers[0], data=DELAYED)]
+        for header in headers[1:]:
+            cls = _xtension_classes.get(header.get('XTENSION'), ImageHDU)
+            units.append(cls(header=header, data=DELAYED))
+        return HDUList(units)
+
+    @staticmethod
+    def from_path(path, headers_only=False):
+        if headers_only:
+            hdulist = FitsLoader._header_hdulist(path)
+        else:
+            hdulist = fits.open(path, memmap=True, do_not_scale_image_data=True)
+        hdulist = FitsLoader._prepare_hdulist(hdulist, headers_only=headers_only)
         provider = FitsLoader.provider_for_hdulist(hdulist)
         provider.path = path
         provider._set_headers(hdulist)
+        provider.__dict__['_headers_only'] = headers_only
         # Note: we don't call _reset_members, to allow for lazy loading...
 
         return provider
@@ -1,6 +1,7 @@
 import pytest
 import tempfile
 import os
+from copy import deepcopy
 
 import numpy as np
 
@@ -76,6 +77,30 @@ def test_remove_a_keyword_from_phu():
     del ad.phu['DETECTOR']
     assert 'DETECTOR' not in ad.phu
 
+
+# Tag sets are cached, but must follow changes to the PHU
+def test_tags_follow_phu_changes():
+    ad = from_test_data('GMOS/N20110826S0336.fits')
+    tags = ad.tags
+    assert ad.tags == tags
+    ad.tags.add('FOO')
+    assert 'FOO' not in ad.tags
+    ad.phu['OBSTYPE'] = 'BIAS'
+    assert 'BIAS' in ad.tags
+
+# Cached descriptor values must follow changes to the headers
+def test_descriptor_cache():
+    ad = from_test_data('GMOS/N20110826S0336.fits')
+    assert ad.descriptor_cache_info() is None
+    ad.enable_descriptor_cache()
+    obj = ad.object()
+    assert ad.object() == obj
+    assert ad.descriptor_cache_info().hits == 1
+    ad.phu['OBJECT'] = 'FooBar'
+    assert ad.object() == 'FooBar'
+    ad.enable_descriptor_cache(False)
+    assert ad.descriptor_cache_info() is None
+
 # Access to headers: DEPRECATED METHODS
 # These should fail at some point
 
@@ -108,6 +133,33 @@ def test_do_arith_and_retain_features():
     ad2 = ad * 5
     ad[0].NEW_FEATURE == ad2[0].NEW_FEATURE
 
+# The variance is stored as such, and propagated through the arithmetic
+def test_variance_is_not_converted():
+    ad = from_test_data('GMOS/N20110826S0336.fits')
+    variance = np.full(ad[0].data.shape, 3.0)
+    ad[0].variance = variance
+    assert ad[0].variance is variance
+    ad2 = ad * 2
+    assert np.allclose(ad2[0].variance, 12.0)
+    assert np.allclose(ad2.to_hdulist()['VAR', 1].data, 12.0)
+
+# In-place arithmetic reuses the arrays, and gives the same result as the
+# NDData arithmetic
+def test_inplace_arithmetic():
+    ad = from_test_data('GMOS/N20110826S0336.fits')
+    ad[0].variance = np.full(ad[0].data.shape, 3.0, dtype=ad[0].data.dtype)
+    ad[0].mask = np.zeros(ad[0].data.shape, dtype=np.uint16)
+    other = deepcopy(ad)
+    other[0].mask[0, 0] = 1
+    expected = ad[0].nddata.multiply(other[0].nddata, handle_mask=np.bitwise_or,
+                                     handle_meta='first_found')
+    data = ad[0].data
+    ad.multiply(other)
+    assert ad[0].data is data
+    assert np.allclose(ad[0].data, expected.data)
+    assert np.allclose(ad[0].variance, expected.uncertainty.array)
+    assert ad[0].mask[0, 0] == 1
+
 # Trying to access a missing attribute in the data provider should raise an
 # AttributeError
 def test_raise_attribute_error_when_accessing_missing_extenions():
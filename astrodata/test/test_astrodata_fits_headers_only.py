@@ -0,0 +1,64 @@
+import pytest
+import gzip
+import shutil
+
+import numpy as np
+from astropy.io import fits
+
+import astrodata
+
+def make_mef(path):
+    phu = fits.PrimaryHDU()
+    phu.header['INSTRUME'] = 'TEST'
+    phu.header['OBJECT'] = 'Target'
+    units = [phu]
+    for ver in (1, 2):
+        data = np.arange(12, dtype=np.float32).reshape(3, 4) * ver
+        units.append(fits.ImageHDU(data, name='SCI', ver=ver))
+    table = fits.BinTableHDU.from_columns(
+        [fits.Column('x', 'E', array=np.arange(5.))], name='OBJCAT')
+    units.append(table)
+    fits.HDUList(units).writeto(path)
+    return path
+
+def make_single(path):
+    hdu = fits.PrimaryHDU(np.zeros((10, 7), dtype=np.int16))
+    hdu.header['INSTRUME'] = 'TEST'
+    hdu.writeto(path)
+    return path
+
+def make_gzipped(path):
+    single = make_single(path[:-3])
+    with open(single, 'rb') as src, gzip.open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    return path
+
+@pytest.fixture(params=[('mef.fits', make_mef),
+                        ('single.fits', make_single),
+                        ('single.fits.gz', make_gzipped)])
+def fits_file(request, tmpdir):
+    name, maker = request.param
+    return maker(str(tmpdir.join(name)))
+
+def test_headers_match_the_lazy_path(fits_file):
+    ad = astrodata.open(fits_file)
+    hd = astrodata.open(fits_file, headers_only=True)
+    assert len(hd) == len(ad)
+    assert hd.tags == ad.tags
+    assert hd.instrument() == ad.instrument()
+    for full, header in zip(ad.header, hd.header):
+        assert list(header.items()) == list(full.items())
+
+def test_pixel_data_raise(fits_file):
+    hd = astrodata.open(fits_file, headers_only=True)
+    assert not hd._dataprov.is_loaded
+    with pytest.raises(astrodata.AstroDataError):
+        hd[0].data
+    with pytest.raises(astrodata.AstroDataError):
+        hd.nddata
+
+def test_headers_can_be_modified(fits_file):
+    hd = astrodata.open(fits_file, headers_only=True)
+    hd.phu.set('RAWIQ', 'Any')
+    assert hd.phu.get('RAWIQ') == 'Any'
+    assert hd.hdr.get('EXTNAME') == ['SCI'] * len(hd)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                 adcc_events.py
+# ------------------------------------------------------------------------------
+"""
+Simulates a night of QA metrics reported to the adcc, and measures the cost
+of storing the events and of serving the cmdqueue.json polls.
+
+    $ python benchmarks/adcc_events.py
+    $ python benchmarks/adcc_events.py --pipelines 6 --hours 14 --max-events 5000
+    $ python benchmarks/adcc_events.py --max-events 5000 --events-db night.db
+    $ python benchmarks/adcc_events.py --baseline
+
+Every `--cadence` simulated seconds, each of the `--pipelines` QA pipelines
+reports a metric, and each of the `--dashboards` clients polls for the events
+after the last timestamp it has seen, as the nighttime metrics page does. The
+time spent in EventsManager is reported per hour of the night, so any growth
+with the number of events shows up. --baseline times a plain list store with
+linear scans, as the adcc used to do, for comparison.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_system.adcc.servers.eventsManager import EventsManager
+# ------------------------------------------------------------------------------
+class ListStore(object):
+    """The unindexed event list: O(n) appends and polls."""
+    def __init__(self):
+        self.event_list = []
+        self.event_index = {}
+
+    def append_event(self, event):
+        self.event_list.append(event)
+        ts_list = self.event_index.setdefault(event["timestamp"], [])
+        ts_list.append(self.event_list.index(event))
+
+    def get_list(self, fromtime=None):
+        if not fromtime:
+            return self.event_list
+        for i in range(len(self.event_list)):
+            if self.event_list[i]["timestamp"] > fromtime:
+                return self.event_list[i:]
+        return []
+
+def buildParser():
+    parser = ArgumentParser(description="Simulate a night of adcc events.")
+    parser.add_argument('--hours', type=float, default=12.,
+                        help="Length of the night. Default: 12")
+    parser.add_argument('--pipelines', type=int, default=4,
+                        help="QA pipelines reporting metrics. Default: 4")
+    parser.add_argument('--dashboards', type=int, default=3,
+                        help="Clients polling cmdqueue.json. Default: 3")
+    parser.add_argument('--cadence', type=float, default=2.,
+                        help="Seconds between metrics (and polls). Default: 2")
+    parser.add_argument('--max-events', dest='max_events', type=int,
+                        default=None, help="EventsManager maxlen")
+    parser.add_argument('--events-db', dest='events_db', default=None,
+                        help="EventsManager overflow database")
+    parser.add_argument('--baseline', action='store_true',
+                        help="Time the unindexed list store instead")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def metric(timestamp, pipeline, nevent):
+    return {"msgtype": "qametric",
+            "timestamp": timestamp,
+            "iq": {"fwhm": random.gauss(0.8, 0.1), "elip": random.random() / 10,
+                   "percentile_band": "IQ70", "comment": []},
+            "metadata": {"datalabel": "GN-2017B-Q-1-{}-{:03d}".format(pipeline,
+                                                                      nevent),
+                         "raw_filename": "N20170913S{:04d}.fits".format(nevent),
+                         "filter": "r", "instrument": "GMOS-N"}}
+
+def main(args):
+    random.seed(args.seed)
+    if args.baseline:
+        store = ListStore()
+        label = "list store (baseline)"
+    else:
+        store = EventsManager(maxlen=args.max_events, overflow=args.events_db)
+        label = "EventsManager(maxlen={}, overflow={})".format(args.max_events,
+                                                              args.events_db)
+
+    start = 1500000000.
+    steps_per_hour = int(3600 / args.cadence)
+    last_seen = [start] * args.dashboards
+    nevents = 0
+    total_append = total_poll = 0.
+    print("Simulating {:.1f} h with {} pipelines and {} dashboards: {}".format(
+        args.hours, args.pipelines, args.dashboards, label))
+    print("{:>5} {:>9} {:>12} {:>12} {:>12}".format(
+        "Hour", "Events", "append (ms)", "polls (ms)", "per poll (us)"))
+
+    for hour in range(int(args.hours + 0.5)):
+        t_append = t_poll = 0.
+        for step in range(steps_per_hour):
+            now = start + (hour * steps_per_hour + step) * args.cadence
+            for pipeline in range(args.pipelines):
+                event = metric(now + pipeline * 1e-3, pipeline, nevents)
+                t0 = time.time()
+                store.append_event(event)
+                t_append += time.time() - t0
+                nevents += 1
+
+            for client in range(args.dashboards):
+                t0 = time.time()
+                new = store.get_list(fromtime=last_seen[client])
+                t_poll += time.time() - t0
+                if new:
+                    last_seen[client] = new[-1]["timestamp"]
+
+        npolls = steps_per_hour * args.dashboards
+        total_append += t_append
+        total_poll += t_poll
+        print("{:>5} {:>9} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            hour + 1, nevents, t_append * 1e3, t_poll * 1e3,
+            t_poll / npolls * 1e6))
+
+    print("Total: {} events, {:.3f} s appending, {:.3f} s serving polls".format(
+        nevents, total_append, total_poll))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                              astrodata_open.py
+# ------------------------------------------------------------------------------
+"""
+Compares astrodata.open(path) with astrodata.open(path, headers_only=True)
+for a consumer of metadata only: it opens each file and reads a few PHU and
+extension keywords, and the tags.
+
+    $ python benchmarks/astrodata_open.py
+    $ python benchmarks/astrodata_open.py --files 1000 --single 0.5 --size 1024
+    $ python benchmarks/astrodata_open.py --dir /data/night/20170101
+
+Unless --dir is given, --files files are generated in a temporary directory:
+MEF files with --extensions extensions and, for a fraction --single of them,
+single HDU files (as raw data from some instruments are), all with
+--size x --size pixels per image. With gemini_instruments importable, the
+AstroData classes of the Gemini instruments are used.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import random
+import tempfile
+
+from argparse import ArgumentParser
+
+import numpy as np
+from astropy.io import fits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import astrodata
+try:
+    import gemini_instruments
+except ImportError:
+    pass
+# ------------------------------------------------------------------------------
+def buildParser():
+    parser = ArgumentParser(description="Time header-only astrodata.open()")
+    parser.add_argument('--dir', default=None,
+                        help="Open the FITS files in this directory instead "
+                        "of generated ones")
+    parser.add_argument('--files', type=int, default=1000,
+                        help="Files to generate. Default: 1000")
+    parser.add_argument('--extensions', type=int, default=3,
+                        help="Extensions per MEF file. Default: 3")
+    parser.add_argument('--single', type=float, default=0.25,
+                        help="Fraction of single HDU files. Default: 0.25")
+    parser.add_argument('--size', type=int, default=256,
+                        help="Image side, in pixels. Default: 256")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Timing repetitions, the best is kept. "
+                        "Default: 3")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def header(n):
+    hdr = fits.Header()
+    hdr['INSTRUME'] = 'GMOS-N'
+    hdr['TELESCOP'] = 'Gemini-North'
+    hdr['OBSTYPE'] = random.choice(('OBJECT', 'BIAS', 'FLAT'))
+    hdr['OBSCLASS'] = 'science'
+    hdr['DATALAB'] = 'GN-2017A-Q-1-1-{:03d}'.format(n)
+    hdr['DATE-OBS'] = '2017-01-01'
+    for i in range(150):
+        hdr['HIERARCH STATUS{:03d}'.format(i)] = random.random()
+    return hdr
+
+def generate(directory, args):
+    shape = (args.size, args.size)
+    for n in range(args.files):
+        fname = os.path.join(directory, 'N20170101S{:04d}.fits'.format(n))
+        data = np.zeros(shape, dtype=np.uint16)
+        if random.random() < args.single:
+            fits.PrimaryHDU(data=data, header=header(n)).writeto(fname)
+        else:
+            hdus = [fits.PrimaryHDU(header=header(n))]
+            hdus.extend(fits.ImageHDU(data=data, name='SCI', ver=ver)
+                        for ver in range(1, args.extensions + 1))
+            fits.HDUList(hdus).writeto(fname)
+
+def read_metadata(fnames, headers_only):
+    result = []
+    for fname in fnames:
+        ad = astrodata.open(fname, headers_only=headers_only)
+        result.append((ad.phu.get('DATALAB'), ad.phu.get('OBSTYPE'),
+                       tuple(ad.hdr.get('EXTNAME')), sorted(ad.tags)))
+    return result
+
+def best_time(fnames, headers_only, repeat):
+    times = []
+    for i in range(repeat):
+        t0 = time.time()
+        result = read_metadata(fnames, headers_only)
+        times.append(time.time() - t0)
+    return min(times), result
+
+def main(args):
+    random.seed(args.seed)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        directory = args.dir
+        if directory is None:
+            directory = tmpdir
+            t0 = time.time()
+            generate(directory, args)
+            print("Generated {} files in {:.1f} s".format(args.files,
+                                                          time.time() - t0))
+        fnames = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                        if f.lower().endswith(('.fits', '.fits.gz')))
+
+        lazy, lazy_result = best_time(fnames, False, args.repeat)
+        fast, fast_result = best_time(fnames, True, args.repeat)
+        for label, elapsed in (("astrodata.open(path)", lazy),
+                               ("  ... headers_only=True", fast)):
+            print("{:26} {:7.3f} s  {:8.1f} files/s".format(
+                label, elapsed, len(fnames) / elapsed))
+        print("Speedup: {:.1f}x".format(lazy / fast))
+        if lazy_result != fast_result:
+            print("WARNING: the metadata differ")
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
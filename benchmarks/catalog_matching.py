@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                            catalog_matching.py
+# ------------------------------------------------------------------------------
+"""
+Times the catalogue alignment of gempy.library.matching on synthetic
+catalogues, as determineAstrometricSolution and correctWCSToReferenceFrame
+use it, and checks the fitted transformations against the former
+(generator based) objective functions, and the batched brute-force grid
+search against optimize.brute.
+
+    $ python benchmarks/catalog_matching.py
+    $ python benchmarks/catalog_matching.py --sources 2000 --range 20
+    $ python benchmarks/catalog_matching.py --rotation 0.5
+
+The input catalogue has --sources random positions on a --size pixels
+square field. The reference catalogue is the input shifted (and rotated by
+--rotation degrees about the centre), with --scatter pixels of noise, some
+sources dropped and some added. The alignment searches +/- --range pixels.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gempy.library import matching
+# ------------------------------------------------------------------------------
+def loop_landstat(landscape, updated_model, x, y):
+    """The former _landstat"""
+    xt, yt = updated_model(x, y)
+    return -sum(landscape[iy,ix] for ix,iy in zip((xt-0.5).astype(int),
+                                                  (yt-0.5).astype(int))
+                if ix>=0 and iy>=0 and ix<landscape.shape[1]
+                                   and iy<landscape.shape[0])
+
+def loop_stat(tree, updated_model, x, y, sigma, maxsig):
+    """The former _stat"""
+    f = 0.5/(sigma*sigma)
+    maxsep = maxsig*sigma
+    xt, yt = updated_model(x, y)
+    dist, idx = tree.query(list(zip(xt, yt)), k=5, distance_upper_bound=maxsep)
+    return -sum(np.exp(-f*d*d) for dd in dist for d in dd)
+
+def buildParser():
+    parser = ArgumentParser(description="Time catalogue alignment.")
+    parser.add_argument('--sources', type=int, default=500,
+                        help="Sources in the input catalogue. Default: 500")
+    parser.add_argument('--size', type=float, default=2048,
+                        help="Side of the field, in pixels. Default: 2048")
+    parser.add_argument('--range', type=float, default=10,
+                        help="Translation search range, in pixels. "
+                        "Default: 10")
+    parser.add_argument('--rotation', type=float, default=0.,
+                        help="Rotation of the reference catalogue, in "
+                        "degrees. Searched for if not 0. Default: 0")
+    parser.add_argument('--scatter', type=float, default=0.5,
+                        help="Positional noise, in pixels. Default: 0.5")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def catalogues(args):
+    rng = np.random.RandomState(args.seed)
+    xin, yin = rng.uniform(0.05 * args.size, 0.95 * args.size,
+                           (2, args.sources))
+    shift = rng.uniform(-0.8 * args.range, 0.8 * args.range, 2)
+    angle = np.deg2rad(args.rotation)
+    c, s = np.cos(angle), np.sin(angle)
+    xc = yc = 0.5 * args.size
+    xref = c * (xin - xc) - s * (yin - yc) + xc + shift[0]
+    yref = s * (xin - xc) + c * (yin - yc) + yc + shift[1]
+    xref += rng.normal(0, args.scatter, args.sources)
+    yref += rng.normal(0, args.scatter, args.sources)
+    # Sources missing from the reference catalogue, and extra ones
+    keep = rng.uniform(size=args.sources) > 0.1
+    nextra = args.sources // 10
+    xref = np.append(xref[keep], rng.uniform(0, args.size, nextra))
+    yref = np.append(yref[keep], rng.uniform(0, args.size, nextra))
+    return (xin, yin), (xref, yref), shift
+
+def align(incoords, refcoords, args):
+    rotation = args.rotation or None
+    rotation_range = 2 * abs(args.rotation) if args.rotation else None
+    t0 = time.time()
+    model = matching.align_catalogs(incoords[0], incoords[1], refcoords[0],
+                                    refcoords[1], translation=(0, 0),
+                                    translation_range=args.range,
+                                    rotation=rotation,
+                                    rotation_range=rotation_range,
+                                    tolerance=0.01)
+    return time.time() - t0, model
+
+def time_statistic(function, args, repeat=200):
+    t0 = time.time()
+    for i in range(repeat):
+        function(*args)
+    return (time.time() - t0) / repeat
+
+def main(args):
+    incoords, refcoords, shift = catalogues(args)
+    print("{} input and {} reference sources, true shift ({:.3f}, {:.3f})".
+          format(len(incoords[0]), len(refcoords[0]), *shift))
+
+    # The statistics alone, for one evaluation
+    model = matching.Shift2D(*shift)
+    fitter = matching.BruteLandscapeFitter()
+    landscape = fitter.mklandscape(refcoords, 5.0, 4.0,
+                                   (int(args.size), int(args.size)))
+    tree = matching.spatial.cKDTree(np.column_stack(refcoords))
+    for label, function, fargs in (
+            ("_landstat", matching._landstat, (landscape, model) + incoords),
+            ("  former", loop_landstat, (landscape, model) + incoords),
+            ("_stat", matching._stat, (tree, model) + incoords + (5.0, 4.0)),
+            ("  former", loop_stat, (tree, model) + incoords + (5.0, 4.0))):
+        print("{:12} {:9.1f} us per evaluation".format(
+            label, time_statistic(function, fargs) * 1e6))
+
+    # The brute-force grid search, batched and point by point
+    model = matching.Shift2D(0., 0.)
+    model.x_offset.bounds = model.y_offset.bounds = (-args.range, args.range)
+    grid = []
+    for batch in (True, False):
+        t0 = time.time()
+        fitted = matching.BruteLandscapeFitter(batch=batch)(
+            model, incoords, refcoords, sigma=2.0)
+        grid.append(fitted.parameters)
+        print("{:16} {:7.3f} s   {}".format(
+            "brute batched" if batch else "  point by point",
+            time.time() - t0, " ".join("{:.4f}".format(p) for p in
+                                       fitted.parameters)))
+    if not np.array_equal(*grid):
+        print("Brute-force grid results DIFFER")
+        return 1
+
+    # The whole alignment, with the current and the former statistics
+    current = align(incoords, refcoords, args)
+    saved = matching._landstat, matching._stat
+    matching._landstat, matching._stat = loop_landstat, loop_stat
+    try:
+        former = align(incoords, refcoords, args)
+    finally:
+        matching._landstat, matching._stat = saved
+
+    for label, (elapsed, model) in (("align_catalogs", current),
+                                    ("  former", former)):
+        print("{:16} {:7.3f} s   {}".format(
+            label, elapsed, " ".join("{}={:.4f}".format(name, value)
+                                     for name, value in
+                                     zip(model.param_names, model.parameters))))
+    # The sums are now pairwise, so the statistics can differ in the last
+    # bit, which could only move the simplex result within its tolerance
+    same = np.allclose(current[1].parameters, former[1].parameters,
+                       rtol=0, atol=0.01)
+    print("Fitted parameters {}".format("agree" if same else "DIFFER"))
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
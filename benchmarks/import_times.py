@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                 import_times.py
+# ------------------------------------------------------------------------------
+"""
+Measures the cold start time of the command line entry points, i.e., how
+long it takes a fresh interpreter to import everything needed to show the
+help of each script.
+
+    $ python benchmarks/import_times.py
+    $ python benchmarks/import_times.py -n 10 reduce typewalk
+    $ python benchmarks/import_times.py --breakdown 15 reduce
+    $ python benchmarks/import_times.py --json times.json
+
+Each entry point is run as 'python -m <module> --help' in a new process,
+`-n` times, and the minimum, median and maximum wall times are reported.
+With --breakdown (Python >= 3.7), the slowest modules imported by each
+entry point, as measured by 'python -X importtime', are listed as well.
+
+Run it from the root of the source tree (or with the packages installed),
+and compare the results before and after a change to spot import time
+regressions.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+from argparse import ArgumentParser
+# ------------------------------------------------------------------------------
+ENTRY_POINTS = {
+    'reduce':    'recipe_system.scripts.reduce',
+    'reduce_db': 'recipe_system.scripts.reduce_db',
+    'adcc':      'recipe_system.scripts.adcc',
+    'typewalk':  'gempy.scripts.typewalk',
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ------------------------------------------------------------------------------
+def buildParser():
+    parser = ArgumentParser(description="Cold start times of the DRAGONS "
+                            "entry points.")
+    parser.add_argument('entry_points', nargs='*', metavar='ENTRY_POINT',
+                        default=sorted(ENTRY_POINTS),
+                        help="Entry points to time, out of {}. Default: all".
+                        format(', '.join(sorted(ENTRY_POINTS))))
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help="Number of runs per entry point. Default: 5")
+    parser.add_argument('--breakdown', type=int, default=0, metavar='N',
+                        help="List the N slowest imports of each entry point")
+    parser.add_argument('--json', dest='json_file', default=None,
+                        help="Also write the results to this JSON file")
+    return parser
+
+def _environment():
+    env = dict(os.environ)
+    path = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, path]) if path else ROOT
+    return env
+
+def time_entry_point(module, repeat):
+    """
+    Runs 'python -m module --help' `repeat` times.
+
+    Returns
+    -------
+    <list> of <float> : the wall time of each run, in seconds.
+
+    """
+    times = []
+    cmd = [sys.executable, '-m', module, '--help']
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            retcode = subprocess.call(cmd, stdout=devnull, stderr=devnull,
+                                      env=_environment())
+            elapsed = time.time() - start
+            if retcode != 0:
+                raise RuntimeError("'{}' exited with status {}".format(
+                    ' '.join(cmd[1:]), retcode))
+            times.append(elapsed)
+    return times
+
+def import_breakdown(module, nslowest):
+    """
+    Returns the `nslowest` modules with the largest cumulative import time
+    when importing `module`, as a list of (microseconds, module name).
+
+    """
+    if sys.version_info < (3, 7):
+        raise RuntimeError("--breakdown needs Python >= 3.7")
+
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=_environment(), universal_newlines=True)
+    _, err = proc.communicate()
+    imports = []
+    for line in err.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            imports.append((int(fields[1]), fields[2].strip()))
+        except (IndexError, ValueError):
+            continue
+    return sorted(imports, reverse=True)[:nslowest]
+
+def main(args):
+    unknown = [name for name in args.entry_points if name not in ENTRY_POINTS]
+    if unknown:
+        print("Unknown entry point(s): {}".format(', '.join(unknown)))
+        return 1
+
+    results = {}
+    print("{:<12} {:>10} {:>10} {:>10}".format("Entry point", "min (s)",
+                                            "median (s)", "max (s)"))
+    for name in args.entry_points:
+        try:
+            times = sorted(time_entry_point(ENTRY_POINTS[name], args.repeat))
+        except RuntimeError as err:
+            print("{:<12} {}".format(name, err))
+            continue
+        results[name] = times
+        print("{:<12} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+            name, times[0], times[len(times) // 2], times[-1]))
+
+    if args.breakdown > 0:
+        for name in args.entry_points:
+            print("\nSlowest imports for {} (cumulative, ms)".format(name))
+            for usec, modname in import_breakdown(ENTRY_POINTS[name],
+                                                  args.breakdown):
+                print("  {:>9.1f}  {}".format(usec / 1000., modname))
+
+    if args.json_file:
+        with open(args.json_file, 'w') as fd:
+            json.dump({'python': sys.version.split()[0],
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'repeat': args.repeat,
+                       'results': results}, fd, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
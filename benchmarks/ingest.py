@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                      ingest.py
+# ------------------------------------------------------------------------------
+"""
+Times the bulk ingestion of calibrations into a new local calibration
+database, as 'reduce_db add' does it, with one job and with a pool of
+processes reading the files ahead of the ingestion.
+
+    $ python benchmarks/ingest.py
+    $ python benchmarks/ingest.py --files 2000 --jobs 8 --drop-caches
+    $ python benchmarks/ingest.py --dir /data/calibrations
+
+Unless --dir is given, --files processed GMOS biases are generated, with
+--extensions extensions of --shape pixels. The files are copied into the
+directory of each database, which is the storage root of gemini_calmgr.
+--drop-caches empties the page cache before every run (root only), as for
+files that have just been copied or have not been read for a while.
+Otherwise, the files are probably cached already and the pool can only
+save the MD5 sums.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+import numpy as np
+from astropy.io import fits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_system.cal_service import localmanager
+# ------------------------------------------------------------------------------
+def buildParser():
+    parser = ArgumentParser(description="Time the local calibration ingest.")
+    parser.add_argument('--dir', default=None,
+                        help="Ingest the FITS files in this directory "
+                        "instead of generated ones")
+    parser.add_argument('--files', type=int, default=500,
+                        help="Files to generate. Default: 500")
+    parser.add_argument('--extensions', type=int, default=12,
+                        help="Extensions per generated file. Default: 12")
+    parser.add_argument('--shape', type=int, nargs=2, default=(512, 256),
+                        help="Shape of the extensions. Default: 512 256")
+    parser.add_argument('--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Pool size. Default: number of CPUs")
+    parser.add_argument('--batch', type=int,
+                        default=localmanager.DEFAULT_BATCH_SIZE,
+                        help="Files per transaction. Default: {}".format(
+                            localmanager.DEFAULT_BATCH_SIZE))
+    parser.add_argument('--drop-caches', action='store_true',
+                        help="Empty the page cache before each run")
+    return parser
+
+def generate(directory, args):
+    rng = np.random.RandomState(1)
+    for n in range(args.files):
+        phu = fits.Header()
+        phu['INSTRUME'] = 'GMOS-N'
+        phu['TELESCOP'] = 'Gemini-North'
+        phu['OBSTYPE'] = 'BIAS'
+        phu['OBSCLASS'] = 'dayCal'
+        phu['DATALAB'] = 'GN-CAL20170101-{}-{:03d}'.format(n // 100, n % 100)
+        phu['DATE-OBS'] = '2017-01-01'
+        phu['TIME-OBS'] = '{:02d}:{:02d}:00.0'.format((n // 60) % 24, n % 60)
+        phu['CCDSUM'] = '2 2'
+        phu['PREPARE'] = 'Processed'
+        phu['BIASIM'] = 'Processed'
+        hdus = [fits.PrimaryHDU(header=phu)]
+        for ver in range(1, args.extensions + 1):
+            hdr = fits.Header()
+            hdr['EXTNAME'] = 'SCI'
+            hdr['EXTVER'] = ver
+            hdr['CCDSUM'] = '2 2'
+            hdus.append(fits.ImageHDU(data=rng.normal(
+                0, 3, args.shape).astype(np.float32), header=hdr))
+        fits.HDUList(hdus).writeto(os.path.join(
+            directory, 'N20170101S{:04d}_bias.fits'.format(n)))
+
+def drop_caches():
+    os.system('sync')
+    with open('/proc/sys/vm/drop_caches', 'w') as fd:
+        fd.write('3\n')
+
+def timed(label, directory, fnames, jobs, args):
+    dbdir = os.path.join(directory, 'jobs{}'.format(jobs))
+    os.mkdir(dbdir)
+    for fname in fnames:
+        shutil.copy(fname, dbdir)
+    manager = localmanager.get_manager(dbdir)
+    manager.init_database()
+    if args.drop_caches:
+        drop_caches()
+
+    stats = manager.ingest_files(localmanager.fits_files(dbdir), jobs=jobs,
+                                 batch_size=args.batch)
+    print("{:16} {:8.2f} s  {:7.1f} files/s  ({} ingested, {} failed)".format(
+        label, stats.seconds, stats.files / stats.seconds, stats.ingested,
+        stats.failed))
+
+    # Again, with nothing to do
+    stats = manager.ingest_files(localmanager.fits_files(dbdir), jobs=jobs,
+                                 batch_size=args.batch)
+    print("{:16} {:8.2f} s  {:7.1f} files/s  ({} unchanged)".format(
+        "  unchanged", stats.seconds, stats.files / stats.seconds,
+        stats.skipped))
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        directory = args.dir
+        if directory is None:
+            directory = os.path.join(tmpdir, 'cals')
+            os.mkdir(directory)
+            t0 = time.time()
+            generate(directory, args)
+            print("Generated {} files in {:.1f} s".format(args.files,
+                                                          time.time() - t0))
+        fnames = sorted(localmanager.fits_files(directory))
+
+        timed("1 job", tmpdir, fnames, 1, args)
+        timed("{} jobs".format(args.jobs), tmpdir, fnames, args.jobs, args)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
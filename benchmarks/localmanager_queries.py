@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                          localmanager_queries.py
+# ------------------------------------------------------------------------------
+"""
+Times the calibration searches of the local calibration manager on an
+existing database, and shows the query plans SQLite chooses for them.
+
+    $ python benchmarks/localmanager_queries.py ~/.geminidr N2017*.fits
+    $ python benchmarks/localmanager_queries.py ~/.geminidr N2017*.fits \\
+          --caltype processed_flat --repeat 50 --plans
+    $ python benchmarks/localmanager_queries.py ~/.geminidr N2017*.fits --compare
+
+A calibration request is built for each FITS file, as reduce would, and
+searched for --repeat times. Three timings are reported per request: the
+first search, the following ones with the result cache of the manager
+cleared (the SQL queries alone), and with it. --compare runs the same
+searches on a copy of the database without the calibration indexes.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import astrodata
+import gemini_instruments
+
+from sqlalchemy import event
+
+from recipe_system.cal_service import localmanager
+from recipe_system.cal_service.calrequestlib import get_cal_requests
+# ------------------------------------------------------------------------------
+def buildParser():
+    parser = ArgumentParser(description="Time local calibration searches.")
+    parser.add_argument('database', help="Database file, or its directory")
+    parser.add_argument('files', nargs='+', help="FITS files to find "
+                        "calibrations for")
+    parser.add_argument('--caltype', default='processed_bias',
+                        help="Calibration type. Default: processed_bias")
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="Searches per request. Default: 20")
+    parser.add_argument('--plans', action='store_true',
+                        help="Print the query plan of each SQL statement")
+    parser.add_argument('--compare', action='store_true',
+                        help="Also time a copy of the database without the "
+                        "calibration indexes")
+    return parser
+
+def db_file(path):
+    if os.path.isdir(path):
+        return os.path.join(path, localmanager.DEFAULT_DB_NAME)
+    return path
+
+def drop_indexes(path):
+    conn = sqlite3.connect(path)
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND "
+        "name LIKE 'ix\\_%' ESCAPE '\\'")]
+    for name in names:
+        conn.execute("DROP INDEX {}".format(name))
+    conn.commit()
+    conn.close()
+    return len(names)
+
+def capture_statements(manager):
+    statements = []
+    def before_execute(conn, cursor, statement, parameters, context, many):
+        statements.append((statement, parameters))
+    event.listen(manager.session.get_bind(), 'before_cursor_execute',
+                 before_execute)
+    return statements
+
+def print_plans(manager, statements):
+    seen = set()
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            continue
+        if statement in seen:
+            continue
+        seen.add(statement)
+        plan = manager.session.execute("EXPLAIN QUERY PLAN " + statement,
+                                       parameters).fetchall()
+        print("    " + " ".join(statement.split())[:100] + "...")
+        for row in plan:
+            print("        " + str(row[-1]))
+
+def time_searches(manager, requests, repeat, plans=False):
+    statements = capture_statements(manager)
+    totals = [0., 0., 0.]
+    for rq in requests:
+        times = []
+        del statements[:]
+        t0 = time.time()
+        url, md5 = manager.calibration_search(rq)
+        times.append(time.time() - t0)
+
+        t0 = time.time()
+        for i in range(repeat):
+            manager._searches.clear()
+            manager.calibration_search(rq)
+        times.append((time.time() - t0) / repeat)
+
+        t0 = time.time()
+        for i in range(repeat):
+            manager.calibration_search(rq)
+        times.append((time.time() - t0) / repeat)
+
+        print("{:30} first {:8.2f} ms   uncached {:8.2f} ms   cached {:8.3f} "
+              "ms   {}".format(rq.filename, *([t * 1000 for t in times] +
+                                               [os.path.basename(url or '-')])))
+        if plans:
+            print_plans(manager, statements)
+        totals = [a + b for a, b in zip(totals, times)]
+
+    n = float(len(requests))
+    print("{:30} first {:8.2f} ms   uncached {:8.2f} ms   cached {:8.3f} "
+          "ms".format("mean", *[t * 1000 / n for t in totals]))
+
+def main(args):
+    path = db_file(args.database)
+    requests = get_cal_requests([astrodata.open(f) for f in args.files],
+                                args.caltype)
+
+    conn = sqlite3.connect(path)
+    nfiles = conn.execute("SELECT count(*) FROM diskfile").fetchone()[0]
+    conn.close()
+    print("{}: {} files".format(path, nfiles))
+
+    t0 = time.time()
+    manager = localmanager.get_manager(path)
+    print("Manager set up in {:.2f} ms".format((time.time() - t0) * 1000))
+    t0 = time.time()
+    localmanager.get_manager(path)
+    print("... and reused in {:.3f} ms\n".format((time.time() - t0) * 1000))
+    print("With the calibration indexes:")
+    time_searches(manager, requests, args.repeat, plans=args.plans)
+
+    if args.compare:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            copy = os.path.join(tmpdir, os.path.basename(path))
+            shutil.copy(path, copy)
+            dropped = drop_indexes(copy)
+            manager = localmanager.LocalManager(copy)
+            # Don't let the manager recreate them
+            manager._indexed = True
+            print("\nWithout them ({} indexes dropped):".format(dropped))
+            time_searches(manager, requests, args.repeat, plans=args.plans)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
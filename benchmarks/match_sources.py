@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                               match_sources.py
+# ------------------------------------------------------------------------------
+"""
+Times gempy.library.matching.match_sources on synthetic catalogues, against
+the former loop over the reference sources, and checks that both give the
+same matches.
+
+    $ python benchmarks/match_sources.py
+    $ python benchmarks/match_sources.py --sources 2000 --priority 0.5
+    $ python benchmarks/match_sources.py --radius 5
+
+Both catalogues have --sources random positions on a --size pixels square
+field, so many input sources compete for the same reference source. A
+--priority fraction of the input sources, chosen at random, are given
+priority.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gempy.library import matching
+# ------------------------------------------------------------------------------
+def loop_match_sources(incoords, refcoords, radius=2.0, priority=[]):
+    """The former match_sources, with a stable sort of the separations"""
+    matched = np.full((len(incoords[0]),), -1, dtype=int)
+    tree = matching.spatial.cKDTree(np.column_stack(refcoords))
+    dist, idx = tree.query(np.column_stack(incoords),
+                           distance_upper_bound=radius)
+    for i in range(len(refcoords[0])):
+        inidx = np.where(idx==i)[0][np.argsort(dist[np.where(idx==i)],
+                                               kind='mergesort')]
+        for ii in inidx:
+            if ii in priority:
+                matched[ii] = i
+                break
+        else:
+            # No first_allowed so take the first one
+            if len(inidx):
+                matched[inidx[0]] = i
+    return matched
+
+def buildParser():
+    parser = ArgumentParser(description="Time match_sources.")
+    parser.add_argument('--sources', type=int, default=10000,
+                        help="Sources in each catalogue. Default: 10000")
+    parser.add_argument('--size', type=float, default=2048,
+                        help="Side of the field, in pixels. Default: 2048")
+    parser.add_argument('--radius', type=float, default=2.0,
+                        help="Matching radius, in pixels. Default: 2")
+    parser.add_argument('--priority', type=float, default=0.1,
+                        help="Fraction of priority input sources. "
+                        "Default: 0.1")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def main(args):
+    rng = np.random.RandomState(args.seed)
+    incoords = tuple(rng.uniform(0, args.size, (2, args.sources)))
+    refcoords = tuple(rng.uniform(0, args.size, (2, args.sources)))
+    priority = list(np.flatnonzero(rng.uniform(size=args.sources) <
+                                   args.priority))
+
+    results = {}
+    for label, function in (("former loop", loop_match_sources),
+                            ("match_sources", matching.match_sources)):
+        t0 = time.time()
+        results[label] = function(incoords, refcoords, radius=args.radius,
+                                  priority=priority)
+        print("{:14} {:8.3f} s  {} matches".format(
+            label, time.time() - t0, np.sum(results[label] >= 0)))
+
+    same = np.array_equal(results["former loop"], results["match_sources"])
+    print("Results are {}".format("identical" if same else "DIFFERENT"))
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                  mosaic_dq.py
+# ------------------------------------------------------------------------------
+"""
+Times the transformation of the DQ planes of a GMOS 3-CCD mosaic, as done by
+mosaicDetectors, against the former interpolation of every bit plane over
+the whole block, and checks that both give the same DQ planes.
+
+    $ python benchmarks/mosaic_dq.py
+    $ python benchmarks/mosaic_dq.py --binning 1 --detector EEV
+    $ python benchmarks/mosaic_dq.py --interpolator spline --order 3
+
+The blocks have the size and the shift, rotation and magnification of the
+GMOS geometry configuration, and their DQ planes have bad columns, saturated
+stars, cosmic rays and unilluminated edges.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gempy.mosaic.transformation import Transformation, DQMap
+# ------------------------------------------------------------------------------
+# (blocksize (unbinned), shifts (unbinned, binned), rotations) of the detectors
+GEOMETRY = {
+    'Hamamatsu': ((2048, 4224),
+                  ([(-1.2, 0.71), (0., 0.), (0., -0.73)],
+                   [(-2.4, 0.71), (0., 0.), (0., -0.73)]),
+                  (0., 0., 0.)),
+    'EEV': ((2048, 4608),
+            ([(-2.50, -1.58), (0., 0.), (3.8723, -1.86)],
+             [(-3.50, -1.58), (0., 0.), (4.8723, -1.86)]),
+            (-0.004, 0.0, -0.046)),
+}
+
+def former_transform_16bit(trans, mask):
+    """The former Transformation._transform_16bit"""
+    trans_mask = np.zeros(mask.shape, dtype=np.uint16)
+    for j in range(0, 16):
+        bit = 2**j
+        if bit == DQMap['no_data'] or np.sum(mask & bit) > 0:
+            cval=DQMap['no_data'] if bit == DQMap['no_data'] else 0
+            temp_mask = trans.affine_transform((mask & 2**j).astype(np.float32),
+                                               cval=cval)
+            trans_mask += np.where(np.abs(temp_mask > 0.01*bit), bit,
+                                   0).astype(np.uint16)
+    return trans_mask
+
+def buildParser():
+    parser = ArgumentParser(description="Time the mosaic DQ transformation.")
+    parser.add_argument('--detector', default='Hamamatsu',
+                        choices=sorted(GEOMETRY),
+                        help="GMOS detectors. Default: Hamamatsu")
+    parser.add_argument('--binning', type=int, default=2,
+                        help="Binning in x and y. Default: 2")
+    parser.add_argument('--interpolator', default='linear',
+                        choices=('linear', 'nearest', 'spline'),
+                        help="Interpolator. Default: linear")
+    parser.add_argument('--order', type=int, default=2,
+                        help="Spline order. Default: 2")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def dq_planes(args):
+    rng = np.random.RandomState(args.seed)
+    blocksize, _, _ = GEOMETRY[args.detector]
+    shape = (blocksize[1] // args.binning, blocksize[0] // args.binning)
+    for block in range(3):
+        mask = np.zeros(shape, dtype=np.uint16)
+        mask[:, rng.randint(0, shape[1], 4)] |= DQMap['bad_pixel']
+        for y, x in rng.randint(10, min(shape) - 10, (30, 2)):
+            mask[y-4:y+4, x-6:x+6] |= DQMap['saturated']
+            mask[y-6:y+6, x-8:x+8] |= DQMap['non_linear']
+        mask[rng.uniform(size=shape) < 2e-4] |= DQMap['cosmic_ray']
+        mask[:, :20 // args.binning] |= DQMap['unilluminated']
+        yield mask
+
+def main(args):
+    blocksize, shifts, rotations = GEOMETRY[args.detector]
+    shifts = shifts[args.binning > 1]
+    masks = list(dq_planes(args))
+
+    results = {}
+    for label in ("former", "_transform_16bit"):
+        elapsed = 0.
+        results[label] = []
+        for mask, shift, rotation in zip(masks, shifts, rotations):
+            trans = Transformation(rotation, shift, (1., 1.))
+            trans.set_interpolator(args.interpolator, args.order)
+            trans.set_dq_data()
+            t0 = time.time()
+            results[label].append(former_transform_16bit(trans, mask)
+                                  if label == "former" else
+                                  trans.transform(mask))
+            elapsed += time.time() - t0
+        print("{:18} {:7.3f} s for 3 blocks of {}x{}".format(
+            label, elapsed, *masks[0].shape[::-1]))
+
+    same = all(np.array_equal(a, b) for a, b in zip(results["former"],
+                                                    results["_transform_16bit"]))
+    print("Results are {}".format("identical" if same else "DIFFERENT"))
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                    resample.py
+# ------------------------------------------------------------------------------
+"""
+Times the resampling of images (SCI, VAR and DQ planes) as done by
+alignToReferenceFrame, against the former affine_transform of each plane and
+each DQ bit, and checks that both give the same planes.
+
+    $ python benchmarks/resample.py
+    $ python benchmarks/resample.py --interpolator spline3 --images 8
+    $ python benchmarks/resample.py --size 4096 --workers 1
+
+The images have a few bad columns, saturated patches and cosmic rays in
+their DQ planes. They are rotated by --rotation degrees and shifted by a
+fraction of a pixel.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+import numpy as np
+from scipy.ndimage import affine_transform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gempy.library.resample import Resampler
+from geminidr.parallel import ExtensionExecutor
+# ------------------------------------------------------------------------------
+interpolators = {"nearest": 0, "linear": 1, "spline2": 2, "spline3": 3,
+                 "spline4": 4, "spline5": 5}
+
+def former_planes(data, mask, variance, matrix, offset, order, output_shape):
+    """The former per-plane and per-bit transformations"""
+    kwargs = {'matrix': matrix, 'offset': offset, 'order': order,
+              'output_shape': output_shape}
+    trans_mask = np.zeros(output_shape, dtype=np.uint16)
+    for j in range(0, 16):
+        bit = 2**j
+        if bit == 16 or np.sum(mask & bit) > 0:
+            temp_mask = affine_transform((mask & 2**j).astype(np.float32),
+                                         cval=16 if bit == 16 else 0, **kwargs)
+            trans_mask += np.where(np.abs(temp_mask>0.01*bit), bit,
+                                   0).astype(np.uint16)
+    return (affine_transform(data, cval=0.0, **kwargs), trans_mask,
+            affine_transform(variance, cval=0.0, **kwargs))
+
+def resampled_planes(data, mask, variance, matrix, offset, order,
+                     output_shape):
+    resampler = Resampler(matrix, offset, output_shape, order=order)
+    return (resampler.transform(data), resampler.transform_mask(mask),
+            resampler.transform(variance))
+
+def buildParser():
+    parser = ArgumentParser(description="Time the alignToReferenceFrame "
+                            "resampling.")
+    parser.add_argument('--images', type=int, default=4,
+                        help="Images to resample. Default: 4")
+    parser.add_argument('--size', type=int, default=2048,
+                        help="Side of the images, in pixels. Default: 2048")
+    parser.add_argument('--interpolator', default='linear',
+                        choices=sorted(interpolators),
+                        help="Interpolator. Default: linear")
+    parser.add_argument('--rotation', type=float, default=0.5,
+                        help="Rotation, in degrees. Default: 0.5")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Concurrent images. Default: from the config")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def images(args):
+    rng = np.random.RandomState(args.seed)
+    shape = (args.size, args.size)
+    for i in range(args.images):
+        data = rng.normal(100, 10, shape).astype(np.float32)
+        mask = np.zeros(shape, dtype=np.uint16)
+        mask[:, rng.randint(0, args.size, 5)] |= 1
+        for y, x in rng.randint(20, args.size - 20, (20, 2)):
+            mask[y-5:y+5, x-5:x+5] |= 4
+        mask[rng.uniform(size=shape) < 1e-4] |= 8
+        angle = np.radians(args.rotation)
+        matrix = np.array([[np.cos(angle), np.sin(angle)],
+                           [-np.sin(angle), np.cos(angle)]])
+        offset = rng.uniform(-20, 20, 2)
+        yield data, mask, data.copy(), matrix, offset
+
+def main(args):
+    inputs = list(zip(*images(args)))
+    order = interpolators[args.interpolator]
+    extra = ([order] * args.images, [(args.size + 40,) * 2] * args.images)
+
+    results = {}
+    for label, function, workers in (
+            ("former", former_planes, 1),
+            ("Resampler", resampled_planes, 1),
+            ("  concurrent", resampled_planes, args.workers)):
+        executor = ExtensionExecutor(workers=workers)
+        t0 = time.time()
+        results[label] = executor.map(function, *(inputs + list(extra)))
+        print("{:14} {:7.3f} s  ({} workers)".format(label, time.time() - t0,
+                                                   executor.workers))
+
+    same = all(np.array_equal(a, b) for former, new in
+               zip(results["former"], results["  concurrent"])
+               for a, b in zip(former, new))
+    print("Results are {}".format("identical" if same else "DIFFERENT"))
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
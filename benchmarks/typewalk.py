@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+#                                                                  gemini_python
+#
+#                                                                    typewalk.py
+# ------------------------------------------------------------------------------
+"""
+Times the classification of a directory of files by typewalk, serially, with
+a process pool, and from the tag cache.
+
+    $ python benchmarks/typewalk.py
+    $ python benchmarks/typewalk.py --files 2000 --extensions 12 --jobs 8
+    $ python benchmarks/typewalk.py --dir /data/night/20170101
+
+Unless --dir is given, a synthetic night is generated in a temporary
+directory: --files GMOS and GNIRS MEF files, with realistic headers and
+tiny data arrays, so that header parsing dominates as it does for raw data.
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import random
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+import numpy as np
+from astropy.io import fits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gempy.scripts import typewalk
+# ------------------------------------------------------------------------------
+OBSTYPES = ('OBJECT', 'BIAS', 'FLAT', 'ARC', 'DARK')
+
+def buildParser():
+    parser = ArgumentParser(description="Time typewalk classification.")
+    parser.add_argument('--dir', default=None,
+                        help="Classify the FITS files in this directory "
+                        "instead of generated ones")
+    parser.add_argument('--files', type=int, default=500,
+                        help="Files to generate. Default: 500")
+    parser.add_argument('--extensions', type=int, default=3,
+                        help="Extensions per generated file. Default: 3")
+    parser.add_argument('--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="Pool size. Default: number of CPUs")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+def phu(n, instrument):
+    hdr = fits.Header()
+    hdr['INSTRUME'] = instrument
+    hdr['TELESCOP'] = 'Gemini-North'
+    hdr['OBSERVAT'] = 'Gemini-North'
+    hdr['OBSTYPE'] = random.choice(OBSTYPES)
+    hdr['OBSCLASS'] = 'science'
+    hdr['OBSMODE'] = 'IMAGE'
+    hdr['OBJECT'] = 'Synthetic'
+    hdr['DATALAB'] = 'GN-2017A-Q-1-{}-{:03d}'.format(n // 100, n % 100)
+    hdr['DATE-OBS'] = '2017-01-01'
+    hdr['TIME-OBS'] = '{:02d}:{:02d}:00.0'.format((n // 60) % 24, n % 60)
+    hdr['EXPTIME'] = 30.
+    hdr['RA'] = random.uniform(0, 360)
+    hdr['DEC'] = random.uniform(-30, 60)
+    hdr['FILTER1'] = 'r_G0303'
+    hdr['FILTER2'] = 'open2-8'
+    hdr['GRATING'] = 'MIRROR'
+    hdr['MASKNAME'] = 'None'
+    hdr['CCDSUM'] = '2 2'
+    for i in range(150):
+        # The bulk of a real PHU: telescope and instrument status
+        hdr['HIERARCH STATUS{:03d}'.format(i)] = random.random()
+    return hdr
+
+def extension(ver):
+    hdr = fits.Header()
+    hdr['EXTNAME'] = 'SCI'
+    hdr['EXTVER'] = ver
+    hdr['CCDSUM'] = '2 2'
+    hdr['DATASEC'] = '[1:4,1:4]'
+    hdr['DETSEC'] = '[{}:{},1:4]'.format(4 * ver - 3, 4 * ver)
+    hdr['GAIN'] = 1.5
+    hdr['RDNOISE'] = 3.5
+    return fits.ImageHDU(data=np.zeros((4, 4), dtype=np.float32), header=hdr)
+
+def generate(directory, nfiles, nextensions):
+    instruments = ('GMOS-N', 'GNIRS')
+    for n in range(nfiles):
+        hdus = [fits.PrimaryHDU(header=phu(n, instruments[n % 2]))]
+        hdus.extend(extension(ver) for ver in range(1, nextensions + 1))
+        fits.HDUList(hdus).writeto(os.path.join(directory,
+                                                'N20170101S{:04d}.fits'.format(n)))
+
+def timed(label, fnames, pool=None, cache=None):
+    t0 = time.time()
+    results = typewalk.classify_files(fnames, pool=pool, cache=cache)
+    elapsed = time.time() - t0
+    failed = sum(1 for tags, error in results if error is not None)
+    print("{:28} {:8.2f} s  {:9.1f} files/s  ({} failed)".format(
+        label, elapsed, len(fnames) / elapsed, failed))
+    return results
+
+def main(args):
+    random.seed(args.seed)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        directory = args.dir
+        if directory is None:
+            directory = os.path.join(tmpdir, 'night')
+            os.mkdir(directory)
+            t0 = time.time()
+            generate(directory, args.files, args.extensions)
+            print("Generated {} files in {:.1f} s".format(args.files,
+                                                          time.time() - t0))
+        fnames = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                        if f.lower().endswith('.fits'))
+
+        serial = timed("serial", fnames)
+        pool = multiprocessing.Pool(args.jobs)
+        try:
+            parallel = timed("pool of {}".format(args.jobs), fnames, pool=pool)
+            cache = typewalk.TagCache(os.path.join(tmpdir, 'typewalk.db'))
+            timed("pool, filling the cache", fnames, pool=pool, cache=cache)
+            cached = timed("from the cache", fnames, pool=pool, cache=cache)
+            cache.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+        if not serial == parallel == cached:
+            print("WARNING: the classifications differ")
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    sys.exit(main(buildParser().parse_args()))
@@ -1,18 +1,23 @@
-# Import the modules under this package, to trigger any class
-# registering that may be needed
+# The modules under this package register their AstroData classes when they
+# are imported. They are many, and some carry large lookup tables, so they are
+# only imported when astrodata first needs to match a dataset (or when they
+# are imported explicitly).
 
-from . import gemini
+from importlib import import_module
 
-from . import bhros
-from . import f2
-from . import gmos
-from . import gnirs
-from . import gpi
-from . import graces
-from . import gsaoi
-from . import michelle
-from . import nici
-from . import nifs
-from . import niri
-from . import phoenix
-from . import trecs
+from astrodata import factory
+
+_INSTRUMENTS = ('gemini',
+                'bhros', 'f2', 'gmos', 'gnirs', 'gpi', 'graces', 'gsaoi',
+                'michelle', 'nici', 'nifs', 'niri', 'phoenix', 'trecs')
+
+for _instrument in _INSTRUMENTS:
+    factory.addLazyModule('{}.{}'.format(__name__, _instrument))
+
+def __getattr__(name):
+    # Python >= 3.7 (PEP 562): 'gemini_instruments.gmos' still works after a
+    # plain 'import gemini_instruments'
+    if name in _INSTRUMENTS:
+        return import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__,
+                                                                    name))
@@ -14,6 +14,7 @@ class ParametersStack(ParametersBASE):
         "nlow"              : 1,
         "operation"         : "median",
         "reject_method"     : "minmax",
+        "memory"            : None,
     }
     stackFrames = {
         "suffix"            : "_stack",
@@ -22,12 +23,14 @@ class ParametersStack(ParametersBASE):
         "nlow"              : 1,
         "operation"         : "average",
         "reject_method"     : "avsigclip",
+        "memory"            : None,
     }
     stackSkyFrames = {
         "suffix"            : "_skyStacked",
         "dilation"          : 2,
         "apply_dq"          : True,
         "mask_objects"      : True,
+        "memory"            : None,
         "nhigh"             : 1,
         "nlow"              : 1,
         "operation"         : "median",
@@ -4,6 +4,7 @@
 #                                                              primitives_ccd.py
 # ------------------------------------------------------------------------------
 import numpy as np
+from itertools import repeat
 
 from astropy.modeling import models, fitting
 from scipy.interpolate import UnivariateSpline, LSQUnivariateSpline
@@ -11,6 +12,7 @@ from scipy.interpolate import UnivariateSpline, LSQUnivariateSpline
 from gempy.gemini import gemini_tools as gt
 
 from geminidr import PrimitivesBASE
+from geminidr.parallel import map_extensions
 from .parameters_ccd import ParametersCCD
 
 from recipe_system.utils.decorators import parameter_override
@@ -149,7 +151,8 @@ class CCD(PrimitivesBASE):
             osec_list = ad.overscan_section()
             dsec_list = ad.data_section()
             ybinning = ad.detector_y_bin()
-            for i, (ext, osec, dsec) in enumerate(zip(ad, osec_list, dsec_list)):
+            sections, weights = [], []
+            for ext, osec, dsec in zip(ad, osec_list, dsec_list):
                 x1, x2, y1, y2 = osec.x1, osec.x2, osec.y1, osec.y2
                 if x1 > dsec.x1:  # Bias on right
                     x1 += nbiascontam
@@ -157,67 +160,27 @@ class CCD(PrimitivesBASE):
                 else:  # Bias on left
                     x1 += 1
                     x2 -= nbiascontam
+                sections.append((x1, x2, y1, y2))
 
-                row = np.arange(y1, y2)
-                data = np.mean(ext.data[y1:y2, x1:x2], axis=1)
                 # Weights are used to determine number of spline pieces
                 # should be the estimate of the mean
                 wt = np.sqrt(x2-x1-1) / ext.read_noise()
                 if ext.hdr.get('BUNIT', 'adu').lower() == 'adu':
                     wt *= ext.gain()
-
-                medboxsize = 2  # really 2n+1 = 5
-                for iter in range(niterate+1):
-                    # The UnivariateSpline will make reduced-chi^2=1 so it will
-                    # fit bad rows. Need to mask these before starting, so use a
-                    # running median. Probably a good starting point for all fits.
-                    if iter == 0 or func == 'none':
-                        medarray = np.full((medboxsize * 2 + 1, y2 - y1), np.nan)
-                        for i in range(-medboxsize, medboxsize + 1):
-                            mx1 = max(i, 0)
-                            mx2 = min(y2 - y1, y2 - y1 + i)
-                            medarray[medboxsize + i, mx1:mx2] = data[:mx2 - mx1]
-                        runmed = np.ma.median(np.ma.masked_where(np.isnan(medarray),
-                                                                 medarray), axis=0)
-                        residuals = data - runmed
-                        sigma = np.sqrt(x2 - x1 + 1) / wt  # read noise
-
-                    mask = np.where(np.logical_or(residuals > hi_rej * sigma
-                                        if hi_rej is not None else False,
-                                        residuals < -lo_rej * sigma
-                                        if lo_rej is not None else False), True, False)
-
-                    # Don't clip any pixels if iter==0
-                    if func == 'none' and iter < niterate:
-                        # Replace bad data with running median
-                        data = np.where(mask, runmed, data)
-                    elif func != 'none':
-                        if func == 'spline':
-                            if order:
-                                # Equally-spaced knots (like IRAF)
-                                knots = np.linspace(row[0], row[-1], order+1)[1:-1]
-                                bias = LSQUnivariateSpline(row[~mask], data[~mask], knots)
-                            else:
-                                bias = UnivariateSpline(row[~mask], data[~mask],
-                                                        w=[wt]*np.sum(~mask))
-                        else:
-                            bias_init = models.Chebyshev1D(degree=order,
-                                                           c0=np.median(data[~mask]))
-                            fit_f = fitting.LinearLSQFitter()
-                            bias = fit_f(bias_init, row[~mask], data[~mask])
-
-                        residuals = data - bias(row)
-                        sigma = np.std(residuals[~mask])
-
-                # using "-=" won't change from int to float
-                if func != 'none':
-                    data = bias(np.arange(0, ext.data.shape[0]))
-                ext.data = ext.data - np.tile(data,
-                                        (ext.data.shape[1],1)).T.astype(np.float32)
-
+                weights.append(wt)
+
+            # The fits are independent, so do them concurrently, and update
+            # the headers afterwards, in order
+            results = map_extensions(_subtract_overscan, ad.data, sections,
+                                     weights, repeat(func), repeat(order),
+                                     repeat(niterate), repeat(lo_rej),
+                                     repeat(hi_rej))
+            for ext, (x1, x2, y1, y2), (data, level, sigma) in zip(ad, sections,
+                                                                   results):
+                ext.data = data
                 ext.hdr.set('OVERSEC', '[{}:{},{}:{}]'.format(x1+1,x2,y1+1,y2),
                             self.keyword_comments['OVERSEC'])
-                ext.hdr.set('OVERSCAN', np.mean(data),
+                ext.hdr.set('OVERSCAN', level,
                             self.keyword_comments['OVERSCAN'])
                 ext.hdr.set('OVERRMS', sigma, self.keyword_comments['OVERRMS'])
 
@@ -257,3 +220,83 @@ class CCD(PrimitivesBASE):
             gt.mark_history(ad, primname=self.myself(), keyword=timestamp_key)
             ad.update_filename(suffix=sfx, strip=True)
         return adinputs
+
+def _subtract_overscan(sci, section, wt, func, order, niterate, lo_rej, hi_rej):
+    """
+    Fits the overscan level along the rows of a science array, and subtracts
+    it. This works on plain arrays, so it can be run concurrently for all
+    the extensions.
+
+    Parameters
+    ----------
+    sci: ndarray
+        science data
+    section: tuple
+        (x1, x2, y1, y2) of the overscan region to use (python-style)
+    wt: float
+        weight of each row (for the spline fitting)
+    func: str
+        function to fit ("polynomial" | "spline" | "none")
+    order: int/None
+        order of Chebyshev fit or spline
+    niterate: int
+        number of rejection iterations
+    lo_rej, hi_rej: float/None
+        rejection thresholds, in standard deviations
+
+    Returns
+    -------
+    tuple: overscan-subtracted data, mean overscan level, and rms
+    """
+    x1, x2, y1, y2 = section
+    row = np.arange(y1, y2)
+    data = np.mean(sci[y1:y2, x1:x2], axis=1)
+
+    medboxsize = 2  # really 2n+1 = 5
+    for iter in range(niterate+1):
+        # The UnivariateSpline will make reduced-chi^2=1 so it will
+        # fit bad rows. Need to mask these before starting, so use a
+        # running median. Probably a good starting point for all fits.
+        if iter == 0 or func == 'none':
+            medarray = np.full((medboxsize * 2 + 1, y2 - y1), np.nan)
+            for i in range(-medboxsize, medboxsize + 1):
+                mx1 = max(i, 0)
+                mx2 = min(y2 - y1, y2 - y1 + i)
+                medarray[medboxsize + i, mx1:mx2] = data[:mx2 - mx1]
+            runmed = np.ma.median(np.ma.masked_where(np.isnan(medarray),
+                                                     medarray), axis=0)
+            residuals = data - runmed
+            sigma = np.sqrt(x2 - x1 + 1) / wt  # read noise
+
+        mask = np.where(np.logical_or(residuals > hi_rej * sigma
+                            if hi_rej is not None else False,
+                            residuals < -lo_rej * sigma
+                            if lo_rej is not None else False), True, False)
+
+        # Don't clip any pixels if iter==0
+        if func == 'none' and iter < niterate:
+            # Replace bad data with running median
+            data = np.where(mask, runmed, data)
+        elif func != 'none':
+            if func == 'spline':
+                if order:
+                    # Equally-spaced knots (like IRAF)
+                    knots = np.linspace(row[0], row[-1], order+1)[1:-1]
+                    bias = LSQUnivariateSpline(row[~mask], data[~mask], knots)
+                else:
+                    bias = UnivariateSpline(row[~mask], data[~mask],
+                                            w=[wt]*np.sum(~mask))
+            else:
+                bias_init = models.Chebyshev1D(degree=order,
+                                               c0=np.median(data[~mask]))
+                fit_f = fitting.LinearLSQFitter()
+                bias = fit_f(bias_init, row[~mask], data[~mask])
+
+            residuals = data - bias(row)
+            sigma = np.std(residuals[~mask])
+
+    # using "-=" won't change from int to float
+    if func != 'none':
+        data = bias(np.arange(0, sci.shape[0]))
+    sci = sci - np.tile(data, (sci.shape[1],1)).T.astype(np.float32)
+    return sci, np.mean(data), sigma
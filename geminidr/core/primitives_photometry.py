@@ -4,6 +4,7 @@
 #                                                       primitives_photometry.py
 # ------------------------------------------------------------------------------
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from astropy.stats import sigma_clip
 from astropy.table import Column
 
@@ -12,14 +13,20 @@ from astrodata.fits import add_header_to_table
 from datetime import datetime
 
 from gempy.gemini import gemini_tools as gt
-from gempy.gemini.gemini_catalog_client import get_fits_table
 from gempy.gemini.eti.sextractoreti import SExtractorETI
+from gempy.utils.lazyimport import lazy_import
 from geminidr.gemini.lookups import color_corrections
 
 from geminidr import PrimitivesBASE
 from .parameters_photometry import ParametersPhotometry
 
 from recipe_system.utils.decorators import parameter_override
+
+# The VO client is only needed by addReferenceCatalog
+catalog_client = lazy_import('gempy.gemini.gemini_catalog_client')
+
+# Maximum number of stamp pixels measured at once by _profile_sources()
+PROFILE_CHUNK = 1 << 22
 # ------------------------------------------------------------------------------
 @parameter_override
 class Photometry(PrimitivesBASE):
@@ -98,7 +105,7 @@ class Photometry(PrimitivesBASE):
             import warnings
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                refcat = get_fits_table(source, ra, dec, radius)
+                refcat = catalog_client.get_fits_table(source, ra, dec, radius)
 
             if refcat is None:
                log.stdinfo("No reference catalog sources found for {}".
@@ -436,6 +443,9 @@ def _profile_sources(ad, seeing_estimate=None):
     
     The 50% encircled energy (EE50) is just determined from a cumulative sum
     of pixel values, sorted by distance from source center. 
+
+    The stamps of all the sources of an extension are measured together
+    (PROFILE_CHUNK pixels at a time), see _profile_stamps().
     """
     for ext in ad:
         try:
@@ -453,77 +463,112 @@ def _profile_sources(ad, seeing_estimate=None):
             stamp_size = max(10,int(0.5/ext.pixel_scale()))
         else:
             stamp_size = max(10,int(1.2*seeing_estimate/ext.pixel_scale()))
-        # Make a default grid to use for distance measurements
-        dist = np.mgrid[-stamp_size:stamp_size,-stamp_size:stamp_size]+0.5
 
-        fwhm_list = []
-        e50d_list = []
-        newmax_list = []
-        for i in range(0, len(objcat)):
+        nobj = len(objcat)
+        fwhm_list = [-999] * nobj
+        e50d_list = [-999] * nobj
+        newmax_list = [catmaxflux[i] for i in range(nobj)]
+
+        # Sources with enough room for a stamp, with their integer and
+        # fractional pixel positions
+        sz = stamp_size
+        good = []
+        for i in range(nobj):
             xc = catx[i] - 0.5
             yc = caty[i] - 0.5
-            bg = catbg[i]
-            tf = cattotalflux[i]
-            mf = catmaxflux[i]
-
-            # Check that there's enough room for a stamp
-            sz = stamp_size
             if (int(yc)-sz<0 or int(xc)-sz<0 or
                 int(yc)+sz>=data.shape[0] or int(xc)+sz>=data.shape[1]):
-                fwhm_list.append(-999)
-                e50d_list.append(-999)
-                newmax_list.append(mf)
                 continue
-
-            # Estimate new FLUX_MAX from pixels around peak
-            mf = np.max(data[int(yc)-2:int(yc)+3,int(xc)-2:int(xc)+3]) - bg
-            # Bright sources in IR images can "volcano", so revert to
-            # catalog value if these pixels are negative
-            if mf < 0:
-                mf = catmaxflux[i]
-
-            # Get image stamp around center point
-            stamp=data[int(yc)-sz:int(yc)+sz,int(xc)-sz:int(xc)+sz]
-
-            # Reset grid to correct center coordinates
-            shift_dist = dist.copy()
-            shift_dist[0] += int(yc)-yc
-            shift_dist[1] += int(xc)-xc
-    
-            # Square root of the sum of the squares of the distances
-            rdistsq = np.sum(shift_dist**2,axis=0)
-
-            # Radius and flux arrays for the radial profile
-            rpr = rdistsq.flatten()
-            rpv = stamp.flatten() - bg
-    
-            # Sort by the radius
-            sort_order = np.argsort(rpr) 
-            radsq = rpr[sort_order]
-            flux = rpv[sort_order]
-
-            # Count pixels above half flux and circularize this area
-            # Do one iteration in case there's a neighbouring object
-            halfflux = 0.5 * mf
-            hwhmsq = np.sum(flux>halfflux)/np.pi
-            hwhm = np.sqrt(np.sum(flux[radsq<1.5*hwhmsq]>halfflux)/np.pi)
-            if hwhm < stamp_size:
-                fwhm_list.append(2*hwhm)
-            else:
-                fwhm_list.append(-999)
-
-            # Find the first radius that encircles half the total flux
-            sumflux = np.cumsum(flux)
-            halfflux = 0.5 * tf
-            first_50pflux = np.where(sumflux>=halfflux)[0]
-            if first_50pflux.size>0:
-                e50d_list.append(2*np.sqrt(radsq[first_50pflux[0]]))
-            else:
-                e50d_list.append(-999)
-
-            newmax_list.append(mf)
+            good.append((i, int(yc), int(xc), int(yc)-yc, int(xc)-xc))
+
+        chunk = max(1, PROFILE_CHUNK // (2*sz)**2)
+        for start in range(0, len(good), chunk):
+            sources = good[start:start+chunk]
+            index = [src[0] for src in sources]
+            fwhm, e50d, newmax = _profile_stamps(
+                data, sources, sz, [catbg[i] for i in index],
+                [cattotalflux[i] for i in index],
+                [catmaxflux[i] for i in index])
+            for i, f, e, m in zip(index, fwhm, e50d, newmax):
+                fwhm_list[i] = f
+                e50d_list[i] = e
+                newmax_list[i] = m
 
         objcat["PROFILE_FWHM"][:] = np.array(fwhm_list)
         objcat["PROFILE_EE50"][:] = np.array(e50d_list)
         objcat["FLUX_MAX"][:] = np.array(newmax_list)
     return ad
+
+def _cast_like(array, scalars):
+    """
+    Returns `array` and the `scalars` (one per row of `array`) cast to the
+    type NumPy uses for an operation between `array` and one of them, so
+    that the batched operation gives the same results as one per row.
+    """
+    dtype = np.result_type(array, *{type(x): x for x in scalars}.values())
+    return array.astype(dtype, copy=False), np.array(scalars, dtype=dtype)
+
+def _profile_stamps(data, sources, stamp_size, bgs, totalfluxes, maxfluxes):
+    """
+    Does the measurements of _profile_sources() for a batch of sources,
+    given as (index, int(yc), int(xc), int(yc)-yc, int(xc)-xc) tuples
+    whose stamps lie within `data`, with their background, total flux and
+    maximum flux from the catalogue.
+
+    Returns lists of FWHM, EE50 diameter, and new FLUX_MAX.
+    """
+    sz = stamp_size
+    nsrc = len(sources)
+    iy = np.array([src[1] for src in sources])
+    ix = np.array([src[2] for src in sources])
+    # One stamp per source, as a (nsources, 2*sz, 2*sz) array, picked from
+    # a (read only) view of all the 2*sz x 2*sz windows of the data
+    windows = as_strided(data, shape=(data.shape[0]-2*sz+1,
+                                      data.shape[1]-2*sz+1, 2*sz, 2*sz),
+                         strides=data.strides*2)
+    stamps = windows[iy-sz, ix-sz]
+
+    # Estimate new FLUX_MAX from pixels around peak
+    peaks = stamps[:, sz-2:sz+3, sz-2:sz+3].max(axis=(1, 2))
+    newmax = []
+    for peak, bg, catmax in zip(peaks, bgs, maxfluxes):
+        mf = peak - bg
+        # Bright sources in IR images can "volcano", so revert to
+        # catalog value if these pixels are negative
+        newmax.append(catmax if mf < 0 else mf)
+
+    # Square of the distance of each pixel to the source centre, from the
+    # squared distances of its row and column
+    dist = np.arange(-sz, sz)+0.5
+    dy = dist + np.array([src[3] for src in sources],
+                         dtype=dist.dtype)[:, np.newaxis]
+    dx = dist + np.array([src[4] for src in sources],
+                         dtype=dist.dtype)[:, np.newaxis]
+    rpr = ((dy**2)[:, :, np.newaxis] +
+           (dx**2)[:, np.newaxis, :]).reshape(nsrc, -1)
+    stamps, bgs = _cast_like(stamps.reshape(nsrc, -1), bgs)
+    rpv = stamps - bgs[:, np.newaxis]
+
+    # Count pixels above half flux and circularize this area
+    # Do one iteration in case there's a neighbouring object
+    # (the counts don't depend on the order of the pixels)
+    cflux, halfflux = _cast_like(rpv, [0.5 * mf for mf in newmax])
+    above = cflux > halfflux[:, np.newaxis]
+    hwhmsq = np.sum(above, axis=1)/np.pi
+    hwhm = np.sqrt(np.sum(above & (rpr < 1.5*hwhmsq[:, np.newaxis]),
+                          axis=1)/np.pi)
+    fwhm = np.where(hwhm < stamp_size, 2*hwhm, -999)
+
+    # Flux sorted by the radius. Find the first radius that encircles
+    # half the total flux
+    rows = np.arange(nsrc)
+    sort_order = np.argsort(rpr, axis=1)
+    flux = rpv[rows[:, np.newaxis], sort_order]
+    sumflux, halfflux = _cast_like(np.cumsum(flux, axis=1),
+                                   [0.5 * tf for tf in totalfluxes])
+    reached = sumflux >= halfflux[:, np.newaxis]
+    first_50pflux = sort_order[rows, np.argmax(reached, axis=1)]
+    e50d = np.where(reached.any(axis=1),
+                    2*np.sqrt(rpr[rows, first_50pflux]), -999)
+
+    return list(fwhm), list(e50d), newmax
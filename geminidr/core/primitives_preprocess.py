@@ -17,6 +17,7 @@ from gempy.gemini import gemini_tools as gt
 from geminidr.gemini.lookups import DQ_definitions as DQ
 
 from geminidr import PrimitivesBASE
+from geminidr.parallel import map_extensions
 from .parameters_preprocess import ParametersPreprocess
 
 from recipe_system.utils.decorators import parameter_override
@@ -90,11 +91,13 @@ class Preprocess(PrimitivesBASE):
             # and the pixel data in each variance extension by the gain squared
             log.status("Converting {} from ADU to electrons by multiplying by "
                        "the gain".format(ad.filename))
-            for ext, gain in zip(ad, gain_list):
+            results = map_extensions(_multiply_planes, ad.data, ad.variance,
+                                     gain_list)
+            for ext, gain, (data, variance) in zip(ad, gain_list, results):
                 extver = ext.hdr['EXTVER']
                 log.stdinfo("  gain for EXTVER {} = {}".format(extver, gain))
-                ext.multiply(gain)
-            
+                ext.reset(data, variance=variance)
+
             # Update the headers of the AstroData Object. The pixel data now
             # has units of electrons so update the physical units keyword.
             ad.hdr.set('BUNIT', 'electron', self.keyword_comments['BUNIT'])
@@ -1189,4 +1192,24 @@ class Preprocess(PrimitivesBASE):
             # Timestamp and update the filename
             gt.mark_history(ad, primname=self.myself(), keyword=timestamp_key)
             ad.update_filename(suffix=sfx, strip=True)
-        return adinputs
\ No newline at end of file
+        return adinputs
+
+def _multiply_planes(data, variance, factor):
+    """
+    Multiplies a science array by a factor, and its variance (which may be
+    None) by the factor squared. The arrays are modified in place if their
+    type can hold the result.
+
+    Returns
+    -------
+    tuple: the new science and variance arrays
+    """
+    def scale(array, value):
+        if np.result_type(array, value) == array.dtype and array.flags.writeable:
+            array *= value
+            return array
+        return array * value
+
+    if variance is not None:
+        variance = scale(variance, factor * factor)
+    return scale(data, factor), variance
@@ -5,15 +5,16 @@
 # ------------------------------------------------------------------------------
 import numpy as np
 from astropy.wcs import WCS
-from scipy.ndimage import affine_transform
 
 from gempy.library import astrotools as at
+from gempy.library.resample import Resampler
 from gempy.gemini import gemini_tools as gt
 from gempy.utils import logutils
 
 from geminidr.gemini.lookups import DQ_definitions as DQ
 
 from geminidr import PrimitivesBASE
+from geminidr.parallel import ExtensionExecutor
 from .parameters_resample import ParametersResample
 
 from recipe_system.utils.decorators import parameter_override
@@ -57,11 +58,16 @@ class Resample(PrimitivesBASE):
         differently. DQ flags are set bit-wise, such that each pixel is the 
         sum of any of the following values: 0=good pixel,
         1=bad pixel (from bad pixel mask), 2=nonlinear, 4=saturated, etc.
-        To transform the DQ plane without losing flag information, it is
-        unpacked into separate masks, each of which is transformed in the same
-        way as the science data. A pixel is flagged if it had greater than
-        1% influence from a bad pixel. The transformed masks are then added
+        To transform the DQ plane without losing flag information, each bit
+        is transformed in the same way as the science data, but only near
+        the pixels that have it set. A pixel is flagged if it had greater than
+        1% influence from a bad pixel. The transformed bits are then added
         back together to generate the transformed DQ plane.
+
+        The input coordinates of the output pixels are computed once per
+        image, for all its planes, and the images are transformed
+        concurrently, as many at a time as there are workers in the
+        [parallel] configuration.
         
         In order not to lose any data, the output image arrays (including the
         reference image's) are expanded with respect to the input image arrays.
@@ -131,50 +137,69 @@ class Resample(PrimitivesBASE):
         # -------------------- END establish reference frame -----------------------
 
         # --------------------   BEGIN transform data ...  -------------------------
-        for ad, corners in zip(adinputs[1:], xy_img_corners):
+        transforms = []
+        for ad in adinputs[1:]:
             if interpolator:
-                trans_parameters = _composite_transformation_matrix(ad,
-                                        out_wcs, self.keyword_comments)
-                matrix, matrix_det, img_wcs, offset = trans_parameters
+                transforms.append(_composite_transformation_matrix(ad,
+                                        out_wcs, self.keyword_comments))
             else:
-                shift = _composite_from_ref_wcs(ad, out_wcs,
-                                                self.keyword_comments)
-                matrix_det = 1.0
-
-            # transform corners to find new location of original data
-            data_corners = out_wcs.all_world2pix(
-                img_wcs.all_pix2world(corners, 0), 1)
-            area_keys = _build_area_keys(data_corners)
-
+                transforms.append(_composite_from_ref_wcs(ad, out_wcs,
+                                                self.keyword_comments))
+
+        # The resampling only works on arrays, so do it for as many images
+        # concurrently as there are workers, and attach their new planes
+        # before resampling the next ones, so that only the planes of one
+        # chunk of images are held at a time
+        executor = ExtensionExecutor()
+        for start in range(0, len(transforms), executor.workers):
+            stop = start + executor.workers
+            chunk = adinputs[start+1:stop+1]
             if interpolator:
-                kwargs = {'matrix': matrix, 'offset': offset,
-                          'order': interpolators[interpolator],
-                          'output_shape': out_shape}
-                new_var = None if ad[0].variance is None else \
-                    affine_transform(ad[0].variance, cval=0.0, **kwargs)
-                new_mask = None if ad[0].mask is None else \
-                    _transform_mask(ad[0].mask, **kwargs)
-                if hasattr(ad[0], 'OBJMASK'):
-                    ad[0].OBJMASK = _transform_mask(ad[0].OBJMASK, **kwargs)
-                ad[0].reset(affine_transform(ad[0].data, cval=0.0, **kwargs),
-                            new_mask, new_var)
-            else:
-                padding = tuple((int(-s), out-int(img-s)) for s, out, img in
-                                zip(shift, out_shape, ad[0].data.shape))
-                _pad_image(ad, padding)
-
-            if abs(1.0 - matrix_det) > 1e-6:
-                    log.fullinfo("Multiplying by {} to conserve flux".format(matrix_det))
-                    # Allow the arith toolbox to do the multiplication
-                    # so that variance is handled correctly
-                    ad.multiply(matrix_det)
-
-            for key in area_keys:
-                ref_image[0].hdr.set(*key)
-
-            # Timestamp and update filename
-            gt.mark_history(adinput=ad, keyword=timestamp_key)
-            ad.update_filename(suffix=sfx, strip=True)
+                resampled = executor.map(_resample_planes,
+                    [ad[0].data for ad in chunk],
+                    [ad[0].mask for ad in chunk],
+                    [ad[0].variance for ad in chunk],
+                    [getattr(ad[0], 'OBJMASK', None) for ad in chunk],
+                    [matrix for matrix, _, _, _ in transforms[start:stop]],
+                    [offset for _, _, _, offset in transforms[start:stop]],
+                    [interpolators[interpolator]] * len(chunk),
+                    [out_shape] * len(chunk))
+
+            for i, ad in enumerate(chunk, start):
+                corners = xy_img_corners[i]
+                if interpolator:
+                    matrix, matrix_det, img_wcs, offset = transforms[i]
+                else:
+                    shift = transforms[i]
+                    matrix_det = 1.0
+
+                # transform corners to find new location of original data
+                data_corners = out_wcs.all_world2pix(
+                    img_wcs.all_pix2world(corners, 0), 1)
+                area_keys = _build_area_keys(data_corners)
+
+                if interpolator:
+                    new_data, new_mask, new_var, new_objmask = resampled.pop(0)
+                    if new_objmask is not None:
+                        ad[0].OBJMASK = new_objmask
+                    ad[0].reset(new_data, new_mask, new_var)
+                else:
+                    padding = tuple((int(-s), out-int(img-s)) for s, out, img in
+                                    zip(shift, out_shape, ad[0].data.shape))
+                    _pad_image(ad, padding)
+
+                if abs(1.0 - matrix_det) > 1e-6:
+                        log.fullinfo("Multiplying by {} to conserve flux".format(matrix_det))
+                        # Allow the arith toolbox to do the multiplication
+                        # so that variance is handled correctly
+                        ad.multiply(matrix_det)
+
+                for key in area_keys:
+                    ref_image[0].hdr.set(*key)
+
+                # Timestamp and update filename
+                gt.mark_history(adinput=ad, keyword=timestamp_key)
+                ad.update_filename(suffix=sfx, strip=True)
 
         return adinputs
 
@@ -354,20 +379,41 @@ def _pad_image(ad, padding):
         ad[0].OBJMASK = np.pad(ad[0].OBJMASK, padding, 'constant',
                              constant_values=0)
 
-def _transform_mask(mask, **kwargs):
+def _resample_planes(data, mask, variance, objmask, matrix, offset, order,
+                     output_shape):
     """
-    Transform the DQ plane, bit by bit. Since np.unpackbits() only works
-    on uint8 data, we have to do this by hand
+    Transforms the planes of an image onto the output pixel grid, with a
+    single computation of the input coordinates of the output pixels. This
+    works on plain arrays, so it can be run concurrently for all the images.
+
+    Parameters
+    ----------
+    data: ndarray
+        science data
+    mask: ndarray/None
+        DQ plane
+    variance: ndarray/None
+        variance plane
+    objmask: ndarray/None
+        OBJMASK
+    matrix: 2x2 array
+        transformation matrix (output -> input)
+    offset: array
+        offset of the transformation
+    order: int
+        spline interpolation order
+    output_shape: tuple
+        shape of the transformed planes
+
+    Returns
+    -------
+    tuple: transformed data, mask, variance and objmask (None where the
+           input plane is None)
     """
-    trans_mask = np.zeros(kwargs['output_shape'], dtype=np.uint16)
-    for j in range(0, 16):
-        bit = 2**j
-        # Only transform bits that have a pixel set. But we always want
-        # to do one transformation so we can pad the data with DQ.no_data
-        if bit==DQ.no_data or np.sum(mask & bit) > 0:
-            temp_mask = affine_transform((mask & 2**j).astype(np.float32),
-                                         cval=DQ.no_data if bit==DQ.no_data
-                                         else 0, **kwargs)
-            trans_mask += np.where(np.abs(temp_mask>0.01*bit), bit,
-                                          0).astype(np.uint16)
-    return trans_mask
+    resampler = Resampler(matrix, offset, output_shape, order=order)
+    return (resampler.transform(data),
+            None if mask is None else
+            resampler.transform_mask(mask, no_data=DQ.no_data),
+            None if variance is None else resampler.transform(variance),
+            None if objmask is None else
+            resampler.transform_mask(objmask, no_data=DQ.no_data))
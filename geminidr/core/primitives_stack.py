@@ -3,13 +3,17 @@
 #
 #                                                            primitives_stack.py
 # ------------------------------------------------------------------------------
+import os
 import numpy as np
 from copy import deepcopy
 
 from astropy import table
+from astropy.io import fits
+
+import astrodata
 
 from gempy.gemini import gemini_tools as gt
-from gempy.gemini.eti import gemcombineeti
+from gempy.library import nddops
 from gempy.utils import logutils
 
 from geminidr import PrimitivesBASE
@@ -91,7 +95,9 @@ class Stack(PrimitivesBASE):
         operation: str
             combine method
         reject_method: str
-            type of pixel rejection (passed to gemcombine)
+            type of pixel rejection
+        memory: float/None
+            available memory (in GB) for the stacking calculations
         """
         log = self.log
         log.debug(gt.log_message("primitive", self.myself(), "starting"))
@@ -108,6 +114,19 @@ class Stack(PrimitivesBASE):
             if not "PREPARED" in ad.tags:
                 raise IOError("{} must be prepared" .format(ad.filename))
 
+        memory = params["memory"]
+        if memory is not None:
+            memory = int(memory * 1e9)
+
+        # Stacks that don't fit in memory are combined a band at a time
+        # straight from the files on disk, provided the inputs haven't been
+        # loaded yet. This has to be checked before anything touches the
+        # pixel data.
+        stream = (all(not ad.is_loaded and ad.path is not None and
+                      os.path.exists(ad.path) for ad in adinputs) and
+                  sum(os.path.getsize(ad.path) for ad in adinputs) >
+                  (memory or nddops.DEFAULT_MEMORY))
+
         # Determine the average gain from the input AstroData objects and
         # add in quadrature the read noise
         gains = [ad.gain() for ad in adinputs]
@@ -123,23 +142,62 @@ class Stack(PrimitivesBASE):
         read_noise_list = [np.sqrt(np.sum([rn[i]*rn[i] for rn in read_noises]))
                                      for i in range(nexts)]
 
-        # Instantiate ETI and then run the task
-        gemcombine_task = gemcombineeti.GemcombineETI(adinputs, params)
-        ad_out = gemcombine_task.run()
+        if len(set(len(ad) for ad in adinputs)) > 1:
+            raise IOError("Not all inputs have the same number of extensions")
+
+        stack_params = {k: params[k] for k in ("operation", "reject_method",
+                                               "apply_dq", "nlow", "nhigh")}
+        log.stdinfo("Combining {} inputs with {} and {} rejection".format(
+            len(adinputs), params["operation"], params["reject_method"]))
+
+        # Combine each extension in turn, directly from the AD objects (or
+        # the files), and build the output from the PHU and headers of the
+        # first input
+        hdulists, stream_inputs = (_open_stream_inputs(adinputs) if stream
+                                   else (None, None))
+        if hdulists is not None:
+            log.stdinfo("Inputs are larger than the available memory; "
+                        "combining them directly from disk")
+        ad_out = astrodata.create(adinputs[0].header[0])
+        try:
+            for index, header in enumerate(adinputs[0].header[1:]):
+                if hdulists is None:
+                    data, mask, variance = nddops.stack_nddata(
+                        [ad[index].nddata for ad in adinputs], memory=memory,
+                        **stack_params)
+                else:
+                    data, mask, variance = nddops.stack_nddata(
+                        stream_inputs[index], memory=memory,
+                        allocate=nddops.disk_allocate, **stack_params)
+                ad_out.append(data, header=header)
+                ad_out[-1].reset(data, mask=mask, variance=variance)
+
+            # Propagate REFCAT as the union of all input REFCATs
+            if hdulists is None:
+                refcats = [ad.REFCAT for ad in adinputs
+                           if hasattr(ad, 'REFCAT')]
+            else:
+                refcats = [table.Table(hdulist['REFCAT'].data)
+                           for hdulist in hdulists if 'REFCAT' in hdulist]
+        finally:
+            if hdulists is not None:
+                for hdulist in hdulists:
+                    hdulist.close()
 
-        # Propagate REFCAT as the union of all input REFCATs
-        refcats = [ad.REFCAT for ad in adinputs if hasattr(ad, 'REFCAT')]
         if refcats:
             out_refcat = table.unique(table.vstack(refcats,
                                 metadata_conflicts='silent'), keys='Cat_Id')
             out_refcat['Cat_Id'] = range(1, len(out_refcat)+1)
             ad_out.REFCAT = out_refcat
 
-        # Gemcombine sets the GAIN keyword to the sum of the gains;
-        # reset it to the average instead. Set the RDNOISE to the
-        # sum in quadrature of the input read noise. Set the keywords in
-        # the variance and data quality extensions to be the same as the
-        # science extensions.
+        ad_out.filename = adinputs[0].filename
+        ad_out.phu.set('NCOMBINE', len(adinputs),
+                       self.keyword_comments['NCOMBINE'])
+
+        # Set the GAIN keyword to the average of the input gains, and the
+        # RDNOISE to the sum in quadrature of the input read noise. Set the
+        # keywords in the variance and data quality extensions to be the
+        # same as the science extensions.
         for ext, gain, rn in zip(ad_out, gain_list, read_noise_list):
             ext.hdr.set('GAIN', gain, self.keyword_comments['GAIN'])
             ext.hdr.set('RDNOISE', rn, self.keyword_comments['RDNOISE'])
@@ -178,7 +236,9 @@ class Stack(PrimitivesBASE):
         operation: str
             combine method
         reject_method: str
-            type of pixel rejection (passed to gemcombine)
+            type of pixel rejection (passed to stackFrames)
+        memory: float/None
+            available memory (in GB) for the stacking calculations
         """
         log = self.log
         log.debug(gt.log_message("primitive", self.myself(), "starting"))
@@ -228,4 +288,31 @@ def _can_stack(adinputs):
     :type adinput: List of AstroData instances
     """
     ref_pa = adinputs[0].phu['PA']
-    return all(abs(ad.phu['PA'] - ref_pa) < 1.0 for ad in adinputs)
\ No newline at end of file
+    return all(abs(ad.phu['PA'] - ref_pa) < 1.0 for ad in adinputs)
+
+def _open_stream_inputs(adinputs):
+    """
+    This function opens the files of a list of (not yet loaded) AstroData
+    objects as memory-mapped HDULists, and creates the inputs for streaming
+    each extension through nddops.stack_nddata().
+
+    :param adinputs: List of AstroData instances
+    :type adinputs: List of AstroData instances
+
+    :return: the HDULists (to be closed by the caller) and a list, for each
+             extension, of the FitsStackInput objects; or (None, None) if
+             the files can't be streamed
+    """
+    hdulists = [fits.open(ad.path, memmap=True, do_not_scale_image_data=True)
+                for ad in adinputs]
+    try:
+        stream_inputs = [[nddops.FitsStackInput(hdulist,
+                                                ad.header[index+1]['EXTVER'])
+                          for ad, hdulist in zip(adinputs, hdulists)]
+                         for index in range(len(adinputs[0]))]
+    except (KeyError, IndexError):
+        # Not a standard SCI/VAR/DQ file (e.g., a simple FITS image)
+        for hdulist in hdulists:
+            hdulist.close()
+        return None, None
+    return hdulists, stream_inputs
\ No newline at end of file
@@ -15,6 +15,7 @@ from gempy.utils import logutils
 from geminidr.gemini.lookups import DQ_definitions as DQ
 
 from geminidr import PrimitivesBASE
+from geminidr.parallel import map_extensions
 from .parameters_standardize import ParametersStandardize
 
 from recipe_system.utils.decorators import parameter_override
@@ -75,6 +76,9 @@ class Standardize(PrimitivesBASE):
                 final_bpm = clip_method(ad, aux=bpm, aux_type='bpm',
                     return_dtype=DQ.datatype)
 
+            # Work out what needs flagging (and log it) first, then compute
+            # the DQ planes concurrently
+            exts, jobs = [], []
             for ext, bpm_ext in zip(ad, final_bpm):
                 extver = ext.hdr['EXTVER']
                 if ext.mask is not None:
@@ -85,17 +89,10 @@ class Standardize(PrimitivesBASE):
                 non_linear_level = ext.non_linear_level()
                 saturation_level = ext.saturation_level()
 
-                # Need to create the array first for 3D raw F2 data, with 2D BPM
-                ext.mask = np.zeros_like(ext.data, dtype=DQ.datatype)
-                if bpm_ext is not None:
-                    ext.mask |= bpm_ext.data
-
                 if saturation_level:
                     log.fullinfo('Flagging saturated pixels in {}:{} '
                                  'above level {:.2f}'.
                                  format(ad.filename, extver, saturation_level))
-                    ext.mask |= np.where(ext.data >= saturation_level,
-                                         DQ.saturated, 0).astype(DQ.datatype)
 
                 if non_linear_level:
                     if saturation_level:
@@ -104,49 +101,29 @@ class Standardize(PrimitivesBASE):
                                          'above level {:.2f}'.
                                          format(ad.filename, extver,
                                                 non_linear_level))
-                            ext.mask |= np.where((ext.data >= non_linear_level) &
-                                                 (ext.data < saturation_level),
-                                                 DQ.non_linear, 0).astype(DQ.datatype)
-                            # Readout modes of IR detectors can result in
-                            # saturated pixels having values below the
-                            # saturation level. Flag those. Assume we have an
-                            # IR detector here because both non-linear and
-                            # saturation levels are defined and nonlin<sat
-                            regions, nregions = measurements.label(
-                                                ext.data < non_linear_level)
-                            # In all my tests, region 1 has been the majority
-                            # of the image; however, I cannot guarantee that
-                            # this is always the case and therefore we should
-                            # check the size of each region
-                            region_sizes = measurements.labeled_comprehension(
-                                ext.data, regions, np.arange(1, nregions+1),
-                                len, int, 0)
-                            # First, assume all regions are saturated, and
-                            # remove any very large ones. This is much faster
-                            # than progressively adding each region to DQ
-                            hidden_saturation_array = np.where(regions > 0,
-                                                    4, 0).astype(DQ.datatype)
-                            for region in range(1, nregions+1):
-                                # Limit of 10000 pixels for a hole is a bit arbitrary
-                                if region_sizes[region-1] > 10000:
-                                    hidden_saturation_array[regions==region] = 0
-                            ext.mask |= hidden_saturation_array
-
                         elif saturation_level < non_linear_level:
                             log.warning('{}:{} has saturation level less than '
                                 'non-linear level'.format(ad.filename, extver))
+                            non_linear_level = None
                         else:
                             log.fullinfo('Saturation and non-linear levels '
                                          'are the same for {}:{}. Only '
                                          'flagging saturated pixels'.
                                 format(ad.filename, extver))
+                            non_linear_level = None
                     else:
                         log.fullinfo('Flagging non-linear pixels in {}:{} '
                                      'above level {:.2f}'.
                                      format(ad.filename, extver,
                                             non_linear_level))
-                        ext.mask |= np.where(ext.data >= non_linear_level,
-                                             DQ.non_linear, 0).astype(DQ.datatype)
+
+                exts.append(ext)
+                jobs.append((ext.data, None if bpm_ext is None else bpm_ext.data,
+                             saturation_level, non_linear_level))
+
+            masks = map_extensions(_flag_levels, *zip(*jobs)) if jobs else []
+            for ext, mask in zip(exts, masks):
+                ext.mask = mask
 
             # Timestamp and update filename
             gt.mark_history(ad, primname=self.myself(), keyword=timestamp_key)
@@ -646,14 +623,17 @@ def _calculate_var(adinput, add_read_noise=False, add_poisson_noise=False):
     log = logutils.get_logger(__name__)
     gain_list = adinput.gain()
     read_noise_list = adinput.read_noise()
-    var_dtype = np.float32
 
+    # Get the parameters for each extension (and log them) first, then
+    # compute the variance planes concurrently
+    jobs = []
     for ext, gain, read_noise in zip(adinput, gain_list, read_noise_list):
         extver = ext.hdr['EXTVER']
         # Assume units are ADU if not explicitly given
         bunit = ext.hdr.get('BUNIT', 'ADU')
+        in_adu = bunit.upper() == 'ADU'
 
-        # Create a variance array with the read noise (or zero)
+        # The read noise component (or zero)
         if add_read_noise:
             if read_noise is None:
                 log.warning('Read noise for {} extver {} = None. Setting '
@@ -664,21 +644,18 @@ def _calculate_var(adinput, add_read_noise=False, add_poisson_noise=False):
                          format(adinput.filename, extver, read_noise))
                 log.fullinfo('Calculating the read noise component of '
                              'the variance in {}'.format(bunit))
-                if bunit.upper() == 'ADU':
+                if in_adu:
                     read_noise /= gain
-            var_array = np.full(ext.data.shape, read_noise*read_noise)
         else:
-            var_array = np.zeros(ext.data.shape)
+            read_noise = 0.0
 
-        # Add the Poisson noise if desired
+        # The Poisson noise component, if desired
+        coadds = None
         if add_poisson_noise:
-            poisson_array = (ext.data if ext.is_coadds_summed() else
-                             ext.data / ext.coadds())
-            if bunit.upper() == 'ADU':
-                poisson_array = poisson_array / gain
+            if not ext.is_coadds_summed():
+                coadds = ext.coadds()
             log.fullinfo('Calculating the Poisson noise component of '
                          'the variance in {}'.format(bunit))
-            var_array += np.where(poisson_array > 0, poisson_array, 0)
 
         if ext.variance is not None:
             if add_read_noise and add_poisson_noise:
@@ -689,10 +666,123 @@ def _calculate_var(adinput, add_read_noise=False, add_poisson_noise=False):
                 log.fullinfo("Combining the newly calculated variance "
                              "with the current variance extension {}:{}".
                              format(ext.filename, extver))
-                var_array += ext.variance
         else:
             log.fullinfo("Adding variance to {}:{}".format(ext.filename,
                                                            extver))
-        # Attach to the extension
-        ext.variance = var_array.astype(var_dtype)
-    return
\ No newline at end of file
+        jobs.append((ext.data, ext.variance, read_noise, add_poisson_noise,
+                     coadds, gain if in_adu else None))
+
+    variances = map_extensions(_variance_array, *zip(*jobs)) if jobs else []
+    # Attach to the extensions
+    for ext, var_array in zip(adinput, variances):
+        ext.variance = var_array
+    return
+
+def _variance_array(data, variance, read_noise, add_poisson_noise, coadds,
+                    gain):
+    """
+    Computes the variance plane of a science array. This works on plain
+    arrays, so it can be run concurrently for all the extensions.
+
+    Parameters
+    ----------
+    data: ndarray
+        science data
+    variance: ndarray/None
+        existing variance, to which the new components are added
+    read_noise: float
+        read noise, in the units of the data
+    add_poisson_noise: bool
+        add the Poisson noise component?
+    coadds: int/None
+        number of coadds to divide the data by (None => coadds are summed)
+    gain: float/None
+        gain to divide the data by (None => the data are in electrons)
+
+    Returns
+    -------
+    ndarray: the variance (float32)
+    """
+    var_dtype = np.float32
+    if read_noise:
+        var_array = np.full(data.shape, read_noise*read_noise)
+    else:
+        var_array = np.zeros(data.shape)
+
+    if add_poisson_noise:
+        poisson_array = data if coadds is None else data / coadds
+        if gain is not None:
+            poisson_array = poisson_array / gain
+        var_array += np.where(poisson_array > 0, poisson_array, 0)
+
+    if variance is not None:
+        var_array += variance
+    return var_array.astype(var_dtype)
+
+def _flag_levels(data, bpm, saturation_level, non_linear_level):
+    """
+    Creates a DQ plane from a science array, flagging the saturated and
+    non-linear pixels. This works on plain arrays, so it can be run
+    concurrently for all the extensions.
+
+    If both levels are given, the non-linear level must be below the
+    saturation level, and this also looks for saturated pixels that have
+    values below the non-linear level (as IR detector readout modes can
+    produce), ie. small "holes" in the regions below the non-linear level.
+
+    Parameters
+    ----------
+    data: ndarray
+        science data
+    bpm: ndarray/None
+        bad pixel mask for this extension
+    saturation_level: float/None
+        pixels at or above this level are flagged as saturated
+    non_linear_level: float/None
+        pixels at or above this level (but not saturated) are flagged as
+        non-linear
+
+    Returns
+    -------
+    ndarray: the DQ plane
+    """
+    # Need to create the array first for 3D raw F2 data, with 2D BPM
+    mask = np.zeros_like(data, dtype=DQ.datatype)
+    if bpm is not None:
+        mask |= bpm
+
+    if saturation_level:
+        mask |= np.where(data >= saturation_level,
+                         DQ.saturated, 0).astype(DQ.datatype)
+
+    if non_linear_level:
+        if saturation_level:
+            mask |= np.where((data >= non_linear_level) &
+                             (data < saturation_level),
+                             DQ.non_linear, 0).astype(DQ.datatype)
+            # Readout modes of IR detectors can result in
+            # saturated pixels having values below the
+            # saturation level. Flag those. Assume we have an
+            # IR detector here because both non-linear and
+            # saturation levels are defined and nonlin<sat
+            regions, nregions = measurements.label(data < non_linear_level)
+            # In all my tests, region 1 has been the majority
+            # of the image; however, I cannot guarantee that
+            # this is always the case and therefore we should
+            # check the size of each region
+            region_sizes = measurements.labeled_comprehension(
+                data, regions, np.arange(1, nregions+1), len, int, 0)
+            # First, assume all regions are saturated, and
+            # remove any very large ones. This is much faster
+            # than progressively adding each region to DQ
+            hidden_saturation_array = np.where(regions > 0,
+                                               4, 0).astype(DQ.datatype)
+            for region in range(1, nregions+1):
+                # Limit of 10000 pixels for a hole is a bit arbitrary
+                if region_sizes[region-1] > 10000:
+                    hidden_saturation_array[regions==region] = 0
+            mask |= hidden_saturation_array
+        else:
+            mask |= np.where(data >= non_linear_level,
+                             DQ.non_linear, 0).astype(DQ.datatype)
+    return mask
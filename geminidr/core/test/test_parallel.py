@@ -0,0 +1,105 @@
+# pytest suite
+"""
+Tests for geminidr.parallel.
+
+This is a suite of tests to be run with pytest.
+
+To run:
+    1) From the geminidr/core/test directory: pytest -v --capture=no
+"""
+import os
+import threading
+
+import pytest
+
+from geminidr import parallel
+from geminidr.parallel import ExtensionExecutor
+from recipe_system.config import globalConf, get_parallel_conf, PARALLEL_SECTION
+
+def square_after_delay(value, delay):
+    threading.Event().wait(delay)
+    return value * value
+
+def fail_on(value, bad):
+    if value == bad:
+        raise ValueError("bad value {}".format(value))
+    return value
+
+def thread_and_pid(value):
+    return threading.current_thread().name, os.getpid()
+
+class TestParallel:
+    """
+    Suite of tests for ExtensionExecutor and the [parallel] config section.
+    """
+    @classmethod
+    def teardown_class(cls):
+        """Run once at the end."""
+        parallel.shutdown()
+
+    def setup_method(self, method):
+        self.conf = (globalConf[PARALLEL_SECTION].as_dict()
+                     if PARALLEL_SECTION in globalConf._sections else None)
+
+    def teardown_method(self, method):
+        globalConf._sections.pop(PARALLEL_SECTION, None)
+        if self.conf is not None:
+            globalConf.update(PARALLEL_SECTION, self.conf)
+
+    def test_results_in_input_order(self):
+        # The first items take longest, so they finish last
+        values = list(range(8))
+        delays = [0.05 * (8 - i) for i in values]
+        for processes in (False, True):
+            executor = ExtensionExecutor(workers=4, processes=processes)
+            assert executor.map(square_after_delay, values, delays) == \
+                   [v * v for v in values]
+
+    def test_exception_propagated(self):
+        for processes in (False, True):
+            executor = ExtensionExecutor(workers=3, processes=processes)
+            with pytest.raises(ValueError):
+                executor.map(fail_on, range(6), [4] * 6)
+
+    def test_serial_fallback(self):
+        main = threading.current_thread().name, os.getpid()
+        # One worker, or one item: no pool involved
+        parallel.shutdown()
+        executor = ExtensionExecutor(workers=1, processes=True)
+        assert executor.map(thread_and_pid, range(4)) == [main] * 4
+        executor = ExtensionExecutor(workers=4, processes=True)
+        assert executor.map(thread_and_pid, [0]) == [main]
+        assert not parallel._pools
+
+        executor = ExtensionExecutor(workers=2, processes=False)
+        assert all(result != main for result in
+                   executor.map(thread_and_pid, range(4)))
+        assert parallel._pools
+
+    def test_shutdown(self):
+        ExtensionExecutor(workers=2).map(square_after_delay, [1, 2], [0, 0])
+        pool = parallel._pools[(False, 2)]
+        parallel.shutdown()
+        assert not parallel._pools
+        with pytest.raises(ValueError):
+            pool.map(abs, [-1, -2])
+        # A new pool is created when needed
+        assert ExtensionExecutor(workers=2).map(abs, [-1, -2]) == [1, 2]
+
+    def test_get_parallel_conf(self):
+        for value, expected in (('yes', True), ('True', True), ('on', True),
+                                ('1', True), ('no', False), ('false', False),
+                                ('0', False), (True, True), (False, False)):
+            globalConf.update(PARALLEL_SECTION, {'workers': 3,
+                                                 'processes': value})
+            assert get_parallel_conf() == (3, expected)
+
+        globalConf.update(PARALLEL_SECTION, {'workers': 0})
+        assert get_parallel_conf()[0] == 1
+
+    def test_executor_uses_config(self):
+        globalConf.update(PARALLEL_SECTION, {'workers': 5, 'processes': 'yes'})
+        executor = ExtensionExecutor()
+        assert (executor.workers, executor.processes) == (5, True)
+        executor = ExtensionExecutor(workers=2, processes=False)
+        assert (executor.workers, executor.processes) == (2, False)
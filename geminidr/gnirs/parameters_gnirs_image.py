@@ -50,6 +50,7 @@ class ParametersGNIRSImage(ParametersGNIRS, ParametersImage, ParametersPhotometr
         "dilation"          : 2,
         "apply_dq"          : True,
         "mask_objects"      : True,
+        "memory"            : None,
         "nhigh"             : 1,
         "nlow"              : 1,
         "operation"         : "median",
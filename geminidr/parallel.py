@@ -0,0 +1,104 @@
+#
+#                                                                  gemini_python
+#
+#                                                                    parallel.py
+# ------------------------------------------------------------------------------
+"""
+Concurrent execution of the per-extension work done by primitives.
+
+Multi-amplifier or multi-array data (eg. 12 amps for GMOS Hamamatsu, 4 arrays
+for GSAOI) lead to primitives looping over many extensions, doing work that
+is mostly spent inside NumPy/SciPy, which release the GIL. ExtensionExecutor
+runs such work in a pool of threads (by default) or processes.
+
+The functions being mapped should only do the number crunching: they take
+arrays and values, and return new ones. Anything touching the AstroData
+objects (headers, logs, attaching planes) should be done by the caller on
+the returned results, which always come back in the order of the inputs, so
+the headers and logs are updated in the same order as a serial run.
+
+Pools are created on first use and kept for the following calls. They are
+closed at exit, or by shutdown(), which long-lived processes (eg. the batch
+workers) should call when done with a reduction.
+
+When using processes, the function must be picklable (ie. defined at the top
+level of a module), as must its arguments and results.
+
+The number of workers and the type of pool are taken from the [parallel]
+section of the configuration (see `recipe_system.config`), unless passed
+explicitly.
+
+E.g.,
+>>> from geminidr.parallel import map_extensions
+>>> results = map_extensions(fit_function, [ext.data for ext in ad], ad.gain())
+"""
+import atexit
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+from recipe_system.config import get_parallel_conf
+
+# Pools are kept across calls, keyed on (processes, workers)
+_pools = {}
+
+def _get_pool(processes, workers):
+    key = (processes, workers)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = (multiprocessing.Pool if processes else ThreadPool)(workers)
+        _pools[key] = pool
+    return pool
+
+def shutdown():
+    """
+    Closes the pools, waiting for their workers to exit. New pools are
+    created as needed by later calls.
+    """
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.close()
+        pool.join()
+
+atexit.register(shutdown)
+
+def _call(job):
+    function, args = job
+    return function(*args)
+
+class ExtensionExecutor(object):
+    """
+    Maps a function over per-extension arguments, concurrently.
+
+    Parameters
+    ----------
+    workers: int/None
+        maximum number of concurrent workers (None => from the config)
+    processes: bool/None
+        use a pool of processes instead of threads? (None => from the config)
+    """
+    def __init__(self, workers=None, processes=None):
+        conf_workers, conf_processes = get_parallel_conf()
+        self.workers = conf_workers if workers is None else max(int(workers), 1)
+        self.processes = conf_processes if processes is None else bool(processes)
+
+    def map(self, function, *iterables):
+        """
+        Calls function(*args) for each set of arguments taken from the
+        iterables (like the builtin `map`), and returns a list with the
+        results in the same order as the inputs. Exceptions raised by the
+        function are propagated to the caller.
+
+        The work is done serially when there's only one worker or one item.
+        """
+        jobs = [(function, args) for args in zip(*iterables)]
+        if self.workers < 2 or len(jobs) < 2:
+            return [_call(job) for job in jobs]
+        pool = _get_pool(self.processes, self.workers)
+        return pool.map(_call, jobs, chunksize=1)
+
+def map_extensions(function, *iterables):
+    """
+    Convenience function that maps `function` over the `iterables` with an
+    `ExtensionExecutor` set up from the config. See `ExtensionExecutor.map`.
+    """
+    return ExtensionExecutor().map(function, *iterables)
@@ -148,13 +148,37 @@ def _landstat(landscape, updated_model, x, y):
         statistic representing quality of fit to be minimized
     """
     xt, yt = updated_model(x, y)
-    sum = np.sum(landscape[iy,ix] for ix,iy in zip((xt-0.5).astype(int),
-                                                   (yt-0.5).astype(int))
-                  if ix>=0 and iy>=0 and ix<landscape.shape[1]
-                                     and iy<landscape.shape[0])
+    ix = (xt-0.5).astype(int)
+    iy = (yt-0.5).astype(int)
+    on_land = ((ix >= 0) & (iy >= 0) & (ix < landscape.shape[1]) &
+               (iy < landscape.shape[0]))
+    sum = np.sum(landscape[iy[on_land], ix[on_land]])
     #print updated_model.x_offset.value, updated_model.y_offset.value, sum
     return -sum  # to minimize
 
+def _batch_landstat(landscape, xt, yt):
+    """
+    Compute the _landstat statistic of many transformations at once.
+
+    Parameters
+    ----------
+    landscape: 2D array
+        synthetic image representing locations of sources in reference plane
+    xt, yt: 2D float arrays
+        transformed x, y coordinates, one row per transformation
+
+    Returns
+    -------
+    float array:
+        statistic of each row, to be minimized
+    """
+    ix = (xt-0.5).astype(int)
+    iy = (yt-0.5).astype(int)
+    on_land = ((ix >= 0) & (iy >= 0) & (ix < landscape.shape[1]) &
+               (iy < landscape.shape[0]))
+    heights = landscape[np.where(on_land, iy, 0), np.where(on_land, ix, 0)]
+    return -np.where(on_land, heights, 0.0).sum(axis=1)
+
 def _stat(tree, updated_model, x, y, sigma, maxsig):
     """
     Compute the statistic for transforming coordinates onto a set of reference
@@ -183,8 +207,10 @@ def _stat(tree, updated_model, x, y, sigma, maxsig):
     maxsep = maxsig*sigma
     xt, yt = updated_model(x, y)
     start = datetime.now()
-    dist, idx = tree.query(zip(xt, yt), k=5, distance_upper_bound=maxsep)
-    sum = np.sum(np.exp(-f*d*d) for dd in dist for d in dd)
+    dist, idx = tree.query(np.column_stack((xt, yt)), k=5,
+                           distance_upper_bound=maxsep)
+    # Missing neighbours have an infinite distance, and contribute 0
+    sum = np.sum(np.exp(-f*dist*dist))
     #print (datetime.now()-start).total_seconds(), updated_model.parameters, sum
     return -sum  # to minimize
 
@@ -216,7 +242,7 @@ class KDTreeFitter(Fitter):
                     getattr(model_copy, p).value = 20*xtol if pval == 0 \
                         else (np.sign(pval) * 20*xtol)
 
-        tree = spatial.cKDTree(zip(*ref_coords))
+        tree = spatial.cKDTree(np.column_stack(ref_coords))
         # avoid _convert_input since tree can't be coerced to a float
         x, y = in_coords
         farg = (model_copy, x, y, sigma, maxsig, tree)
@@ -234,9 +260,14 @@ class BruteLandscapeFitter(Fitter):
     coordinates onto a set of reference coordinates by cross-correlation
     over a "landscape" of "mountains" representing the reference coords
     """
-    def __init__(self):
+    # Maximum number of transformed coordinates held in memory at once
+    # by the batched translation search
+    batch_size = 1 << 20
+
+    def __init__(self, batch=True):
         super(BruteLandscapeFitter, self).__init__(optimize.brute,
                                               statistic=_landstat)
+        self.batch = batch
 
     def mklandscape(self, coords, sigma, maxsig, landshape):
         """
@@ -317,13 +348,119 @@ class BruteLandscapeFitter(Fitter):
                     continue
             ranges.append((getattr(model_copy, p).value,) * 2)
 
-        # Ns=1 limits the fitting along an axis where the range is not a slice
-        # object: this is those were the bounds are equal (i.e. fixed param)
-        fitted_params = self._opt_method(self.objective_function, ranges,
-                                         farg, Ns=1, finish=None, **kwargs)
+        fitted_params = None
+        if self.batch and not kwargs:
+            fitted_params = self._brute_translation(model_copy, ranges, farg)
+        if fitted_params is None:
+            # Ns=1 limits the fitting along an axis where the range is not a
+            # slice object: those where the bounds are equal (i.e. fixed param)
+            fitted_params = self._opt_method(self.objective_function, ranges,
+                                             farg, Ns=1, finish=None, **kwargs)
         _fitter_to_model_params(model_copy, fitted_params)
         return model_copy
 
+    def _brute_translation(self, model, ranges, farg):
+        """
+        Evaluates the same grid as optimize.brute(ranges, Ns=1), but
+        translates the input coordinates for all the offsets of a Shift2D
+        in bulk, rather than evaluating the model once per grid point. The
+        grid is split into slices of constant value of the other parameters
+        (e.g., one per trial rotation), and for each slice the submodels
+        before the Shift2D are evaluated once and those after it once on
+        all the shifted coordinates.
+
+        Parameters
+        ----------
+        model: Model
+            transformation (input -> reference) being fitted
+        ranges: list
+            slices and 2-tuples, as passed to optimize.brute
+        farg: tuple
+            (model, x, y, landscape), as passed to the objective function
+
+        Returns
+        -------
+        array/None:
+            the best-fitting parameters (identical to those optimize.brute
+            would find), or None if the model is not a chain of submodels
+            with a single searched Shift2D
+        """
+        x, y, landscape = farg[1:]
+        p0, _ = _model_to_fit_params(model)
+        if len(p0) != len(model.parameters):
+            return None  # fixed or tied parameters
+        try:
+            submodels = list(model)
+        except TypeError:
+            submodels = [model]
+
+        # The same grid, in the same order, as optimize.brute
+        lrange = [r if isinstance(r, slice) else slice(*(tuple(r) + (1j,)))
+                  for r in ranges]
+        grid = np.mgrid[tuple(lrange)].reshape(len(lrange), -1).T
+
+        # The Shift2D submodel whose offsets are searched
+        searched = np.array([len(np.unique(col)) > 1 for col in grid.T])
+        first = 0
+        shift_index = None
+        for i, m in enumerate(submodels):
+            last = first + len(m.param_names)
+            if isinstance(m, Shift2D) and searched[first:last].any():
+                if shift_index is not None:
+                    return None
+                shift_index, shift_params = i, slice(first, last)
+            first = last
+        if shift_index is None:
+            return None
+        others = np.ones(grid.shape[1], dtype=bool)
+        others[shift_params] = False
+
+        def split(point):
+            # Returns the submodels before and after the Shift2D, with the
+            # parameters of this grid point
+            _fitter_to_model_params(model, point)
+            chain = list(model) if len(submodels) > 1 else [model]
+            return chain[:shift_index], chain[shift_index+1:]
+
+        def transform(pre, post, offsets):
+            xt, yt = x, y
+            for m in pre:
+                xt, yt = m(xt, yt)
+            xt = xt + offsets[:, :1]
+            yt = yt + offsets[:, 1:]
+            shape = xt.shape
+            xt, yt = xt.ravel(), yt.ravel()
+            for m in post:
+                xt, yt = m(xt, yt)
+            return xt.reshape(shape), yt.reshape(shape)
+
+        stat = np.empty(len(grid))
+        nrows = max(self.batch_size // max(len(x), 1), 1)
+        keys, slice_index = np.unique(grid[:, others], axis=0,
+                                      return_inverse=True)
+        for i in range(len(keys)):
+            rows = np.flatnonzero(slice_index.ravel() == i)
+            # Only use the bulk evaluation if it reproduces the model
+            try:
+                pre, post = split(grid[rows[0]])
+                xt, yt = transform(pre, post, grid[rows[:1]][:, shift_params])
+                xm, ym = model(x, y)
+            except Exception:
+                return None
+            if not (np.array_equal(xt[0], xm) and np.array_equal(yt[0], ym)):
+                return None
+            for start in range(0, len(rows), nrows):
+                chunk = rows[start:start+nrows]
+                xt, yt = transform(pre, post, grid[chunk][:, shift_params])
+                stat[chunk] = _batch_landstat(landscape, xt, yt)
+
+        # The sums are not done in the same order as _landstat, so resolve
+        # near-ties with the objective function itself
+        tol = 1e-9 * max(abs(stat.min()), 1.0)
+        candidates = np.flatnonzero(stat <= stat.min() + tol)
+        exact = [self.objective_function(grid[i], *farg) for i in candidates]
+        return grid[candidates[np.argmin(exact)]]
+
 def fit_brute_then_simplex(model, xin, xout, sigma=5.0, tolerance=0.001,
                            release=False, verbose=True):
     """
@@ -606,18 +743,20 @@ def match_sources(incoords, refcoords, radius=2.0, priority=[]):
         index of matched sources in the reference list (-1 means no match)
     """
     matched = np.full((len(incoords[0]),), -1, dtype=int)
-    tree = spatial.cKDTree(zip(*refcoords))
-    dist, idx = tree.query(zip(*incoords), distance_upper_bound=radius)
-    for i in range(len(refcoords[0])):
-        inidx = np.where(idx==i)[0][np.argsort(dist[np.where(idx==i)])]
-        for ii in inidx:
-            if ii in priority:
-                matched[ii] = i
-                break
-        else:
-            # No first_allowed so take the first one
-            if len(inidx):
-                matched[inidx[0]] = i
+    tree = spatial.cKDTree(np.column_stack(refcoords))
+    dist, idx = tree.query(np.column_stack(incoords),
+                           distance_upper_bound=radius)
+    # Sources with no match within the radius have idx == len(refcoords[0])
+    inidx = np.flatnonzero(idx < len(refcoords[0]))
+    is_priority = np.isin(inidx, priority)
+    # Sort by reference source, then priority, then separation, so the first
+    # input source in each group is the closest priority one, if any, and
+    # the closest one otherwise
+    order = np.lexsort((dist[inidx], ~is_priority, idx[inidx]))
+    inidx, refidx = inidx[order], idx[inidx][order]
+    first = np.ones(len(refidx), dtype=bool)
+    first[1:] = refidx[1:] != refidx[:-1]
+    matched[inidx[first]] = refidx[first]
     return matched
 
 def match_catalogs(xin, yin, xref, yref, use_in=None, use_ref=None,
@@ -0,0 +1,440 @@
+"""
+The nddops module provides a pure-NumPy image combiner that works directly
+on NDData-like objects (or single AstroData slices), as a replacement for the
+IRAF gemcombine task. It supports the same combine operations and rejection
+methods used by the stacking primitives, and propagates the variance and
+data quality planes.
+
+The inputs are combined in bands of rows, so the working memory is set by
+the band height and the number of inputs, rather than by the size of the
+full frames. For stacks that don't fit in memory, the bands can be read
+straight from memory-mapped FITS files (see FitsStackInput) and written into
+preallocated output arrays that live on disk (see disk_allocate).
+"""
+import tempfile
+import warnings
+import numpy as np
+
+# Default memory budget for the working arrays of a single band (bytes)
+DEFAULT_MEMORY = 1000000000
+
+# Approximate number of bytes needed per input pixel by the combining and
+# rejection code (data copies, sort buffers, masks and indices)
+BYTES_PER_PIXEL = 40
+
+COMBINE_METHODS = ('average', 'mean', 'median')
+REJECT_METHODS = ('none', 'minmax', 'sigclip', 'avsigclip')
+
+
+def _rows_per_band(ninputs, shape, memory=None):
+    """
+    Returns the number of rows (along the first axis) that can be combined
+    in one go for a given memory budget.
+
+    Parameters
+    ----------
+    ninputs: int
+        number of frames being combined
+    shape: tuple
+        shape of each input array
+    memory: float/None
+        memory budget in bytes (None => DEFAULT_MEMORY)
+
+    Returns
+    -------
+    int: number of rows in each band
+    """
+    if memory is None:
+        memory = DEFAULT_MEMORY
+    row_pixels = int(np.prod(shape[1:])) if len(shape) > 1 else 1
+    rows = int(memory // (ninputs * row_pixels * BYTES_PER_PIXEL))
+    return max(1, min(rows, shape[0]))
+
+
+def _variance_band(nd, band):
+    """
+    Returns the variance for a band of rows of an NDData-like object, or
+    None if it has no uncertainty. Only the requested rows are converted
+    if the uncertainty is stored as a standard deviation.
+    """
+    try:
+        uncertainty = nd.uncertainty
+    except AttributeError:
+        return None
+    if uncertainty is None:
+        return None
+    array = uncertainty.array[band]
+    if getattr(uncertainty, 'uncertainty_type', 'std') == 'std':
+        return array * array
+    return array
+
+
+def _sorted_ranks(data, rejected):
+    """
+    Returns the rank of each pixel along axis 0, after sorting the values
+    with the rejected pixels sent to the end of the stack.
+    """
+    order = np.argsort(np.where(rejected, np.inf, data), axis=0,
+                       kind='mergesort')
+    return np.argsort(order, axis=0, kind='mergesort')
+
+
+def _select(values, index):
+    """
+    Returns values[index[...], ...], i.e., picks one element along axis 0
+    of a stack for each output pixel.
+    """
+    return values[(index,) + tuple(np.indices(index.shape))]
+
+
+def _median(data, rejected, ngood):
+    """
+    Median along axis 0 of the non-rejected pixels. Pixels with no good
+    input are returned as zero.
+    """
+    values = np.sort(np.where(rejected, np.inf, data), axis=0)
+    med = 0.5 * (_select(values, np.maximum((ngood - 1) // 2, 0)) +
+                 _select(values, np.maximum(ngood // 2, 0)))
+    return np.where(ngood > 0, med, 0.)
+
+
+def _mean(data, rejected, ngood):
+    """
+    Mean along axis 0 of the non-rejected pixels. Pixels with no good
+    input are returned as zero.
+    """
+    total = np.sum(np.where(rejected, 0., data), axis=0, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(ngood > 0, total / ngood, 0.)
+
+
+def reject_minmax(data, rejected, nlow=1, nhigh=1, nkeep=1, **kwargs):
+    """
+    Rejects the nlow lowest and nhigh highest good pixels in each stack of
+    pixels. Stacks where fewer than nkeep pixels would remain are left as
+    they were.
+
+    Parameters
+    ----------
+    data: ndarray (N, ...)
+        stacked input data
+    rejected: bool ndarray (N, ...)
+        pixels that have already been rejected (e.g., by the DQ)
+    nlow, nhigh: int
+        number of low and high pixels to reject
+
+    Returns
+    -------
+    bool ndarray: updated rejection array
+    """
+    ngood = data.shape[0] - rejected.sum(axis=0)
+    ranks = _sorted_ranks(data, rejected)
+    clip = (ranks < nlow) | ((ranks >= ngood - nhigh) & (ranks < ngood))
+    clip &= (ngood - nlow - nhigh >= nkeep)
+    return rejected | clip
+
+
+def reject_sigclip(data, rejected, lsigma=3.0, hsigma=3.0, mclip=True,
+                   nkeep=1, maxiters=None, average_sigma=False, **kwargs):
+    """
+    Iterative sigma-clipping about the median (or mean) of each stack of
+    pixels. If average_sigma is set, the sigma at each pixel is computed
+    from a noise model (variance proportional to signal) whose scaling is
+    averaged along each row, as in IRAF's avsigclip.
+
+    Parameters
+    ----------
+    data: ndarray (N, ...)
+        stacked input data
+    rejected: bool ndarray (N, ...)
+        pixels that have already been rejected (e.g., by the DQ)
+    lsigma, hsigma: float
+        rejection thresholds, in units of sigma
+    mclip: bool
+        clip about the median (rather than the mean)?
+    nkeep: int
+        minimum number of pixels to retain in each stack
+    maxiters: int/None
+        maximum number of iterations (None => until convergence)
+    average_sigma: bool
+        use the row-averaged noise model (avsigclip)?
+
+    Returns
+    -------
+    bool ndarray: updated rejection array
+    """
+    niter = 0
+    while maxiters is None or niter < maxiters:
+        # As in IRAF, the first estimate of the center and sigma excludes
+        # the lowest and highest pixels, so a single strong outlier in a
+        # small stack can't hide itself by inflating the sigma
+        stats_rejected = reject_minmax(data, rejected, nlow=1, nhigh=1,
+                                       nkeep=2) if niter == 0 else rejected
+        niter += 1
+        ngood = data.shape[0] - stats_rejected.sum(axis=0)
+        mean = _mean(data, stats_rejected, ngood)
+        center = _median(data, stats_rejected, ngood) if mclip else mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resid = np.where(stats_rejected, 0., data - mean)
+            var = np.sum(resid * resid, axis=0) / (ngood - 1)
+            if average_sigma:
+                ratio = var / np.abs(center)
+                ratio[~np.isfinite(ratio) | (ngood < 2)] = np.nan
+                # Average the noise model along each row (the last axis),
+                # falling back to the sample variance where it's undefined
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    model = (np.nanmean(ratio, axis=-1, keepdims=True) *
+                             np.abs(center))
+                var = np.where(np.isfinite(model), model, var)
+            sigma = np.sqrt(np.where(ngood > 1, var, np.inf))
+            deviant = ((data < center - lsigma * sigma) |
+                       (data > center + hsigma * sigma))
+        new_rejected = rejected | deviant
+        # Don't reject too many pixels in any stack
+        allowed = (data.shape[0] - new_rejected.sum(axis=0)) >= nkeep
+        new_rejected = np.where(allowed, new_rejected, rejected)
+        if np.array_equal(new_rejected, rejected):
+            break
+        rejected = new_rejected
+    return rejected
+
+
+def combine_arrays(data, mask=None, variance=None, operation='average',
+                   reject_method='none', apply_dq=True, nlow=1, nhigh=1,
+                   lsigma=3.0, hsigma=3.0, mclip=True, nkeep=1,
+                   maxiters=None):
+    """
+    Combines a stack of arrays held in memory, with optional pixel rejection.
+
+    Pixels flagged in the mask (if apply_dq is set) are excluded from the
+    combination. Where every input pixel is flagged, all the inputs are used
+    and the output DQ is the bitwise-AND of the input DQ values; elsewhere
+    it is the bitwise-OR of the DQ values of the pixels that were used.
+
+    Parameters
+    ----------
+    data: ndarray (N, ...)
+        stack of input data
+    mask: int ndarray (N, ...)/None
+        stack of input DQ arrays
+    variance: ndarray (N, ...)/None
+        stack of input variance arrays
+    operation: str
+        combine method ("average"/"mean" or "median")
+    reject_method: str
+        rejection method ("none", "minmax", "sigclip", "avsigclip")
+    apply_dq: bool
+        exclude pixels with non-zero DQ from the combination?
+    nlow, nhigh: int
+        number of low/high pixels to reject (minmax)
+    lsigma, hsigma: float
+        low/high rejection thresholds (sigclip, avsigclip)
+    mclip: bool
+        clip about the median rather than the mean?
+    nkeep: int
+        minimum number of pixels to keep in each stack
+    maxiters: int/None
+        maximum number of clipping iterations
+
+    Returns
+    -------
+    tuple: combined data, mask (or None) and variance (or None)
+    """
+    if operation not in COMBINE_METHODS:
+        raise ValueError("Unknown combine operation {!r}".format(operation))
+    if reject_method in (None, 'None'):
+        reject_method = 'none'
+    if reject_method not in REJECT_METHODS:
+        raise ValueError("Unknown rejection method {!r}".format(reject_method))
+
+    data = np.asarray(data)
+    out_dtype = np.result_type(data.dtype, np.float32)
+    if mask is not None and apply_dq:
+        rejected = mask != 0
+        no_good = rejected.all(axis=0)
+        rejected &= ~no_good
+    else:
+        rejected = np.zeros(data.shape, dtype=bool)
+        no_good = None
+
+    if reject_method == 'minmax':
+        rejected = reject_minmax(data, rejected, nlow=nlow, nhigh=nhigh,
+                                 nkeep=nkeep)
+    elif reject_method in ('sigclip', 'avsigclip'):
+        rejected = reject_sigclip(data, rejected, lsigma=lsigma,
+                                  hsigma=hsigma, mclip=mclip, nkeep=nkeep,
+                                  maxiters=maxiters,
+                                  average_sigma=reject_method == 'avsigclip')
+
+    ngood = data.shape[0] - rejected.sum(axis=0)
+    if operation == 'median':
+        out_data = _median(data, rejected, ngood)
+    else:
+        out_data = _mean(data, rejected, ngood)
+
+    out_var = None
+    if variance is not None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out_var = np.sum(np.where(rejected, 0., variance), axis=0,
+                             dtype=np.float64) / (ngood * ngood)
+        if operation == 'median':
+            # Asymptotic efficiency of the median relative to the mean
+            out_var *= 0.5 * np.pi
+        out_var = np.where(ngood > 0, out_var, 0.).astype(out_dtype)
+
+    out_mask = None
+    if mask is not None:
+        out_mask = np.bitwise_or.reduce(np.where(rejected, 0, mask), axis=0)
+        if no_good is not None and no_good.any():
+            out_mask = np.where(no_good,
+                                np.bitwise_and.reduce(mask, axis=0), out_mask)
+        out_mask = out_mask.astype(mask.dtype)
+
+    return out_data.astype(out_dtype), out_mask, out_var
+
+
+class _HDUBand(object):
+    """
+    Read-only view of the pixel data of a memory-mapped HDU that applies
+    BSCALE/BZERO only to the rows being read, so that slicing it never
+    pulls the whole array into memory.
+    """
+    def __init__(self, hdu):
+        self._hdu = hdu
+        header = hdu.header
+        self.shape = tuple(header['NAXIS{}'.format(i)]
+                           for i in range(header['NAXIS'], 0, -1))
+        self._bscale = header.get('BSCALE', 1)
+        self._bzero = header.get('BZERO', 0)
+
+    def __getitem__(self, band):
+        raw = self._hdu.data[band]
+        raw = raw.astype(raw.dtype.newbyteorder('='))
+        if self._bscale == 1 and self._bzero == 0:
+            return raw
+        itemsize = raw.dtype.itemsize
+        if (self._bscale == 1 and raw.dtype.kind == 'i' and
+                self._bzero == 2 ** (8 * itemsize - 1)):
+            # Unsigned integers stored as signed, like most DQ planes
+            return (raw.astype(np.int64) + self._bzero).astype(
+                'u{}'.format(itemsize))
+        return (raw * self._bscale + self._bzero).astype(np.float32)
+
+
+class _VarianceBand(object):
+    """Uncertainty-like wrapper around an HDU holding a variance plane"""
+    uncertainty_type = 'var'
+
+    def __init__(self, hdu):
+        self.array = _HDUBand(hdu)
+
+
+class FitsStackInput(object):
+    """
+    NDData-like input for stack_nddata() that reads the SCI, VAR and DQ
+    planes of one extension of an open, memory-mapped HDUList, a band of
+    rows at a time. The HDUList must have been opened with
+    do_not_scale_image_data=True, so that accessing the HDU data doesn't
+    scale (and hence load) the full arrays.
+
+    Parameters
+    ----------
+    hdulist: HDUList
+        the memory-mapped file
+    extver: int
+        EXTVER of the extension to read
+
+    Raises
+    ------
+    KeyError
+        if there's no SCI extension with this EXTVER
+    """
+    def __init__(self, hdulist, extver):
+        self.data = _HDUBand(hdulist[('SCI', extver)])
+        self.mask = self.uncertainty = None
+        try:
+            self.mask = _HDUBand(hdulist[('DQ', extver)])
+        except KeyError:
+            pass
+        try:
+            self.uncertainty = _VarianceBand(hdulist[('VAR', extver)])
+        except KeyError:
+            pass
+
+
+def disk_allocate(shape, dtype):
+    """
+    Allocates an array backed by an anonymous temporary file, so the output
+    of a stack doesn't need to fit in memory. The file is removed once the
+    array is no longer referenced.
+    """
+    return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode='w+',
+                     shape=shape)
+
+
+def stack_nddata(inputs, memory=None, allocate=None, **kwargs):
+    """
+    Combines a list of NDData-like objects (anything with .data, .mask and
+    .uncertainty attributes, such as the NDData of an AstroData slice, or a
+    FitsStackInput), working through the arrays in bands of rows. Only the
+    rows currently being combined are read from each input, so memory-mapped
+    data are never fully loaded, and each combined band is written straight
+    into the preallocated output arrays.
+
+    The variance is propagated only if every input has one, and a mask is
+    produced only if at least one input has one.
+
+    Parameters
+    ----------
+    inputs: list
+        NDData-like objects of identical shape
+    memory: float/None
+        memory budget for each band, in bytes
+    allocate: callable/None
+        function(shape, dtype) returning the output arrays (None => np.empty;
+        use disk_allocate for stacks larger than memory)
+    kwargs: dict
+        additional parameters for combine_arrays()
+
+    Returns
+    -------
+    tuple: combined data, mask (or None) and variance (or None)
+    """
+    shape = inputs[0].data.shape
+    if any(nd.data.shape != shape for nd in inputs[1:]):
+        raise ValueError("Not all inputs have the same shape")
+
+    use_mask = any(nd.mask is not None for nd in inputs)
+    use_var = all(getattr(nd, 'uncertainty', None) is not None
+                  for nd in inputs)
+
+    if allocate is None:
+        allocate = np.empty
+
+    out_data = out_mask = out_var = None
+    nrows = _rows_per_band(len(inputs), shape, memory)
+    for y1 in range(0, shape[0], nrows):
+        band = slice(y1, min(y1 + nrows, shape[0]))
+        data = np.array([nd.data[band] for nd in inputs])
+        mask = np.array([np.zeros(data.shape[1:], dtype=np.uint16)
+                         if nd.mask is None else nd.mask[band]
+                         for nd in inputs]) if use_mask else None
+        variance = np.array([_variance_band(nd, band) for nd in inputs]) \
+            if use_var else None
+
+        band_data, band_mask, band_var = combine_arrays(data, mask=mask,
+                                                variance=variance, **kwargs)
+        if out_data is None:
+            out_data = allocate(shape, band_data.dtype)
+            if band_mask is not None:
+                out_mask = allocate(shape, band_mask.dtype)
+            if band_var is not None:
+                out_var = allocate(shape, band_var.dtype)
+        out_data[band] = band_data
+        if out_mask is not None:
+            out_mask[band] = band_mask
+        if out_var is not None:
+            out_var[band] = band_var
+
+    return out_data, out_mask, out_var
@@ -66,6 +66,21 @@ class TestMatching:
             assert (abs(getattr(model, p) - getattr(real_model, p)) <
                     3.0*sig/np.sqrt(nsources))
 
+    def test_brute_landscape_fitter_batch(self):
+        nsources = 100
+        sig = 1.0
+        xshift, yshift = 5.0, 10.0
+        incoords = self.make_catalog(nsources, 1024)
+        real_model = matching.Shift2D(xshift, yshift)
+        refcoords = self.transform_coords(incoords, real_model, sig)
+        in_model = matching.Shift2D(0.0, 0.0)
+        in_model.x_offset.bounds = (-20, 20)
+        in_model.y_offset.bounds = (-20, 20)
+        batch = matching.BruteLandscapeFitter()(in_model, incoords, refcoords)
+        brute = matching.BruteLandscapeFitter(batch=False)(in_model, incoords,
+                                                           refcoords)
+        assert np.array_equal(batch.parameters, brute.parameters)
+
     def test_find_offsets(self):
         nsources = 100
         sig = 1.0
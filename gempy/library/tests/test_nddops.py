@@ -0,0 +1,106 @@
+# pytest suite
+
+"""
+Tests for the nddops module.
+
+This is a suite of tests to be run with pytest.
+
+To run:
+   1) py.test -v   (must in gemini_python or have it in PYTHONPATH)
+"""
+
+import numpy as np
+from astropy.nddata import NDData, StdDevUncertainty
+
+from gempy.library import nddops
+
+class TestNDDOps:
+    """
+    Suite of tests for the functions in the nddops module.
+    """
+
+    @classmethod
+    def setup_class(cls):
+        """Run once at the beginning."""
+        np.random.seed(0)
+
+    def make_stack(self, nimages=7, shape=(40, 30)):
+        data = np.random.normal(100.0, 5.0, size=(nimages,) + shape)
+        mask = np.zeros(data.shape, dtype=np.uint16)
+        variance = np.full(data.shape, 25.0)
+        return data.astype(np.float32), mask, variance.astype(np.float32)
+
+    def test_no_rejection(self):
+        data, _, _ = self.make_stack()
+        out, mask, var = nddops.combine_arrays(data, operation='average')
+        assert np.allclose(out, data.mean(axis=0), rtol=1e-6)
+        assert mask is None and var is None
+        out, _, _ = nddops.combine_arrays(data, operation='median')
+        assert np.allclose(out, np.median(data, axis=0))
+
+    def test_minmax(self):
+        data, _, _ = self.make_stack()
+        out, _, _ = nddops.combine_arrays(data, reject_method='minmax',
+                                          nlow=1, nhigh=2)
+        assert np.allclose(out, np.sort(data, axis=0)[1:-2].mean(axis=0),
+                           rtol=1e-6)
+
+    def test_sigclip_removes_outlier(self):
+        data, mask, var = self.make_stack()
+        data[3, 10, 10] = 1e4
+        for method in ('sigclip', 'avsigclip'):
+            out, _, _ = nddops.combine_arrays(data, reject_method=method)
+            assert abs(out[10, 10] - 100.0) < 20.0
+
+    def test_dq_and_variance_propagation(self):
+        data, mask, var = self.make_stack()
+        mask[0, 5, 5] = 1
+        data[0, 5, 5] = 1e6
+        mask[:, 6, 6] = 4
+        mask[0, 6, 6] = 5
+        out, outmask, outvar = nddops.combine_arrays(data, mask=mask,
+                                                     variance=var)
+        assert np.allclose(out[5, 5], data[1:, 5, 5].mean())
+        assert outmask[5, 5] == 0
+        # All inputs flagged: combine everything and AND the DQ planes
+        assert outmask[6, 6] == 4
+        assert np.allclose(out[6, 6], data[:, 6, 6].mean())
+        assert np.allclose(outvar[0, 0], 25.0 / data.shape[0])
+
+    def test_stack_nddata_bands(self):
+        data, mask, var = self.make_stack()
+        mask[2, 1, 1] = 1
+        inputs = [NDData(d, mask=m, uncertainty=StdDevUncertainty(np.sqrt(v)))
+                  for d, m, v in zip(data, mask, var)]
+        # Tiny memory budget, so the frames are combined a few rows at a time
+        banded = nddops.stack_nddata(inputs, memory=4*30*7*nddops.BYTES_PER_PIXEL,
+                                     operation='median', reject_method='minmax')
+        whole = nddops.combine_arrays(data, mask=mask, variance=var,
+                                      operation='median', reject_method='minmax')
+        for a, b in zip(banded, whole):
+            assert np.allclose(a, b)
+
+    def test_stack_fits_files(self, tmpdir):
+        from astropy.io import fits
+        data, mask, var = self.make_stack(nimages=5)
+        mask[1, 2, 2] = 1
+        hdulists = []
+        for i, (d, m, v) in enumerate(zip(data, mask, var)):
+            filename = str(tmpdir.join('stack{}.fits'.format(i)))
+            fits.HDUList([fits.PrimaryHDU(),
+                          fits.ImageHDU(d, name='SCI', ver=1),
+                          fits.ImageHDU(v, name='VAR', ver=1),
+                          fits.ImageHDU(m, name='DQ', ver=1)]).writeto(filename)
+            hdulists.append(fits.open(filename, memmap=True,
+                                      do_not_scale_image_data=True))
+        inputs = [nddops.FitsStackInput(hdulist, 1) for hdulist in hdulists]
+        streamed = nddops.stack_nddata(inputs, memory=1, operation='median',
+                                       allocate=nddops.disk_allocate)
+        whole = nddops.combine_arrays(data, mask=mask, variance=var,
+                                      operation='median')
+        for a, b in zip(streamed, whole):
+            assert isinstance(a, np.memmap)
+            assert np.allclose(a, b)
+        assert streamed[1].dtype == np.uint16
+        for hdulist in hdulists:
+            hdulist.close()
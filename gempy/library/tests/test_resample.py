@@ -0,0 +1,81 @@
+# pytest suite
+
+"""
+Tests for the resample module.
+
+This is a suite of tests to be run with pytest.
+
+To run:
+   1) py.test -v   (must in gemini_python or have it in PYTHONPATH)
+"""
+
+import numpy as np
+from scipy.ndimage import affine_transform
+
+from gempy.library.resample import Resampler
+
+def bit_by_bit(mask, no_data=16, **kwargs):
+    """Transform a mask by interpolating each bit plane separately"""
+    trans_mask = np.zeros(kwargs['output_shape'], dtype=np.uint16)
+    for j in range(0, 16):
+        bit = 2**j
+        if bit == no_data or np.sum(mask & bit) > 0:
+            temp_mask = affine_transform((mask & bit).astype(np.float32),
+                                         cval=no_data if bit == no_data
+                                         else 0, **kwargs)
+            trans_mask += np.where(temp_mask > 0.01*bit, bit,
+                                   0).astype(np.uint16)
+    return trans_mask
+
+class TestResample:
+    """
+    Suite of tests for the Resampler class.
+    """
+
+    @classmethod
+    def setup_class(cls):
+        """Run once at the beginning."""
+        rng = np.random.RandomState(0)
+        cls.shape = (200, 180)
+        cls.data = rng.normal(100, 10, cls.shape).astype(np.float32)
+        cls.mask = np.zeros(cls.shape, dtype=np.uint16)
+        for bit in (1, 2, 4, 8, 512):
+            cls.mask[rng.uniform(size=cls.shape) < 0.001] |= bit
+        cls.mask[:, 50] |= 1
+        cls.mask[100:110, 120:130] |= 4
+        angle = np.radians(0.7)
+        cls.matrix = 1.01 * np.array([[np.cos(angle), np.sin(angle)],
+                                      [-np.sin(angle), np.cos(angle)]])
+        cls.offset = (-10.3, 5.7)
+        cls.output_shape = (220, 210)
+
+    def test_transform(self):
+        for order in (0, 1, 3):
+            resampler = Resampler(self.matrix, self.offset, self.output_shape,
+                                  order=order)
+            expected = affine_transform(self.data, self.matrix, self.offset,
+                                        output_shape=self.output_shape,
+                                        order=order)
+            result = resampler.transform(self.data)
+            assert result.dtype == self.data.dtype
+            assert np.array_equal(result, expected)
+
+    def test_transform_mask(self):
+        for order in (0, 1, 3, 5):
+            resampler = Resampler(self.matrix, self.offset, self.output_shape,
+                                  order=order)
+            expected = bit_by_bit(self.mask, matrix=self.matrix,
+                                  offset=self.offset, order=order,
+                                  output_shape=self.output_shape)
+            assert np.array_equal(resampler.transform_mask(self.mask),
+                                  expected)
+
+    def test_transform_mask_modes(self):
+        for mode in ('nearest', 'reflect', 'wrap'):
+            resampler = Resampler(self.matrix, self.offset, self.output_shape,
+                                  order=1, mode=mode)
+            expected = bit_by_bit(self.mask, matrix=self.matrix,
+                                  offset=self.offset, order=1, mode=mode,
+                                  output_shape=self.output_shape)
+            assert np.array_equal(resampler.transform_mask(self.mask),
+                                  expected)
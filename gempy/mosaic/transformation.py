@@ -8,6 +8,8 @@ __version__ = '2.0.0 (beta)'
 import numpy as np
 import scipy.ndimage as nd
 
+from gempy.library.resample import Resampler
+
 # ------------------------------------------------------------------------------
 DQMap = {'bad_pixel' : 1,
          'non_linear': 2,
@@ -487,6 +489,11 @@ class Transformation(object):
         unp = data.shape + (8,)
         unpack_data = np.unpackbits(np.uint8(data)).reshape(unp)
 
+        # The coordinates are the same for every mask, so only work them
+        # out once
+        self.map_coords_init(data.shape)
+        prefilter = self.order > 1
+
         # transform each mask
         outdata = np.zeros(data.shape)
         do_nans = False
@@ -510,7 +517,9 @@ class Transformation(object):
                 cval = np.nan
                 do_nans = True
  
-            trans_mask = self.map_coordinates(mask, cval=cval)
+            trans_mask = nd.map_coordinates(mask, self.xy_coords,
+                                            prefilter=prefilter, mode=self.mode,
+                                            order=self.order, cval=cval)
 
             # Get the nans indices:
             if do_nans:
@@ -526,16 +535,20 @@ class Transformation(object):
             trans_mask = None
 
             # QUESTION: Do we need to put outdata[gnan] for each plane != 7 ?
+        del self.xy_coords
         # put nan's back
-        if gnan != None:
+        if gnan is not None:
             outdata[gnan] = np.nan
 
         return outdata
 
     def _transform_16bit(self, mask):
         """
-        Transform the DQ plane, bit by bit. Since np.unpackbits() only works
-        on uint8 data, we have to do this by hand.
+        Transform the DQ plane, bit by bit. Each bit is interpolated in the
+        same way as the science data, but only for the output pixels that
+        pixels with that bit can influence (see gempy.library.resample),
+        and a pixel is flagged if it had greater than 1% influence. The
+        no_data bit is always transformed so the data are padded with it.
 
         Parameters
         ----------
@@ -543,14 +556,12 @@ class Transformation(object):
         type: <ndarray>
 
         """
-        trans_mask = np.zeros(mask.shape, dtype=np.uint16)
-        for j in range(0, 16):
-            bit = 2**j
-            # Only transform bits that have a pixel set. But we always want
-            # to do one transformation so we can pad the data with DQ.no_data
-            if bit == DQMap['no_data'] or np.sum(mask & bit) > 0:
-                cval=DQMap['no_data'] if bit == DQMap['no_data'] else 0
-                temp_mask = self.affine_transform((mask & 2**j).astype(np.float32), cval=cval)
-                trans_mask += np.where(np.abs(temp_mask > 0.01*bit), bit, 0).astype(np.uint16)
-
-        return trans_mask
+        if self.notransform:
+            return mask.astype(np.uint16)
+
+        if not hasattr(self, 'offset'):
+            self.affine_init(mask.shape)
+
+        resampler = Resampler(self.matrix, self.offset, mask.shape,
+                              order=self.order, mode=self.mode)
+        return resampler.transform_mask(mask, no_data=DQMap['no_data'])
@@ -4,6 +4,7 @@
 #
 #                                                                    typewalk.py
 # ------------------------------------------------------------------------------
+from __future__ import print_function
 __version__ = "v2.0 (beta) "
 # ------------------------------------------------------------------------------
 desc = """
@@ -35,12 +36,19 @@ Description:
     $ reduce @gmos_images_south
 
   This will also report match results to stdout, colourized if requested (-c).
+
+  Files are classified by a pool of processes (-j --jobs, default: number of
+  CPUs), and their tags are kept in a cache, ~/.geminidr/typewalk.db, along
+  with their size and modification time. Walking the same files again only
+  classifies those that have changed. --nocache disables the cache.
 """
 # ------------------------------------------------------------------------------
 import os
 import re
 import sys
 import time
+import sqlite3
+import multiprocessing
 
 import astrodata
 import gemini_instruments
@@ -49,6 +57,7 @@ from astrodata.core import AstroDataError
 
 # ------------------------------------------------------------------------------
 batchno = 100
+CACHE_FILE = '~/.geminidr/typewalk.db'
 # ------------------------------------------------------------------------------
 def typewalk_argparser():
     from argparse import ArgumentParser
@@ -91,6 +100,14 @@ def typewalk_argparser():
     parser.add_argument("--xtags", dest="xtags", nargs='+', default=None,
                         help="Exclude <xtags> from reporting.")
 
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=None,
+                        help="Number of processes classifying files. "
+                        "Default is the number of CPUs.")
+
+    parser.add_argument("--nocache", dest="nocache", action="store_true",
+                        help="Do not use (nor update) the cache of file "
+                        "tags, {}.".format(CACHE_FILE))
+
     return parser.parse_args()
 
 # ------------------------------------------------------------------------------
@@ -142,6 +159,111 @@ def generate_outfile(outfile, olist, match_type, logical_or, xtypes):
             ofile.write("\n")
     return
 
+def classifier_signature():
+    """
+    Identifies the classification code: the modification times of the
+    astrodata and gemini_instruments modules. Cached tags are discarded when
+    it changes.
+
+    """
+    mtimes = []
+    for package in (astrodata, gemini_instruments):
+        for root, dirs, files in os.walk(os.path.dirname(package.__file__)):
+            mtimes.extend(os.path.getmtime(os.path.join(root, f))
+                          for f in files if f.endswith('.py'))
+    return "{}:{}".format(len(mtimes), max(mtimes) if mtimes else 0)
+
+class TagCache(object):
+    """
+    The tags of the files classified by previous walks, as
+    path -> (mtime, size, tags), in the SQLite database `path`.
+
+    """
+    def __init__(self, path=CACHE_FILE):
+        path = os.path.expanduser(path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta "
+                         "(key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tags (path TEXT PRIMARY "
+                         "KEY, mtime REAL, size INTEGER, tags TEXT)")
+        signature = classifier_signature()
+        row = self._db.execute("SELECT value FROM meta WHERE "
+                               "key = 'signature'").fetchone()
+        if row is None or row[0] != signature:
+            self._db.execute("DELETE FROM tags")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES "
+                             "('signature', ?)", (signature,))
+        self._db.commit()
+
+    def get(self, path, mtime, size):
+        """Returns the cached tags of `path`, or None if it changed."""
+        row = self._db.execute("SELECT tags FROM tags WHERE path = ? AND "
+                               "mtime = ? AND size = ?",
+                               (path, mtime, size)).fetchone()
+        return row[0].split() if row is not None else None
+
+    def put(self, entries):
+        """Saves a sequence of (path, mtime, size, tags)."""
+        self._db.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?)",
+                             [(p, m, s, " ".join(t)) for p, m, s, t in entries])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+def classify(fname):
+    """
+    Returns the tags of a file, as a list, or the error message to report
+    if it can't be opened. Runs in the worker processes.
+
+    """
+    try:
+        return sorted(astrodata.open(fname, headers_only=True).tags), None
+    except IOError:
+        return None, "Could not open file: {}".format(fname)
+    except AstroDataError:
+        return None, "AstroData failed to open file: {}".format(fname)
+
+def classify_files(fnames, pool=None, cache=None):
+    """
+    Classifies files, using the tags in the `cache` (a TagCache) for those
+    unchanged since they were cached, and a multiprocessing `pool` for the
+    rest, if given.
+
+    Returns a list of (tags, error) tuples, as returned by classify(), in
+    the order of `fnames`.
+
+    """
+    results = [None] * len(fnames)
+    stats = {}
+    todo = []
+    for i, fname in enumerate(fnames):
+        try:
+            st = os.stat(fname)
+        except OSError:
+            results[i] = (None, "Could not open file: {}".format(fname))
+            continue
+        stats[i] = (os.path.abspath(fname), st.st_mtime, st.st_size)
+        tags = cache.get(*stats[i]) if cache is not None else None
+        if tags is not None:
+            results[i] = (tags, None)
+        else:
+            todo.append(i)
+
+    if pool is not None and len(todo) > 1:
+        classified = pool.map(classify, [fnames[i] for i in todo], chunksize=4)
+    else:
+        classified = [classify(fnames[i]) for i in todo]
+
+    for i, result in zip(todo, classified):
+        results[i] = result
+    if cache is not None:
+        cache.put([stats[i] + (tags,) for i, (tags, error)
+                   in zip(todo, classified) if error is None])
+    return results
+
 class Faces(object):
     PURPLE    = '\033[95m'
     CYAN      = '\033[96m'
@@ -163,12 +285,28 @@ class DataSpider(object):
     """
     def typewalk(self, directory=os.getcwd(), only=None, filemask=None, 
                  or_logic=False, outfile=None, stayTop=False, batchnum=100, 
-                 xtypes=None):
+                 xtypes=None, jobs=None, use_cache=True):
         """
         Recursively walk <directory> and put type information to stdout
 
         """
         directory = os.path.abspath(directory)
+        jobs = jobs or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+        cache = TagCache() if use_cache else None
+        try:
+            return self._typewalk(directory, only, filemask, or_logic,
+                                  outfile, stayTop, batchnum, xtypes,
+                                  pool, cache)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if cache is not None:
+                cache.close()
+
+    def _typewalk(self, directory, only, filemask, or_logic, outfile,
+                  stayTop, batchnum, xtypes, pool, cache):
 
         # This accumulates files that match --types type if --out is
         # specified.
@@ -189,98 +327,92 @@ class DataSpider(object):
                 rootln = "\n{}directory: {} {}".format(Faces.CYAN, Faces.END, root)
 
             firstfile = True
-            for tfile in files:
-                if filemask is None:
-                    mask = r".*?\.(fits|FITS)$"
-                else:
-                    mask = filemask
-
-                try:
-                    matched = re.match(mask, tfile)
-                except:
-                    print "BAD FILEMASK (must be a valid regexp):", mask
-                    return str(sys.exc_info()[1])
-
-                if (re.match(mask, tfile)) :
-                    fname = os.path.join(root, tfile)
+            if filemask is None:
+                mask = r".*?\.(fits|FITS)$"
+            else:
+                mask = filemask
+
+            try:
+                tfiles = [tfile for tfile in files if re.match(mask, tfile)]
+            except:
+                print("BAD FILEMASK (must be a valid regexp):", mask)
+                return str(sys.exc_info()[1])
+
+            fnames = [os.path.join(root, tfile) for tfile in tfiles]
+            results = classify_files(fnames, pool=pool, cache=cache)
+            for tfile, fname, (dtypes, error) in zip(tfiles, fnames, results):
+                if error is not None:
+                    print(error)
+                    continue
+
+                # exclude if dtypes has any xtypes
+                if xtypes:
                     try:
-                        fl = astrodata.open(fname)
-                        dtypes = list(fl.tags)
-                    except IOError:
-                        print "Could not open file: %s" % fname
-                        continue
-                    except AstroDataError:
-                        print "AstroData failed to open file: %s" % fname
+                        assert set(dtypes).intersection(set(xtypes))
                         continue
+                    except AssertionError:
+                        pass
 
-                    # exclude if dtypes has any xtypes
-                    if xtypes:
+                # Here we are looking to match *all* caller types.
+                # Logical AND, not OR.
+                if only == "all":
+                    found = True
+                else:
+                    found = False
+                    if or_logic:
                         try:
-                            assert set(dtypes).intersection(set(xtypes))
-                            continue
+                            assert(set(only).intersection(set(dtypes)))
+                            found = True
+                            if outfile:
+                                outfile_list.append(fname)
                         except AssertionError:
                             pass
-
-                    # Here we are looking to match *all* caller types.
-                    # Logical AND, not OR.
-                    if only == "all":
-                        found = True
                     else:
-                        found = False
-                        if or_logic:
-                            try:
-                                assert(set(only).intersection(set(dtypes)))
-                                found = True
-                                if outfile:
-                                    outfile_list.append(fname)
-                            except AssertionError:
-                                pass
-                        else:
-                            if set(only).issubset(dtypes):
-                                found = True
-                                if outfile:
-                                    outfile_list.append(fname)
-
-                    if not found:
-                        continue
-
-                    if firstfile:
-                        print rootln
-
-                    firstfile = False
-                    # PRINTING OUT THE FILE AND TYPE INFO
-                    indent = 5
-                    pwid = 40
-                    fwid = pwid - indent
-                    while len(tfile) >= (fwid - 1):
-                        print "     {}{}{}".format(Faces.BLUE, tfile, Faces.END)
-                        tfile = ""
-
-                    if len(tfile) > 0:
-                        prlin = "     {} ".format(tfile)
-                        prlincolor = "     {}{}{} ".format(Faces.BLUE, tfile,
-                                                           Faces.END)
+                        if set(only).issubset(dtypes):
+                            found = True
+                            if outfile:
+                                outfile_list.append(fname)
+
+                if not found:
+                    continue
+
+                if firstfile:
+                    print(rootln)
+
+                firstfile = False
+                # PRINTING OUT THE FILE AND TYPE INFO
+                indent = 5
+                pwid = 40
+                fwid = pwid - indent
+                while len(tfile) >= (fwid - 1):
+                    print("     {}{}{}".format(Faces.BLUE, tfile, Faces.END))
+                    tfile = ""
+
+                if len(tfile) > 0:
+                    prlin = "     {} ".format(tfile)
+                    prlincolor = "     {}{}{} ".format(Faces.BLUE, tfile,
+                                                       Faces.END)
+                else:
+                    prlin = "     "
+                    prlincolor = "     "
+
+                empty = " " * indent + "." * fwid
+                fwid  = pwid+indent
+                lp    = len(prlin)
+                nsp   = pwid - ( lp % pwid )
+                print(prlincolor+("."*nsp)+"{}".format(Faces.END), end=' ')
+                tstr = ""
+                astr = ""
+                dtypes.sort()
+                for dtype in dtypes:
+                    if (dtype is not None):
+                        newtype = "({}) ".format(dtype)
                     else:
-                        prlin = "     "
-                        prlincolor = "     "
-
-                    empty = " " * indent + "." * fwid
-                    fwid  = pwid+indent
-                    lp    = len(prlin)
-                    nsp   = pwid - ( lp % pwid )
-                    print prlincolor+("."*nsp)+"{}".format(Faces.END),
-                    tstr = ""
-                    astr = ""
-                    dtypes.sort()
-                    for dtype in dtypes:
-                        if (dtype is not None):
-                            newtype = "({}) ".format(dtype)
-                        else:
-                            newtype = "(Unknown) "
-
-                        astr += newtype
-
-                    print "{}{}{}".format(Faces.RED, astr, Faces.END)
+                        newtype = "(Unknown) "
+
+                    astr += newtype
+
+                print("{}{}{}".format(Faces.RED, astr, Faces.END))
 
         if outfile and outfile_list:
             generate_outfile(outfile, outfile_list, only, or_logic, xtypes)
@@ -307,11 +439,13 @@ def main(options):
                     filemask=options.filemask,
                     stayTop=options.stayTop,
                     batchnum=int(options.batchnum)-1,
-                    xtypes=options.xtags
+                    xtypes=options.xtags,
+                    jobs=options.jobs,
+                    use_cache=not options.nocache
         )
-        print "Done DataSpider.typewalk(..)"
+        print("Done DataSpider.typewalk(..)")
     except KeyboardInterrupt:
-        print "Interrupted by Control-C"
+        print("Interrupted by Control-C")
     return
 
 
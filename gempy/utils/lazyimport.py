@@ -0,0 +1,88 @@
+#
+#                                                                  gemini_python
+#
+#                                                                    gempy.utils
+#                                                                  lazyimport.py
+# ------------------------------------------------------------------------------
+"""
+Deferred imports for heavy, rarely used modules.
+
+    lazy_import() -- returns a stand-in for a module, imported on first use.
+
+A module level
+
+    >>> catalog_client = lazy_import('gempy.gemini.gemini_catalog_client')
+
+costs nothing until some code does, e.g., catalog_client.get_fits_table(...),
+which imports the module and hands over the attribute. After that, the
+stand-in forwards every attribute access to the real module.
+
+Note that 'from module import name' cannot be deferred this way: the name
+has to be looked up through the module, as above.
+
+"""
+import sys
+import types
+
+from importlib import import_module
+# ------------------------------------------------------------------------------
+class LazyModule(types.ModuleType):
+    """
+    A stand-in for a module that hasn't been imported yet. Any attribute
+    lookup that isn't found on the stand-in itself imports the module (and
+    its dependencies, first), and is resolved on the real one.
+
+    """
+    def __init__(self, name, dependencies=()):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_lazy_dependencies'] = tuple(dependencies)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            for dependency in self.__dict__['_lazy_dependencies']:
+                import_module(dependency)
+            module = import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__dict__['_lazy_module'] is None:
+            return "<lazy module '{}' (not loaded)>".format(self.__name__)
+        return repr(self.__dict__['_lazy_module'])
+
+def lazy_import(name, *dependencies):
+    """
+    Returns the module `name` if it has already been imported, or a
+    LazyModule that will import it the first time one of its attributes is
+    needed.
+
+    Parameters
+    ----------
+    name : <str>
+        Absolute, dotted name of the module.
+
+    dependencies : <str>
+        Modules to import right before `name`, because its users rely on
+        their side effects, e.g., 'gemini_instruments' registering the
+        AstroData classes for 'astrodata'.
+
+    Returns
+    -------
+    <module> or <LazyModule>
+
+    """
+    module = sys.modules.get(name)
+    if module is not None and all(dep in sys.modules for dep in dependencies):
+        return module
+    return LazyModule(name, dependencies)
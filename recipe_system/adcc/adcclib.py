@@ -50,7 +50,9 @@ class ADCC(with_metaclass(Singleton, object)):
             pass
         else:
             self.dark      = args.dark
-            self.events    = eventsManager.EventsManager()
+            self.events    = eventsManager.EventsManager(
+                maxlen=getattr(args, 'max_events', None),
+                overflow=getattr(args, 'events_db', None))
             self.http_port = args.httpport
             self.sreport   = args.adccsrn
             self.racefile  = "adccinfo.py"
@@ -76,7 +78,9 @@ class ADCC(with_metaclass(Singleton, object)):
         self.web = Thread(group=None, target=http_proxy.main, name="webface",
                           args=(run_event,),
                           kwargs={'port': self.http_port, 'dark': self.dark,
-                                  'events': self.events, 'verbose': self.verbose})
+                                  'events': self.events, 'verbose': self.verbose,
+                                  'qacache_dir': os.path.join(get_adcc_dir(),
+                                                              'qacache')})
         return
 
     def _handle_locks(self):
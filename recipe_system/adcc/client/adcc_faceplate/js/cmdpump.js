@@ -10,6 +10,9 @@ function GJSCommandPipe(url) {
     this.timestamp = null;
     this.msgtype = null;
     this.delay = 1000;
+    // Long-poll: the adcc holds the request up to 'wait' seconds, until
+    // there are new events.
+    this.wait = 20;
 }
 GJSCommandPipe.prototype = {
     constructor: GJSCommandPipe,
@@ -59,8 +62,10 @@ GJSCommandPipe.prototype = {
         var gjs = this;	
 	$.ajax({type: "GET",
 		data: {timestamp: gjs.timestamp,
-		       msgtype: gjs.msgtype},
+		       msgtype: gjs.msgtype,
+		       wait: gjs.wait},
 		url: gjs.cmdq_url,
+		timeout: (gjs.wait + 10) * 1000,
 	        success: function (data) {
 		    gjs.iteratePump(data);
 		    if (!gjs.stop) {
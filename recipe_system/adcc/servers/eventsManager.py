@@ -10,14 +10,71 @@ __version__ = 'eventsManager, v(new hope)'
 import json
 import time
 import re
+import sqlite3
+import threading
+
+from bisect import bisect_right
 
 from astrodata import AstroData
 
 # ------------------------------------------------------------------------------
 class EventsManager(object):
-    def __init__(self):
-        self.event_list = []
-        self.event_index = {}
+    """
+    Time ordered store of the events (QA metrics, etc.) reported to the adcc.
+
+    The events are kept sorted by their "timestamp", so appending is O(1)
+    for events arriving in order, and get_list(fromtime) finds the first
+    new event by bisection.
+
+    Parameters
+    ----------
+    maxlen : <int>
+        Maximum number of events kept in memory. When exceeded, the oldest
+        events are dropped (in batches, so that trimming is O(1) amortized),
+        or moved to the overflow database if there's one. None (default)
+        means no limit.
+
+    overflow : <str>
+        Path to a SQLite database for the events dropped from memory.
+        get_list() reads them back transparently when asked for events
+        older than those in memory. It only holds the events of the running
+        adcc, and is emptied when the EventsManager is created.
+
+    """
+    def __init__(self, maxlen=None, overflow=None):
+        if maxlen is not None and maxlen < 1:
+            raise ValueError("maxlen must be a positive number of events")
+        self.maxlen = maxlen
+        self._lock = threading.RLock()
+        self._new_events = threading.Condition(self._lock)
+        self._events = []
+        self._stamps = []
+        self._db = None
+        self._overflow_until = None
+        if overflow is not None:
+            self._db = sqlite3.connect(overflow, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS events "
+                             "(timestamp REAL NOT NULL, event TEXT NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS events_timestamp "
+                             "ON events (timestamp)")
+            self._db.execute("DELETE FROM events")
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def event_list(self):
+        """The events held in memory, oldest first."""
+        with self._lock:
+            return list(self._events)
+
+    @event_list.setter
+    def event_list(self, events):
+        with self._lock:
+            self._events = []
+            self._stamps = []
+            self._add(sorted(events, key=lambda ev: ev["timestamp"]))
 
     def _get_stacklist(self, ad):
         # Find a list of all images that went into a stack for a stacked image
@@ -109,7 +166,8 @@ class EventsManager(object):
                 if "timestamp" in msg:
                     msg.update({"reported_timestamp":msg["timestamp"]})
                 msg.update({"timestamp":time.time()})
-            self.event_list.extend(ad)
+            with self._lock:
+                self._add(ad)
             return
 
         elif isinstance(ad, dict):
@@ -122,25 +180,104 @@ class EventsManager(object):
         else:
             raise TypeError("Bad Arguments")
 
-        self.event_list.append(wholed)
-        timestamp = wholed["timestamp"]
-        if timestamp not in self.event_index:
-            self.event_index.update({timestamp:[]})
-
-        ts_list = self.event_index[timestamp]
-        ts_list.append(self.event_list.index(wholed))
+        with self._lock:
+            self._add([wholed])
         return
 
     def get_list(self, fromtime=None):
-        if not fromtime:
-            return self.event_list
-        else:
-            for i in range(len(self.event_list)):
-                if self.event_list[i]["timestamp"] > fromtime:
-                    return self.event_list[i:]
-        return []
+        """
+        Returns the events with a timestamp later than `fromtime`, oldest
+        first, or all of them if `fromtime` is not given. The list is a
+        copy, which the caller is free to change.
+
+        """
+        with self._lock:
+            start = bisect_right(self._stamps, fromtime) if fromtime else 0
+            events = self._events[start:]
+            if (self._overflow_until is not None and
+                    (not fromtime or fromtime < self._overflow_until)):
+                events = self._get_overflow(fromtime) + events
+                # Late events may have been dropped after newer ones
+                events.sort(key=lambda ev: ev["timestamp"])
+        return events
+
+    def wait_for_events(self, fromtime=None, timeout=None):
+        """
+        Like get_list(), but if there are no events later than `fromtime`,
+        blocks until some arrive, or `timeout` seconds have passed.
+
+        Returns
+        -------
+        <list> : the new events, or an empty list on timeout.
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._new_events:
+            events = self.get_list(fromtime)
+            while not events:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._new_events.wait(remaining)
+                events = self.get_list(fromtime)
+        return events
 
     def clear_list(self):
-        self.event_list = []
-        self.event_index = {}
+        with self._lock:
+            self._events = []
+            self._stamps = []
+            if self._db is not None:
+                self._db.execute("DELETE FROM events")
+                self._db.commit()
+            self._overflow_until = None
+        return
+
+    # -------------------------------- prive -----------------------------------
+    def _add(self, events):
+        """
+        Inserts the events in time order, and wakes up any clients waiting
+        for them. Must be called with the lock held.
+
+        """
+        for event in events:
+            timestamp = event["timestamp"]
+            if not self._stamps or timestamp >= self._stamps[-1]:
+                self._stamps.append(timestamp)
+                self._events.append(event)
+            else:
+                # Out of order (e.g., a reported timestamp): keep it sorted,
+                # after any events with the same timestamp
+                idx = bisect_right(self._stamps, timestamp)
+                self._stamps.insert(idx, timestamp)
+                self._events.insert(idx, event)
+
+        if self.maxlen is not None and len(self._events) > self.maxlen:
+            self._trim()
+        self._new_events.notify_all()
+        return
+
+    def _trim(self):
+        """
+        Drops the oldest events, down to 90% of maxlen, writing them to the
+        overflow database, if any.
+
+        """
+        ndrop = len(self._events) - self.maxlen + self.maxlen // 10
+        if self._db is not None:
+            self._db.executemany("INSERT INTO events VALUES (?, ?)",
+                                 ((ev["timestamp"], json.dumps(ev))
+                                  for ev in self._events[:ndrop]))
+            self._db.commit()
+            if self._overflow_until is None:
+                self._overflow_until = self._stamps[ndrop - 1]
+            else:
+                self._overflow_until = max(self._overflow_until,
+                                           self._stamps[ndrop - 1])
+        del self._events[:ndrop]
+        del self._stamps[:ndrop]
         return
+
+    def _get_overflow(self, fromtime=None):
+        query = "SELECT event FROM events WHERE timestamp > ? ORDER BY rowid"
+        cursor = self._db.execute(query, (fromtime or float('-inf'),))
+        return [json.loads(row[0]) for row in cursor]
@@ -13,7 +13,8 @@ import os
 import sys
 import json
 import time
-import select
+import socket
+import threading
 import urllib.request, urllib.error, urllib.parse
 import urllib.parse
 import datetime
@@ -22,6 +23,13 @@ from socketserver import ThreadingMixIn
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
 from recipe_system.cal_service import calurl_dict
+from recipe_system.adcc.servers.qaMetricsCache import QAMetricsCache
+from recipe_system.adcc.servers.qaMetricsCache import get_json, loads
+# ------------------------------------------------------------------------------
+# Longest wait allowed on a cmdqueue.json long-poll (?wait=<sec>), and the
+# interval between keep-alive comments on an idle event stream.
+MAX_WAIT = 30
+STREAM_HEARTBEAT = 10
 # ------------------------------------------------------------------------------
 def parsepath(path):
     """
@@ -38,6 +46,17 @@ def parsepath(path):
     rparms.update(urllib.parse.parse_qs(parsed_url.query))
     return rparms
 
+def compact_json(obj):
+    """
+    Serialize events for the clients, without the whitespace of the
+    indented form: they are sent on every poll.
+
+    parameters: <list> or <dict>
+    return:     <string>
+
+    """
+    return json.dumps(obj, separators=(',', ':'))
+
 # ------------------------------------------------------------------------------
 #                                Timing functions
 def server_time():
@@ -141,16 +160,19 @@ def current_op_timestamp():
 #                             END Timing functions
 # ------------------------------------------------------------------------------
 #   FITS Store query.
-def fstore_get(timestamp):
+def fstore_get(timestamp, cache=None):
     """
     Open a url on fitsstore/qaforgui/ with the passed timestamp.
     timestamp is in epoch seconds, which is converted here to a
     YMD string for the URL.  Return a list of dicts of qa metrics data.
 
+    If a QAMetricsCache is passed, the operational day is served through it.
+
     N.B. A timestamp that evaluates to False (0, None) will request everything
     from fitsstore. This could be huge. Be careful passing no timestamp!
 
     parameters: <float>, time in epoch seconds
+                <QAMetricsCache>, optional
     return:     <list>,  list of dicts (json) of qametrics
 
     """
@@ -158,13 +180,15 @@ def fstore_get(timestamp):
     fitsstore_qa = calurl_dict.calurl_dict['QAQUERYURL']
     if not timestamp:
         furl         = os.path.join(fitsstore_qa)
-        store_handle = urllib.request.urlopen(furl)
-        qa_data      = json.loads(store_handle.read())
+        qa_data      = loads(get_json(furl)[0])
+    elif cache is not None:
+        date_query    = stamp_to_opday(timestamp)
+        current_day   = stamp_to_opday(current_op_timestamp())
+        qa_data       = cache.get(date_query, current=date_query == current_day)
     else:
         date_query    = stamp_to_opday(timestamp)
         furl          = os.path.join(fitsstore_qa, date_query)
-        store_handle  = urllib.request.urlopen(furl)
-        qa_data       = json.loads(store_handle.read())
+        qa_data       = loads(get_json(furl)[0])
     return qa_data
 
 # ------------------------------------------------------------------------------
@@ -194,7 +218,8 @@ class ADCCHandler(BaseHTTPRequestHandler):
             assert self.informers["verbose"]
             self.log_message(msg_form, repr(self.requestline), code, size)
         except AssertionError:
-            if "cmdqueue.json" in self.requestline:
+            if ("cmdqueue.json" in self.requestline or
+                    "event_stream" in self.requestline):
                 pass
             else:
                 self.log_message(msg_form, repr(self.requestline), code, size)
@@ -260,6 +285,11 @@ class ADCCHandler(BaseHTTPRequestHandler):
             if parms["path"].startswith("/cmdqueue.json"):
                 self._handle_cmdqueue_json(events, parms)
 
+            # ------------------------------------------------------------------
+            # Server-Sent Events: pushes new events as they arrive.
+            elif parms["path"].startswith("/event_stream"):
+                self._handle_event_stream(events, parms)
+
             # ------------------------------------------------------------------
             # Server time
             # Queried by metrics client
@@ -308,6 +338,11 @@ class ADCCHandler(BaseHTTPRequestHandler):
             self.end_headers()
             aevent = json.loads(pdict)
             events.append_event(aevent)
+            # The pipelines also report their metrics to fitsstore, so the
+            # cached current night is out of date
+            qacache = self.informers.get("qacache")
+            if qacache is not None:
+                qacache.invalidate(stamp_to_opday(current_op_timestamp()))
             self.log_message('"%s" %s %s', "Appended event", info_code, size)
             self.log_message('"%s" %s %s', repr(aevent), info_code, size)
 
@@ -338,21 +373,28 @@ class ADCCHandler(BaseHTTPRequestHandler):
         else:
             fromtime = 0
 
+        # Long-poll: with ?wait=<sec>, block until there are new events
+        if "wait" in parms:
+            wait = min(max(float(parms["wait"][0]), 0), MAX_WAIT)
+        else:
+            wait = 0
+
         # event_list = [] implies a new adcc. Request current op day
         # metrics from fitsstore.
 
-        if not events.event_list:
+        if not len(events):
             self.log_message(msg_form, "No extant events.", info_code, size)
             self.log_message(msg_form, reqmsg+"@fitsstore", info_code, size)
 
-            events.event_list = fstore_get(current_op_timestamp())
-            self.log_message(msg_form,"Received "+str(len(events.event_list))+" events.",
+            events.event_list = fstore_get(current_op_timestamp(),
+                                           cache=self.informers.get("qacache"))
+            self.log_message(msg_form,"Received "+str(len(events))+" events.",
                              info_code, size)
 
             tdic = events.get_list()
             tdic.insert(0, {"msgtype": "cmdqueue.request","timestamp": time.time()})
             tdic.append({"msgtype": "cmdqueue.request", "timestamp": time.time()})
-            self.wfile.write(json.dumps(tdic, sort_keys=True, indent=4))
+            self.wfile.write(compact_json(tdic))
 
         # Handle current nighttime requests ...
         elif stamp_to_opday(fromtime) == stamp_to_opday(current_op_timestamp()):
@@ -363,16 +405,19 @@ class ADCCHandler(BaseHTTPRequestHandler):
             # self.log_message(msg_form, "Last event:", info_code, size)
             # self.log_message(msg_form, repr(events.event_list.pop()), info_code, size)
 
-            tdic = events.get_list(fromtime=fromtime)
+            if wait:
+                tdic = events.wait_for_events(fromtime=fromtime, timeout=wait)
+            else:
+                tdic = events.get_list(fromtime=fromtime)
             tdic.insert(0, {"msgtype":"cmdqueue.request","timestamp": time.time()})
-            self.wfile.write(json.dumps(tdic, sort_keys=True, indent=4))
+            self.wfile.write(compact_json(tdic))
         # Handle previous day requests
         elif fromtime < current_op_timestamp():
             if verbosity:
                 self.log_message(msg_form, "Requested metrics on ... " +
                                  stamp_to_opday(fromtime), info_code, size)
 
-            tdic = fstore_get(fromtime)
+            tdic = fstore_get(fromtime, cache=self.informers.get("qacache"))
             if verbosity:
                 self.log_message(msg_form, "Received " + str(len(tdic)) +
                                     " events from fitsstore.", info_code, size)
@@ -382,7 +427,7 @@ class ADCCHandler(BaseHTTPRequestHandler):
             # recorded event.
             tdic.insert(0, {"msgtype": "cmdqueue.request", "timestamp": time.time()})
             tdic.append({"msgtype": "cmdqueue.request", "timestamp": time.time()})
-            self.wfile.write(json.dumps(tdic, sort_keys=True, indent=4))
+            self.wfile.write(compact_json(tdic))
 
         # Cannot handle the future ...
         else:
@@ -391,16 +436,57 @@ class ADCCHandler(BaseHTTPRequestHandler):
 
         return
 
+    def _handle_event_stream(self, events, parms):
+        """Handle HTTP client GET requests on service: event_stream
+
+        Server-Sent Events (text/event-stream). Each message carries, as
+        compact JSON, the list of events since the previous one, and its id
+        is the timestamp of the last of them. The stream starts after
+        ?timestamp=<sec>, or after the Last-Event-ID sent by a reconnecting
+        client, or else with all the events held. It stays open until the
+        client goes away or the adcc shuts down.
+        """
+        run_event = self.informers.get("run_event")
+        fromtime = None
+        if "timestamp" in parms:
+            fromtime = float(parms["timestamp"][0])
+        elif self.headers.get("Last-Event-ID"):
+            fromtime = float(self.headers["Last-Event-ID"])
+
+        self.send_response(200)
+        self.send_header('Content-type', "text/event-stream")
+        self.send_header('Cache-Control', "no-cache")
+        self.end_headers()
+        try:
+            while run_event is None or run_event.is_set():
+                tdic = events.wait_for_events(fromtime=fromtime,
+                                              timeout=STREAM_HEARTBEAT)
+                if tdic:
+                    fromtime = tdic[-1]["timestamp"]
+                    self.wfile.write("id: {!r}\ndata: {}\n\n".format(
+                        fromtime, compact_json(tdic)))
+                else:
+                    self.wfile.write(": keep-alive\n\n")
+                self.wfile.flush()
+        except socket.error:
+            # The client has closed the connection
+            pass
+        return
 
 
 class MTHTTPServer(ThreadingMixIn, HTTPServer):
     """Handles requests using threads"""
+    # Don't wait for open event streams when shutting down
+    daemon_threads = True
 
 
 def startInterfaceServer(*args, **informers):
-    import socket
     run_event = args[0]
     port = informers['port']
+    informers['run_event'] = run_event
+    if informers.get('qacache_dir'):
+        informers['qacache'] = QAMetricsCache(
+            calurl_dict.calurl_dict['QAQUERYURL'], informers['qacache_dir'])
     ADCCHandler.informers = informers
     findingPort = True
     while findingPort:
@@ -413,13 +499,18 @@ def startInterfaceServer(*args, **informers):
             port += 1
 
     print("Started  HTTP server on port %s" % str(port))
+    # Every request is handled in its own thread as soon as it arrives;
+    # this thread only watches for the signal to stop.
+    server_thread = threading.Thread(target=server.serve_forever,
+                                     name="httpserver")
+    server_thread.daemon = True
+    server_thread.start()
     while run_event.is_set():
-        r, w, x = select.select([server.socket], [], [], .5)
-        if r:
-            server.handle_request()
+        time.sleep(.5)
 
     print("http_proxy: received signal 'clear'. Shutting down proxy server ...")
-    server.socket.close()
+    server.shutdown()
+    server.server_close()
     return
 
 main = startInterfaceServer
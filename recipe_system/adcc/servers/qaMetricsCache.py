@@ -0,0 +1,208 @@
+#
+#                                                                     QAP Gemini
+#
+#                                                              qaMetricsCache.py
+# ------------------------------------------------------------------------------
+from future import standard_library
+standard_library.install_aliases()
+from builtins import object
+__version__ = 'qaMetricsCache, v(new hope)'
+# ------------------------------------------------------------------------------
+"""
+On-disk cache of the QA metrics that fitsstore serves for each operational
+day (<QAQUERYURL>/<YYYYMMDD>).
+
+The metrics of past nights don't change, so once downloaded they are served
+from the cache. Those of the current night are refetched when older than the
+TTL, or after invalidate(). Refetches are conditional (If-None-Match /
+If-Modified-Since), so an unchanged day costs a '304 Not Modified' instead of
+the whole JSON. Transfers ask for gzip encoding, and the cache keeps the
+JSON gzipped.
+
+For each operational day, the cache directory holds:
+
+    <YYYYMMDD>.json.gz    -- the metrics, as received
+    <YYYYMMDD>.meta.json  -- time fetched, ETag and Last-Modified
+
+"""
+import io
+import os
+import gzip
+import json
+import time
+import tempfile
+import threading
+import urllib.request, urllib.error
+
+# ------------------------------------------------------------------------------
+def get_json(url, headers=None, timeout=None):
+    """
+    GET a JSON document, accepting a gzipped transfer.
+
+    parameters: <str>, url
+                <dict>, extra request headers
+                <float>, timeout in seconds
+    return:     <tuple>, (raw JSON <bytes>, response headers)
+
+    Raises urllib.error.HTTPError on HTTP errors, including a 304 response
+    to a conditional request.
+
+    """
+    request = urllib.request.Request(url, headers=headers or {})
+    request.add_header('Accept-Encoding', 'gzip')
+    if timeout is None:
+        response = urllib.request.urlopen(request)
+    else:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    try:
+        raw = response.read()
+        info = response.info()
+    finally:
+        response.close()
+
+    if info.get('Content-Encoding') == 'gzip':
+        raw = gzip.GzipFile(fileobj=io.BytesIO(raw)).read()
+    return raw, info
+
+def loads(raw):
+    return json.loads(raw.decode('utf-8'))
+
+
+class QAMetricsCache(object):
+    """
+    Parameters
+    ----------
+    url : <str>
+        fitsstore QA query URL, to which '/<YYYYMMDD>' is appended.
+
+    cache_dir : <str>
+        Directory for the cached days. Created if needed.
+
+    ttl : <float>
+        Seconds during which the metrics of the current operational day are
+        served from the cache without checking fitsstore.
+
+    timeout : <float>
+        Timeout, in seconds, of the requests to fitsstore.
+
+    """
+    def __init__(self, url, cache_dir, ttl=60, timeout=30):
+        self.url = url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._invalid_before = 0
+        self._invalidated = {}
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get(self, opday, current=False):
+        """
+        Return the QA metrics of an operational day.
+
+        If fitsstore can't be reached, stale metrics are returned when there
+        are some in the cache.
+
+        parameters: <str>, operational day, YYYYMMDD
+                    <bool>, True if this is the current operational day,
+                            whose metrics may still change.
+        return:     <list>, list of dicts (json) of qametrics
+
+        """
+        with self._lock:
+            meta, raw = self._read(opday)
+            if raw is not None and self._is_fresh(opday, meta, current):
+                return loads(raw)
+
+            headers = {}
+            if raw is not None:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+            try:
+                newraw, info = get_json("{}/{}".format(self.url, opday),
+                                        headers=headers, timeout=self.timeout)
+            except urllib.error.HTTPError as err:
+                if err.code == 304 and raw is not None:
+                    meta['fetched'] = time.time()
+                    self._write(opday, meta)
+                elif raw is None:
+                    raise
+                return loads(raw)
+            except (urllib.error.URLError, IOError):
+                # fitsstore unreachable: better stale metrics than none
+                if raw is None:
+                    raise
+                return loads(raw)
+
+            meta = {'fetched': time.time(),
+                    'etag': info.get('ETag'),
+                    'last_modified': info.get('Last-Modified')}
+            self._write(opday, meta, newraw)
+            return loads(newraw)
+
+    def invalidate(self, opday=None):
+        """
+        Force a (conditional) refetch of an operational day, or of all of
+        them, on the next get().
+
+        parameters: <str>, operational day, YYYYMMDD. None for all.
+        return:     <void>
+
+        """
+        with self._lock:
+            if opday is None:
+                self._invalid_before = time.time()
+            else:
+                self._invalidated[opday] = time.time()
+        return
+
+    # -------------------------------- prive -----------------------------------
+    def _is_fresh(self, opday, meta, current):
+        fetched = meta['fetched']
+        if fetched <= max(self._invalid_before, self._invalidated.get(opday, 0)):
+            return False
+        return not current or time.time() - fetched < self.ttl
+
+    def _paths(self, opday):
+        base = os.path.join(self.cache_dir, opday)
+        return base + '.meta.json', base + '.json.gz'
+
+    def _read(self, opday):
+        metafile, datafile = self._paths(opday)
+        try:
+            with open(metafile) as fd:
+                meta = json.load(fd)
+            with gzip.open(datafile, 'rb') as fd:
+                raw = fd.read()
+        except (IOError, OSError, ValueError):
+            return None, None
+        return meta, raw
+
+    def _write(self, opday, meta, raw=None):
+        # The data first, so a meta file is never newer than its data.
+        metafile, datafile = self._paths(opday)
+        if raw is not None:
+            self._atomic_write(datafile, self._gzip(raw))
+        self._atomic_write(metafile, json.dumps(meta).encode('utf-8'))
+        return
+
+    def _gzip(self, raw):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+            gz.write(raw)
+        return buf.getvalue()
+
+    def _atomic_write(self, fname, content):
+        fd, tmpname = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(content)
+            os.rename(tmpname, fname)
+        except Exception:
+            os.unlink(tmpname)
+            raise
+        return
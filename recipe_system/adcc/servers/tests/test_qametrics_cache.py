@@ -0,0 +1,86 @@
+# pytest suite
+"""
+Tests for the adcc QAMetricsCache, against a local stand-in for fitsstore.
+
+To run:
+    1) py.test -v --capture=no
+"""
+from future import standard_library
+standard_library.install_aliases()
+
+import gzip
+import io
+import json
+import threading
+
+import pytest
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from recipe_system.adcc.servers.qaMetricsCache import QAMetricsCache
+
+METRICS = {'20170913': [{'msgtype': 'qametric', 'timestamp': 1505300000.0}],
+           '20170914': [{'msgtype': 'qametric', 'timestamp': 1505390000.0}]}
+
+class FitsStoreHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        opday = self.path.rsplit('/', 1)[-1]
+        etag = '"{}-{}"'.format(opday, len(METRICS[opday]))
+        self.requests.append((opday, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = json.dumps(METRICS[opday]).encode('utf-8')
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+            gz.write(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(buf.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fitsstore():
+    server = HTTPServer(('localhost', 0), FitsStoreHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    del FitsStoreHandler.requests[:]
+    yield "http://localhost:{}/qaforgui".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+# Past nights are downloaded once, and then served from disk
+def test_past_night_is_cached(fitsstore, tmpdir):
+    cache = QAMetricsCache(fitsstore, str(tmpdir))
+    assert cache.get('20170913') == METRICS['20170913']
+    assert cache.get('20170913') == METRICS['20170913']
+    assert QAMetricsCache(fitsstore, str(tmpdir)).get('20170913') == METRICS['20170913']
+    assert FitsStoreHandler.requests == [('20170913', None)]
+
+# The current night is revalidated with a conditional request when stale
+def test_current_night_is_revalidated(fitsstore, tmpdir):
+    cache = QAMetricsCache(fitsstore, str(tmpdir), ttl=3600)
+    cache.get('20170914', current=True)
+    cache.get('20170914', current=True)
+    assert len(FitsStoreHandler.requests) == 1
+
+    cache.invalidate('20170914')
+    assert cache.get('20170914', current=True) == METRICS['20170914']
+    assert FitsStoreHandler.requests[-1] == ('20170914', '"20170914-1"')
+
+    METRICS['20170914'].append({'msgtype': 'qametric', 'timestamp': 1505390100.0})
+    try:
+        cache.invalidate()
+        assert len(cache.get('20170914', current=True)) == 2
+    finally:
+        METRICS['20170914'].pop()
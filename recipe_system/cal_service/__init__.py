@@ -1,6 +1,8 @@
 import os
 from ..config import globalConf, STANDARD_REDUCTION_CONF, DEFAULT_DIRECTORY
-from . import transport_request
+from gempy.utils.lazyimport import lazy_import
+
+transport_request = lazy_import(__name__ + '.transport_request')
 
 try:
     from . import localmanager
@@ -14,11 +16,17 @@ except ImportError as e:
 CONFIG_SECTION = 'calibs'
 
 globalConf.update_translation({
-    (CONFIG_SECTION, 'standalone'): bool
+    (CONFIG_SECTION, 'standalone'): bool,
+    (CONFIG_SECTION, 'search_cache'): bool,
+    (CONFIG_SECTION, 'search_cache_ttl'): float,
+    (CONFIG_SECTION, 'search_time_tolerance'): int,
+    (CONFIG_SECTION, 'max_connections'): int
 })
 
 globalConf.update_exports({
-    CONFIG_SECTION: ('standalone', 'database_dir')
+    CONFIG_SECTION: ('standalone', 'database_dir', 'search_cache',
+                     'search_cache_ttl', 'search_time_tolerance',
+                     'max_connections')
 })
 # END Setting up the calibs section for config files
 # ------------------------------------------------------------------------------
@@ -82,7 +90,7 @@ def cal_search_factory():
     """
 
     return (
-        localmanager.LocalManager(get_calconf().database_dir).calibration_search
+        localmanager.get_manager(get_calconf().database_dir).calibration_search
         if is_local() else
         transport_request.calibration_search
     )
@@ -1,12 +1,17 @@
 #
 #                                                               calrequestlib.py
 # ------------------------------------------------------------------------------
+import os
+import errno
 import hashlib
+import tempfile
 import requests
 
+from multiprocessing.pool import ThreadPool
+
 from os import mkdir
 from os.path import basename, exists
-from os.path import join, split
+from os.path import abspath, join, split
 
 from urlparse import urlparse
 
@@ -14,25 +19,56 @@ from gempy.utils import logutils
 
 from geminidr  import set_caches
 from recipe_system.cal_service import cal_search_factory, handle_returns_factory
+from recipe_system.cal_service import get_calconf, is_local
+from .search_cache import CalSearchCache, CacheStats, fingerprint, DEFAULT_TTL
 from .file_getter import get_file_iterator, GetterError
 from astrodata import descriptor_list
 # ------------------------------------------------------------------------------
 log = logutils.get_logger(__name__)
 # ------------------------------------------------------------------------------
-# Currently delivers transport_request.calibration_search fn.
-calibration_search = cal_search_factory()
+def calibration_search(rq):
+    # Resolved on each call, as the configuration may change after import.
+    # The local managers are kept by the cal_service, so this is cheap.
+    return cal_search_factory()(rq)
+
+# Default number of concurrent calibration searches and downloads
+# (see [calibs] max_connections).
+MAX_CONNECTIONS = 4
 # ------------------------------------------------------------------------------
-def get_request(url, filename):
-    iterator = get_file_iterator(url)
-    with open(filename, 'wb') as fd:
-        for chunk in iterator:
-            fd.write(chunk)
+class ChecksumError(IOError):
+    """The MD5 of a downloaded calibration is not the one expected."""
+    pass
+
+def get_request(url, filename, md5=None, session=None):
+    """
+    Downloads `url` into `filename`. The data go to a temporary file in the
+    same directory, which is renamed to `filename` only when complete (and
+    its MD5 matches `md5`, if given), so that concurrent reduce processes
+    never see a partial calibration.
+    """
+    dirname, fname = split(filename)
+    fd, tmpname = tempfile.mkstemp(dir=dirname or '.', prefix='.' + fname + '.',
+                                   suffix='.part')
+    digest = hashlib.md5()
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in get_file_iterator(url, session=session):
+                digest.update(chunk)
+                out.write(chunk)
+        if md5 is not None and digest.hexdigest() != md5:
+            err = "MD5 hash of downloaded file does not match expected hash {}"
+            raise ChecksumError(err.format(md5))
+        os.rename(tmpname, filename)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
     return filename
 
-def generate_md5_digest(filename):
+def generate_md5_digest(filename, blocksize=1 << 20):
     md5 = hashlib.md5()
-    fdata = open(filename).read()
-    md5.update(fdata)
+    with open(filename, 'rb') as fd:
+        for block in iter(lambda: fd.read(blocksize), b''):
+            md5.update(block)
     return md5.hexdigest()
 
 def _check_cache(cname, ctype):
@@ -42,13 +78,90 @@ def _check_cache(cname, ctype):
         return cachename, cachedir
     return None, cachedir
 
+def _search_backend():
+    if is_local():
+        return "local:{}".format(abspath(get_calconf().database_dir))
+    from .transport_request import _CALMGR
+    return _CALMGR
+
+def _open_search_cache():
+    """
+    Returns the CalSearchCache of the reduce cache directory, or None if
+    disabled in the [calibs] config section ('search_cache = false'), or if
+    searching the local database, whose manager keeps its own cache.
+    """
+    calconf = get_calconf()
+    if is_local() or not getattr(calconf, 'search_cache', True):
+        return None
+    ttl = getattr(calconf, 'search_cache_ttl', DEFAULT_TTL)
+    cachedir = set_caches()['reducecache']
+    return CalSearchCache(join(cachedir, 'calsearch.db'), ttl=ttl)
+
 def _makecachedir(caltype):
     cache = set_caches()
     cachedir = join(cache["calibrations"], caltype)
-    if not exists(cachedir):
+    try:
         mkdir(cachedir)
+    except OSError as err:
+        # Another process may have just created it
+        if err.errno != errno.EEXIST:
+            raise
     return cachedir
 
+def _max_connections():
+    conns = getattr(get_calconf(), 'max_connections', None)
+    return MAX_CONNECTIONS if conns is None else max(int(conns), 1)
+
+def _http_session(connections):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=connections,
+                                            pool_maxsize=connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _thread_map(function, items, workers):
+    """map() on a pool of `workers` threads, serially if pointless."""
+    items = list(items)
+    if workers < 2 or len(items) < 2:
+        return [function(item) for item in items]
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(function, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def _fetch_calibration(calurl, calmd5, caltype, session=None):
+    """
+    Makes sure that the calibration at `calurl` is in the calibrations
+    cache, downloading it if needed. Returns its path, or None if it could
+    not be retrieved.
+    """
+    components = urlparse(calurl)
+    calname = basename(components.path)
+    cachename, cachedir = _check_cache(calname, caltype)
+    if cachename:
+        if generate_md5_digest(cachename) == calmd5:
+            log.stdinfo("Cached calibration {} matched.".format(cachename))
+            return cachename
+        log.stdinfo("File {} is cached but".format(calname))
+        log.stdinfo("md5 checksums DO NOT MATCH")
+        log.stdinfo("Making request on calibration service")
+        log.stdinfo("Requesting URL {}".format(calurl))
+    else:
+        log.status("Making request for {}".format(calurl))
+        cachename = join(cachedir, calname)
+
+    try:
+        get_request(calurl, cachename, md5=calmd5, session=session)
+    except GetterError as err:
+        for message in err.messages:
+            log.error(message)
+        return None
+    log.status("MD5 hash match. Download OK.")
+    return cachename
+
 class CalibrationRequest(object):
     """
     Request objects are passed to a calibration_search() function
@@ -160,59 +273,103 @@ def process_cal_requests(cal_requests):
         calibration_records.update({rq.ad: calfile})
         return
 
-    cache = set_caches()
-    for rq in cal_requests:
-        calname = None
-        calmd5 = None
-        calurl = None
-        calurl, calmd5 = calibration_search(rq)
+    backend = _search_backend()
+    search_cache = _open_search_cache()
+    time_tolerance = getattr(get_calconf(), 'search_time_tolerance', 0) or 0
+    # The local manager's database session can't be shared between threads
+    workers = 1 if is_local() else _max_connections()
+
+    # Search, once per distinct request (see search_cache). Requests with
+    # no fingerprint are searched for on their own, and never cached.
+    keys = [fingerprint(rq, backend, time_tolerance) or
+            "request:{}".format(i) for i, rq in enumerate(cal_requests)]
+    cacheable = lambda key: (search_cache is not None and
+                             not key.startswith("request:"))
+    searches = {}
+    unique_requests = {}
+    ncached = nduplicates = 0
+    for rq, key in zip(cal_requests, keys):
+        if key in searches:
+            nduplicates += 1
+            log.debug("Calibration search for {} skipped: same request as "
+                      "a previous frame".format(rq.filename))
+            continue
+        unique_requests[key] = rq
+        searches[key] = search_cache.get(key) if cacheable(key) else None
+        if searches[key] is not None:
+            ncached += 1
+    pending = [key for key in unique_requests if searches[key] is None]
+
+    def _search(search_keys):
+        found = _thread_map(calibration_search, [unique_requests[key]
+                                                 for key in search_keys],
+                            workers)
+        for key, (calurl, calmd5) in zip(search_keys, found):
+            searches[key] = (calurl, calmd5)
+            if calurl is not None and cacheable(key):
+                search_cache.put(key, calurl, calmd5)
+
+    _search(pending)
+
+    # Fetch every calibration that was found, once
+    session = _http_session(workers)
+    def _fetch(dl):
+        try:
+            return _fetch_calibration(*dl, session=session)
+        except ChecksumError as err:
+            log.warning(str(err))
+            return err
+
+    def _fetch_all(fetch_keys):
+        downloads = []
+        for key in fetch_keys:
+            calurl, calmd5 = searches[key]
+            if calurl is not None and calurl not in [dl[0] for dl in downloads]:
+                downloads.append((calurl, calmd5,
+                                  unique_requests[key].caltype))
+        paths = _thread_map(_fetch, downloads, workers)
+        return dict(zip([dl[0] for dl in downloads], paths))
+
+    for rq, key in zip(cal_requests, keys):
+        calurl, calmd5 = searches[key]
         if calurl is None:
             log.error("START CALIBRATION SERVICE REPORT\n")
             log.error(calmd5)
             log.error("END CALIBRATION SERVICE REPORT\n")
             warn = "No {} calibration file found for {}"
             log.warning(warn.format(rq.caltype, rq.filename))
-            #_add_cal_record(rq, calname)
-            continue
-
-        log.info("Found calibration (url): {}".format(calurl))
-        components = urlparse(calurl)
-        calname = basename(components.path)
-        cachename, cachedir = _check_cache(calname, rq.caltype)
-        if cachename:
-            cached_md5 = generate_md5_digest(cachename)
-            if cached_md5 == calmd5:
-                log.stdinfo("Cached calibration {} matched.".format(cachename))
-                _add_cal_record(rq, cachename)
-            else:
-                log.stdinfo("File {} is cached but".format(calname))
-                log.stdinfo("md5 checksums DO NOT MATCH")
-                log.stdinfo("Making request on calibration service")
-                log.stdinfo("Requesting URL {}".format(calurl))
-                try:
-                    calname = get_request(calurl, cachename)
-                    _add_cal_record(rq, cachename)
-                except GetterError as err:
-                    for message in err.messages:
-                        log.error(message)
-            continue
-
-        log.status("Making request for {}".format(calurl))
-        fname = split(calurl)[1]
-        calname = join(cachedir, fname)
-        try:
-            calname = get_request(calurl, calname)
-        except GetterError as err:
-            for message in err.messages:
-                log.error(message)
         else:
-            # hash compare
-            download_mdf5 = generate_md5_digest(calname)
-            if download_mdf5 == calmd5:
-                log.status("MD5 hash match. Download OK.")
-                _add_cal_record(rq, calname)
-            else:
-                err = "MD5 hash of downloaded file does not match expected hash {}"
-                raise IOError(err.format(calmd5))
-
+            log.info("Found calibration (url): {}".format(calurl))
+    calfiles = _fetch_all(list(unique_requests))
+
+    # A checksum mismatch means the calibration has changed since it was
+    # found (eg. reprocessed), so forget that result and search again
+    stale = [key for key in unique_requests if
+             isinstance(calfiles.get(searches[key][0]), ChecksumError)]
+    if stale:
+        log.stdinfo("Searching again for {} calibration(s) that have "
+                    "changed".format(len(stale)))
+        for key in stale:
+            if cacheable(key):
+                search_cache.delete(key)
+        _search(stale)
+        calfiles.update(_fetch_all(stale))
+        for key in stale:
+            calurl = searches[key][0]
+            if isinstance(calfiles.get(calurl), ChecksumError):
+                log.error("Could not retrieve calibration {}".format(calurl))
+                calfiles[calurl] = None
+
+    for rq, key in zip(cal_requests, keys):
+        calfile = calfiles.get(searches[key][0])
+        if calfile is not None:
+            _add_cal_record(rq, calfile)
+
+    stats = CacheStats(len(cal_requests), len(pending), ncached, nduplicates)
+    log.stdinfo("Calibration requests: {s.requests}; searches sent: "
+                "{s.searches}, found in cache: {s.cached}, duplicates: "
+                "{s.duplicates}".format(s=stats))
+    if search_cache is not None:
+        search_cache.expire()
+        search_cache.close()
     return calibration_records
@@ -6,15 +6,19 @@ from requests.exceptions import ConnectionError
 
 from gempy.utils import logutils
 
+# Size of the blocks handed out by the getters
+CHUNK_SIZE = 65536
+
 class GetterError(Exception):
     def __init__(self, messages):
         self.messages = messages
 
-def requests_getter(url):
-    r = requests.get(url, timeout=10.0)
+def requests_getter(url, session=None):
+    # Streamed, so that the file is never held in memory as a whole
     try:
+        r = (session or requests).get(url, timeout=10.0, stream=True)
         r.raise_for_status()
-        for chunk in r.iter_content(chunk_size=128):
+        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
             yield chunk
     except HTTPError as err:
         raise GetterError(["Could not retrieve {}".format(url), str(err)])
@@ -23,12 +27,12 @@ def requests_getter(url):
     except Timeout as terr:
         raise GetterError(["Request timed out", str(terr)])
 
-def plain_file_getter(url):
+def plain_file_getter(url, session=None):
     path = url.split('://', 1)[1]
     try:
-        with open(path) as source:
+        with open(path, 'rb') as source:
             while True:
-                data = source.read(128)
+                data = source.read(CHUNK_SIZE)
                 if not data:
                     break
                 yield data
@@ -42,6 +46,11 @@ schema_mapper = {
     'file': plain_file_getter
     }
 
-def get_file_iterator(url):
+def get_file_iterator(url, session=None):
+    """
+    Returns an iterator over the contents of `url`, in blocks of bytes.
+    HTTP(S) and FTP requests go through the requests `session`, if given,
+    to reuse its connection pool.
+    """
     getter = schema_mapper[url.split('://', 1)[0]]
-    return getter(url)
+    return getter(url, session=session)
@@ -1,11 +1,18 @@
 from builtins import object
 import os
 from os.path import abspath, basename, dirname, isdir
+import time
+import hashlib
 import warnings
-from collections import namedtuple
+import multiprocessing
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 import sys
 
+from sqlalchemy import create_engine
 from sqlalchemy.exc import SAWarning, OperationalError
+from sqlalchemy.pool import SingletonThreadPool
 from gemini_calmgr import fits_storage_config as fsc
 from gemini_calmgr import gemini_metadata_utils as gmu
 from gemini_calmgr import orm
@@ -48,12 +55,96 @@ args_for_cals = {
 
 DEFAULT_DB_NAME = 'cal_manager.db'
 
+# Files ingested per transaction by ingest_files()
+DEFAULT_BATCH_SIZE = 100
+
+# Search results remembered by each LocalManager
+SEARCH_CACHE_SIZE = 256
+
+# Indexes for the columns that the calibration rules filter and sort on, as
+# {table: [(column, ...), ...]}. Those referring to columns missing from the
+# gemini_calmgr schema in use are skipped. In addition, the header_id column
+# of every table that has one (the instrument specific tables) is indexed.
+CALIBRATION_INDEXES = {
+    'header': [('instrument', 'observation_type', 'ut_datetime'),
+               ('instrument', 'observation_type', 'detector_binning',
+                'filter_name'),
+               ('diskfile_id',),
+               ('data_label',)],
+    'diskfile': [('file_id',),
+                 ('canonical', 'present'),
+                 ('filename',)],
+}
+
+# The LocalManager of each database, see get_manager()
+_managers = {}
+# Database the gemini_calmgr modules are set up for
+_active_db = None
+
 ERROR_CANT_WIPE = 0
 ERROR_CANT_CREATE = 1
 ERROR_CANT_READ = 2
 ERROR_DIDNT_FIND = 3
 
 FileData = namedtuple('FileData', 'name path')
+IngestStats = namedtuple('IngestStats', 'files ingested skipped failed seconds')
+
+def _same_mtime(lastmod, st):
+    """Does the modification time recorded for a file match its stat()?"""
+    return abs((datetime.fromtimestamp(st.st_mtime) -
+                lastmod).total_seconds()) < 1
+
+def _md5sum(path, blocksize=1 << 20):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fd:
+        for block in iter(lambda: fd.read(blocksize), b''):
+            md5.update(block)
+    return path, md5.hexdigest()
+
+def _read_file(path):
+    """
+    Does the reading that ingesting a file involves, in a worker process:
+    parses its headers and computes its MD5 sum. The file is then in the
+    page cache when ingest_file() opens it. Returns the path, the MD5 sum
+    (None if the file can't be read) and the error opening it, if any.
+    """
+    # Outside the try: a broken installation is not a problem of the file
+    import astrodata
+    import gemini_instruments
+
+    error = md5 = None
+    try:
+        astrodata.open(path, headers_only=True)
+    except Exception as err:
+        error = "{}: {}".format(err.__class__.__name__, err)
+    try:
+        md5 = _md5sum(path)[1]
+    except (IOError, OSError) as err:
+        error = error or str(err)
+    return path, md5, error
+
+def get_manager(db_path):
+    """Returns the LocalManager for the database at `db_path` (a file or
+    its directory), creating it the first time only. Reusing it avoids the
+    reloading of gemini_calmgr, and keeps its session, connection and
+    search results."""
+    if isdir(db_path):
+        db_path = os.path.join(db_path, DEFAULT_DB_NAME)
+    db_path = abspath(db_path)
+    try:
+        manager = _managers[db_path]
+    except KeyError:
+        return _managers.setdefault(db_path, LocalManager(db_path))
+    # Another manager may have set up gemini_calmgr since
+    manager._activate()
+    return manager
+
+def fits_files(path, walk=False):
+    for root, dirs, files in os.walk(path):
+        for fname in sorted(l for l in files if l.endswith('.fits')):
+            yield os.path.join(root, fname)
+        if not walk:
+            break
 
 class LocalManagerError(Exception):
     def __init__(self, error_type, *args, **kw):
@@ -67,6 +158,9 @@ class LocalManager(object):
         else:
             self._db_path = db_path
         self.session = None
+        self._searches = OrderedDict()
+        self._data_version = None
+        self._indexed = False
         self._reset()
 
     @property
@@ -75,10 +169,30 @@ class LocalManager(object):
 
     def _reset(self):
         """Modifies the gemini_calmgr setup and reloads some modules that
-        are affected by the change. Then it sets a new database session object
-        for this instance.
+        are affected by the change, unless they are already set up for this
+        database. Then it sets a new database session object for this
+        instance.
         """
-
+        self._activate()
+
+        # Keep a connection open (one per thread) instead of opening the
+        # database file for every transaction, so that SQLite can reuse its
+        # page cache and prepared statements across searches.
+        engine = create_engine(fsc.fits_database,
+                               poolclass=SingletonThreadPool)
+        self.session = orm.sessionfactory(bind=engine)
+        self._searches.clear()
+        self._data_version = None
+
+    def _activate(self):
+        """Sets up gemini_calmgr for this database, unless it already is."""
+        global _active_db
+
+        if _active_db != abspath(self._db_path):
+            self._setup_calmgr()
+            _active_db = abspath(self._db_path)
+
+    def _setup_calmgr(self):
         fsc.storage_root = abspath(dirname(self._db_path))
         fsc.fits_dbname = basename(self._db_path)
         fsc.db_path = self._db_path
@@ -95,8 +209,6 @@ class LocalManager(object):
         reload(createtables)
         reload(ingest)
 
-        self.session = orm.sessionfactory()
-
     def init_database(self, wipe=True):
         """Initializes a SQLite database with the tables required for the
         calibration manager.
@@ -128,6 +240,7 @@ class LocalManager(object):
         try:
             createtables.create_tables(self.session)
             self.session.commit()
+            self.create_indexes()
         except OperationalError:
             message = "There was an error when trying to create the database. Please, check your path and permissions."
             raise LocalManagerError(ERROR_CANT_CREATE, message)
@@ -153,6 +266,42 @@ class LocalManager(object):
             for obj in reversed(objects_to_delete):
                 self.session.delete(obj)
             self.session.commit()
+            self._searches.clear()
+
+    def _calibration_indexes(self):
+        """Maps the names of the indexes used by the calibration searches
+        to the statements creating them."""
+        tables = header.Header.metadata.tables
+        statements = OrderedDict()
+        for name, table in sorted(tables.items()):
+            columns = set(table.columns.keys())
+            indexes = [ix for ix in CALIBRATION_INDEXES.get(name, [])
+                       if columns.issuperset(ix)]
+            if 'header_id' in columns and name != 'header':
+                indexes.append(('header_id',))
+            for ix in indexes:
+                index = "ix_{}_{}".format(name, '_'.join(ix))
+                statements[index] = \
+                    "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        index, name, ', '.join(ix))
+        return statements
+
+    def _missing_indexes(self):
+        """Names of the calibration indexes the database doesn't have."""
+        existing = set(row[0] for row in self.session.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"))
+        return [index for index in self._calibration_indexes()
+                if index not in existing]
+
+    def create_indexes(self):
+        """Creates (if needed) the indexes used by the calibration
+        searches, and updates the statistics the SQLite query planner uses
+        to choose them."""
+        for stmt in self._calibration_indexes().values():
+            self.session.execute(stmt)
+        self.session.execute('ANALYZE')
+        self.session.commit()
+        self._indexed = True
 
     def ingest_file(self, path):
         """Registers a file into the database
@@ -171,8 +320,165 @@ class LocalManager(object):
             self.session.rollback()
             self.remove_file(path)
             raise err
+        finally:
+            self._searches.clear()
+
+    def ingest_files(self, paths, jobs=None, batch_size=DEFAULT_BATCH_SIZE,
+                     log=None):
+        """Registers many files into the database, skipping those that
+        are already there, unchanged.
+
+        A file is unchanged if there is a record for it (same name and
+        directory) with the same size and modification time or, if only
+        the latter differs, with the same MD5 sum.
+
+        The files are ingested `batch_size` at a time, each batch in a
+        single transaction, with the database in WAL mode. If a file in a
+        batch fails, the batch is rolled back and its files ingested one by
+        one, so that only the faulty ones are left out.
+
+        With more than one job, a pool of processes reads the files ahead
+        of the ingestion: while a batch is being ingested, the workers
+        parse the headers of the files of the next one and compute their
+        MD5 sums. ingest_file() then finds the files in the page cache, the
+        files that can't be opened are ingested on their own rather than
+        failing a batch, and the sums are used to check for changes and
+        verify the ingestion.
 
-    def ingest_directory(self, path, walk=False, log=None):
+        Parameters
+        ----------
+        paths: iterable of strings
+            Paths to the files. They can be either absolute or relative
+        jobs: int, optional
+            Number of processes reading the files. Defaults to the number
+            of CPUs. With 1, the files are only read by the ingestion (and
+            for the MD5 sums of the recorded files whose modification time
+            has changed).
+        batch_size: int, optional
+            Number of files per transaction
+        log: function, optional
+            As in `ingest_directory`
+
+        Returns
+        -------
+        IngestStats
+            Number of files considered, ingested, skipped (unchanged) and
+            failed, and the time taken, in seconds.
+        """
+        start = time.time()
+        paths = [abspath(path) for path in paths]
+        known = self._known_files()
+        # New files, and those that may have changed
+        to_read = []
+        for path in paths:
+            record = known.get((dirname(path), basename(path)))
+            if record is not None:
+                size, lastmod, md5 = record
+                st = os.stat(path)
+                if (st.st_size == size and lastmod is not None and
+                        _same_mtime(lastmod, st)):
+                    continue
+            to_read.append(path)
+        skipped = len(paths) - len(to_read)
+
+        self._enable_wal()
+        self._searches.clear()
+        ingested = failed = 0
+        batch_size = max(batch_size, 1)
+        batches = [to_read[i:i + batch_size]
+                   for i in range(0, len(to_read), batch_size)]
+        jobs = jobs or multiprocessing.cpu_count()
+        pool = None
+        if jobs > 1 and len(to_read) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(to_read)))
+            reading = pool.map_async(_read_file, batches[0], chunksize=1)
+        try:
+            for n, batch in enumerate(batches):
+                errors = {}
+                if pool is not None:
+                    results = reading.get()
+                    if n + 1 < len(batches):
+                        reading = pool.map_async(_read_file, batches[n + 1],
+                                                 chunksize=1)
+                    sums = dict((path, md5) for path, md5, _ in results)
+                    errors = dict((path, error) for path, _, error in results
+                                  if error is not None)
+                else:
+                    sums = dict(_md5sum(path) for path in batch
+                                if (dirname(path), basename(path)) in known)
+
+                to_ingest = []
+                # Likely to fail, so not worth risking the batch for
+                alone = []
+                for path in batch:
+                    record = known.get((dirname(path), basename(path)))
+                    if (record is not None and sums.get(path) is not None
+                            and sums[path] == record[2]):
+                        skipped += 1
+                    else:
+                        (alone if path in errors else to_ingest).append(path)
+                if to_ingest:
+                    done = self._ingest_batch(to_ingest, sums, log)
+                    ingested += done
+                    failed += len(to_ingest) - done
+                for path in alone:
+                    if self._ingest_one(path, sums, log):
+                        ingested += 1
+                    else:
+                        failed += 1
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        if ingested:
+            self.create_indexes()
+        return IngestStats(len(paths), ingested, skipped, failed,
+                           time.time() - start)
+
+    def _ingest_batch(self, paths, sums, log=None):
+        """Ingests files in a single transaction (see ingest_files), and
+        returns the number of files ingested. `sums` maps some of the
+        paths to their MD5 sums."""
+        try:
+            with self._batch_transaction():
+                for path in paths:
+                    ingest.ingest_file(self.session, basename(path),
+                                       dirname(path))
+        except Exception:
+            retry = set(paths)
+        else:
+            # Only report the files that actually made it
+            retry = set(self._not_ingested(paths, sums))
+
+        ingested = 0
+        for path in paths:
+            if path not in retry:
+                ingested += 1
+                if log:
+                    log("Ingested {}".format(path))
+            elif self._ingest_one(path, sums, log):
+                ingested += 1
+        return ingested
+
+    def _ingest_one(self, path, sums, log=None):
+        """Ingests a file in its own transaction, and checks that it made
+        it into the database. Returns whether it did."""
+        try:
+            self.ingest_file(path)
+            if self._not_ingested([path], sums):
+                raise LocalManagerError(ERROR_DIDNT_FIND, "not in the "
+                                        "database after ingestion")
+        except Exception as err:
+            if log:
+                log("Could not ingest {}: {}".format(path, err))
+            return False
+        if log:
+            log("Ingested {}".format(path))
+        return True
+
+    def ingest_directory(self, path, walk=False, log=None, jobs=None,
+                         batch_size=DEFAULT_BATCH_SIZE):
         """Registers into the database all FITS files under a directory
 
         Parameters
@@ -190,13 +496,81 @@ class LocalManager(object):
             If provided, it must be a function that accepts a single argument,
             a message string. This function can then process the message
             and log it into the proper place.
+        jobs, batch_size: int, optional
+            As in `ingest_files`
+
+        Returns
+        -------
+        IngestStats
+            As returned by `ingest_files`
         """
 
-        for root, dirs, files in os.walk(path):
-            for fname in [l for l in files if l.endswith('.fits')]:
-                self.ingest_file(os.path.join(root, fname))
-                if log:
-                    log("Ingested {}/{}".format(root, fname))
+        return self.ingest_files(fits_files(path, walk=walk), jobs=jobs,
+                                 batch_size=batch_size, log=log)
+
+    def _known_files(self, names=None):
+        """Maps (directory, name) of the files present in the database (only
+        those with the given names, if any) to their (size, modification
+        time, MD5 sum)."""
+        DiskFile = diskfile.DiskFile
+        query = self.session.query(DiskFile.path, DiskFile.filename,
+                                   DiskFile.file_size, DiskFile.lastmod,
+                                   DiskFile.file_md5)
+        query = query.filter(DiskFile.present == True)
+        if names is not None:
+            query = query.filter(DiskFile.filename.in_(sorted(names)))
+        return dict(((os.path.normpath(os.path.join(fsc.storage_root,
+                                                    res[0])), res[1]),
+                     tuple(res[2:])) for res in query)
+
+    def _not_ingested(self, paths, sums=None):
+        """Returns those of `paths` that the database doesn't have as
+        present, with their current size and modification time, and MD5
+        sum if given in `sums`."""
+        sums = sums or {}
+        known = self._known_files(set(basename(path) for path in paths))
+        missing = []
+        for path in paths:
+            record = known.get((dirname(path), basename(path)))
+            st = os.stat(path)
+            if (record is None or record[0] != st.st_size or
+                    (record[1] is not None and not _same_mtime(record[1], st))
+                    or sums.get(path) not in (None, record[2])):
+                missing.append(path)
+        return missing
+
+    def _enable_wal(self):
+        # Readers (eg. running reductions) don't block the writer, and
+        # commits are cheaper. The setting is kept in the database file.
+        self.session.execute('PRAGMA journal_mode=WAL')
+        self.session.commit()
+
+    @contextmanager
+    def _batch_transaction(self):
+        """Turns the commits made by gemini_calmgr's ingest into flushes,
+        and commits once at the end of the block (or rolls back, on
+        error). A rollback made by the ingest would also undo the files
+        flushed before, so it raises instead, and fails the block even if
+        the ingest catches that."""
+        session = self.session
+        rollbacks = []
+        def rollback():
+            rollbacks.append(True)
+            raise LocalManagerError(ERROR_CANT_CREATE, "Ingestion rolled "
+                                    "back in the middle of a batch")
+
+        session.commit, session.rollback = session.flush, rollback
+        try:
+            try:
+                yield
+                if rollbacks:
+                    rollback()
+            finally:
+                del session.commit, session.rollback
+        except Exception:
+            session.rollback()
+            raise
+        session.commit()
 
     def calibration_search(self, rq, fullResult=False):
         """Performs a search in the database using the requested criteria.
@@ -221,11 +595,57 @@ class LocalManager(object):
 
             When an error occurs, the first element in the tuple will be
             `None`, and the second a string describing the error.
+
+        Successful results are remembered (up to SEARCH_CACHE_SIZE of them)
+        until the database is modified, through this manager or by any other
+        connection to it (eg. 'reduce_db add' running in another process).
         """
-        from datetime import datetime
+        self._check_data_version()
+        key = repr((rq.caltype, sorted(rq.tags),
+                    sorted(rq.descriptors.items())))
+        try:
+            self._searches[key] = result = self._searches.pop(key)
+            return result
+        except KeyError:
+            pass
+
+        if not self._indexed:
+            # Databases created before the indexes were introduced get them
+            # (and their statistics) once. The others are left untouched.
+            try:
+                if self._missing_indexes():
+                    self.create_indexes()
+            except OperationalError:
+                # Read-only database, or not initialized yet
+                self.session.rollback()
+            self._indexed = True
+
+        result = self._calibration_search(rq)
+        if result[0] is not None:
+            self._searches[key] = result
+            if len(self._searches) > SEARCH_CACHE_SIZE:
+                self._searches.popitem(last=False)
+        return result
+
+    def _check_data_version(self):
+        """Forgets the remembered searches if another connection committed
+        changes to the database since the last check. SQLite's data_version
+        doesn't change with the commits of our own connection: those clear
+        the searches when they are made."""
+        try:
+            version = self.session.execute('PRAGMA data_version').scalar()
+        except OperationalError:
+            self.session.rollback()
+            version = None
+        # Without a version (SQLite < 3.8.4), nothing can be trusted
+        if version is None or version != self._data_version:
+            self._searches.clear()
+        self._data_version = version
 
+    def _calibration_search(self, rq):
         caltype = rq.caltype
-        descripts = rq.descriptors
+        # A copy: the request may be searched for again
+        descripts = dict(rq.descriptors)
         types = rq.tags
 
         if "ut_datetime" in descripts:
@@ -0,0 +1,189 @@
+#
+#                                                                search_cache.py
+# ------------------------------------------------------------------------------
+"""
+Persistent cache of calibration search results.
+
+A night of frames taken with the same configuration sends the calibration
+manager the same search again and again. Each CalibrationRequest is reduced
+to a fingerprint: the search backend, the caltype, the tags, and the values
+of the descriptors that the calibration rules for that caltype use (see
+CALIBRATION_DESCRIPTORS). Requests with the same fingerprint get the same
+calibration:
+
+    - within one call to process_cal_requests(), only the first one is
+      searched for;
+    - the matches found in the archive are kept in a SQLite file in the
+      reduce cache, for `ttl` seconds, and shared by all the reduce
+      processes running in that directory.
+
+The rules pick the calibration closest in time to each frame, so
+ut_datetime is part of the fingerprint, exactly: frames taken at different
+times are searched for separately. Setting
+'search_time_tolerance' in [calibs] to a number of seconds opts into
+sharing the search between frames taken within the same window of that
+length, at the cost of possibly getting a calibration that is not the
+closest to each of them.
+
+Requests for caltypes not listed in CALIBRATION_DESCRIPTORS have no
+fingerprint, and are always searched for. Failed searches are not cached,
+so that a calibration added to the archive is found on the next try.
+
+Searches of the local calibration database are not kept on disk: the local
+manager caches them itself, and forgets them when files are ingested or
+removed.
+
+"""
+import time
+import sqlite3
+import hashlib
+import calendar
+import datetime
+
+from collections import namedtuple
+# ------------------------------------------------------------------------------
+# The lists below come from the calibration rules of the calibration manager
+# (FitsStorage's fits_storage/cal/calibration*.py, shipped for the local
+# database as gemini_calmgr/cal/): the descriptors that the Calibration
+# class of each instrument reads from the request (`self.descriptors[...]`,
+# or the Header/instrument table columns passed to match_descriptors()),
+# for every caltype. Each list is the union over all the instruments, so a
+# rule of one instrument may give a descriptor that another one ignores.
+# The attributes the rules derive from the tags (spectroscopy,
+# nodandshuffle, prepared, overscan_*) are covered by the tags themselves.
+#
+# Leaving out a descriptor that a rule uses would make different requests
+# share a result, so the lists err on the side of including too much, and
+# must be extended along with the rules. test_search_cache checks them
+# against gemini_calmgr, when it is installed.
+#
+# Descriptors of the detector setup and the data taken, matched by every
+# rule (GMOS: binning, gain, read speed, ROI and amps; NIRI/GNIRS/F2/GSAOI/
+# NIFS: read mode, well depth, coadds and the array subsection). The rules
+# pick the calibration closest to ut_datetime.
+_CONFIGURATION = (
+    'amp_read_area', 'array_section', 'camera', 'coadds', 'data_section',
+    'detector_name', 'detector_roi_setting', 'detector_x_bin',
+    'detector_y_bin', 'gain_setting', 'instrument', 'observation_class',
+    'observation_type', 'read_mode', 'read_speed_setting', 'ut_datetime',
+    'well_depth_setting',
+)
+
+# Darks also match the exposure time and, for GMOS nod-and-shuffle, the
+# nod count and shuffle distance
+_DARK = ('exposure_time', 'nod_count', 'nod_pixels')
+
+# Descriptors of the optical path, matched by the rules of the arcs, flats,
+# fringe frames, MDFs and standards (GMOS: filter, grating, mask and central
+# wavelength; NIRI/F2: the Lyot stop or pupil mask; GNIRS: the decker)
+_OPTICS = (
+    'central_wavelength', 'decker', 'disperser', 'filter_name',
+    'focal_plane_mask', 'lyot_stop', 'pupil_mask',
+)
+
+# Standards are also matched on their position in the sky. The archive
+# rules use the header RA/Dec, the local ones the WCS.
+_SKY = ('dec', 'ra', 'wcs_dec', 'wcs_ra')
+
+# Descriptors used by the calibration rules of each caltype
+CALIBRATION_DESCRIPTORS = {
+    'bias': _CONFIGURATION,
+    'processed_bias': _CONFIGURATION,
+    'dark': _CONFIGURATION + _DARK,
+    'processed_dark': _CONFIGURATION + _DARK,
+    'arc': _CONFIGURATION + _OPTICS,
+    'processed_arc': _CONFIGURATION + _OPTICS,
+    'flat': _CONFIGURATION + _OPTICS,
+    'domeflat': _CONFIGURATION + _OPTICS,
+    'lampoff_flat': _CONFIGURATION + _OPTICS,
+    'lampoff_domeflat': _CONFIGURATION + _OPTICS,
+    'qh_flat': _CONFIGURATION + _OPTICS,
+    'processed_flat': _CONFIGURATION + _OPTICS,
+    'processed_fringe': _CONFIGURATION + _OPTICS,
+    'mask': _CONFIGURATION + _OPTICS,
+    'specphot': _CONFIGURATION + _OPTICS + _SKY,
+    'photometric_standard': _CONFIGURATION + _OPTICS + _SKY,
+    'telluric_standard': _CONFIGURATION + _OPTICS + _SKY,
+}
+
+DEFAULT_TTL = 3600
+
+CacheStats = namedtuple('CacheStats', 'requests searches cached duplicates')
+# ------------------------------------------------------------------------------
+def _quantize(value, time_tolerance):
+    if time_tolerance and isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) // time_tolerance
+    return value
+
+def fingerprint(rq, backend='', time_tolerance=0):
+    """
+    Returns the fingerprint of a calibration request.
+
+    Parameters
+    ----------
+    rq : <CalibrationRequest>
+        With its descriptors already evaluated.
+
+    backend : <str>
+        Identifies the calibration manager (URL or local database), so that
+        results from different sources are not mixed.
+
+    time_tolerance : <int>
+        If not 0, ut_datetime is put into bins of this many seconds, rather
+        than being matched exactly.
+
+    Returns
+    -------
+    <str> : hexadecimal digest, or None if the caltype has no list of
+            descriptors in CALIBRATION_DESCRIPTORS
+
+    """
+    names = CALIBRATION_DESCRIPTORS.get(rq.caltype)
+    if names is None:
+        return None
+    values = rq.descriptors or {}
+    descriptors = [(name, _quantize(values.get(name), time_tolerance))
+                   for name in sorted(names)]
+    key = repr((backend, rq.caltype, sorted(rq.tags), descriptors))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class CalSearchCache(object):
+    """
+    The results of calibration searches, (url, md5) tuples, keyed on request
+    fingerprints, and saved in the SQLite database `path`.
+
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("CREATE TABLE IF NOT EXISTS calsearch "
+                         "(fingerprint TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                         "md5 TEXT, created REAL NOT NULL)")
+        self._db.commit()
+
+    def get(self, key):
+        """Returns the (url, md5) cached for `key`, or None."""
+        row = self._db.execute("SELECT url, md5 FROM calsearch WHERE "
+                               "fingerprint = ? AND created > ?",
+                               (key, time.time() - self.ttl)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def put(self, key, url, md5):
+        self._db.execute("INSERT OR REPLACE INTO calsearch VALUES (?, ?, ?, ?)",
+                         (key, url, md5, time.time()))
+        self._db.commit()
+
+    def delete(self, key):
+        """Removes the result cached for `key`."""
+        self._db.execute("DELETE FROM calsearch WHERE fingerprint = ?", (key,))
+        self._db.commit()
+
+    def expire(self):
+        """Removes the results older than the TTL."""
+        self._db.execute("DELETE FROM calsearch WHERE created <= ?",
+                         (time.time() - self.ttl,))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
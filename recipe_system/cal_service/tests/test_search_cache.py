@@ -0,0 +1,250 @@
+# pytest suite
+"""
+Tests for the calibration search fingerprints and CalSearchCache.
+
+To run:
+    1) py.test -v --capture=no
+"""
+import os
+import re
+import datetime
+
+import pytest
+
+from recipe_system.cal_service import search_cache
+from recipe_system.cal_service.search_cache import CalSearchCache
+from recipe_system.cal_service.search_cache import CALIBRATION_DESCRIPTORS
+from recipe_system.cal_service.search_cache import fingerprint
+
+START = datetime.datetime(2017, 9, 13, 5, 0, 0)
+
+class Request(object):
+    """Stand-in for a CalibrationRequest, with its descriptors evaluated"""
+    def __init__(self, caltype='processed_bias', tags=('GMOS', 'IMAGE'),
+                 **descriptors):
+        self.caltype = caltype
+        self.tags = set(tags)
+        self.filename = 'N20170913S0001.fits'
+        self.ad = self
+        self.descriptors = {'instrument': 'GMOS-N', 'detector_x_bin': 2,
+                            'detector_y_bin': 2, 'filter_name': 'r_G0303',
+                            'exposure_time': 30.0, 'gain_setting': 'low',
+                            'read_speed_setting': 'slow',
+                            'observation_class': 'science',
+                            'observation_type': 'OBJECT',
+                            'data_label': 'GN-2017B-Q-1-1-001',
+                            'ut_datetime': START}
+        self.descriptors.update(descriptors)
+
+def night(nframes, interval=10, **kwargs):
+    """Frames of the same configuration, `interval` seconds apart"""
+    return [Request(data_label='GN-2017B-Q-1-1-{:03d}'.format(i),
+                    ut_datetime=START + datetime.timedelta(seconds=i*interval),
+                    **kwargs) for i in range(nframes)]
+
+class TestFingerprint:
+    """
+    Suite of tests for fingerprint().
+    """
+    def test_same_config_same_key(self):
+        assert fingerprint(Request()) == fingerprint(Request())
+        assert len(fingerprint(Request())) == 40
+        # Descriptors that no rule uses don't matter
+        assert fingerprint(Request()) == fingerprint(
+            Request(data_label='GN-2017B-Q-1-1-002', object='M51'))
+
+    def test_config_changes_key(self):
+        for caltype, descriptor, value in (
+                ('processed_bias', 'detector_x_bin', 1),
+                ('processed_bias', 'detector_y_bin', 4),
+                ('processed_bias', 'gain_setting', 'high'),
+                ('processed_flat', 'filter_name', 'g_G0301'),
+                ('processed_dark', 'exposure_time', 60.0),
+                ('processed_bias', 'ut_datetime',
+                 START + datetime.timedelta(seconds=1))):
+            assert fingerprint(Request(caltype)) != \
+                   fingerprint(Request(caltype, **{descriptor: value})), \
+                   (caltype, descriptor)
+
+    def test_caltype_uses_its_descriptors(self):
+        # The exposure time matters for darks, not for biases or flats
+        for caltype, same in (('processed_bias', True),
+                              ('processed_flat', True),
+                              ('processed_dark', False)):
+            assert (fingerprint(Request(caltype)) == fingerprint(
+                Request(caltype, exposure_time=5.0))) == same
+        assert fingerprint(Request('processed_bias')) != \
+               fingerprint(Request('processed_dark'))
+
+    def test_tags_and_backend_change_key(self):
+        assert fingerprint(Request()) != fingerprint(
+            Request(tags=('GMOS', 'IMAGE', 'PREPARED')))
+        assert fingerprint(Request(), 'archive') != \
+               fingerprint(Request(), 'local:/data')
+
+    def test_unknown_caltype(self):
+        assert fingerprint(Request('spectwilight')) is None
+
+    def test_time_tolerance(self):
+        frames = night(3)
+        exact = set(fingerprint(rq) for rq in frames)
+        assert len(exact) == 3
+
+        binned = [fingerprint(rq, time_tolerance=900) for rq in frames]
+        assert len(set(binned)) == 1
+        assert binned[0] not in exact
+        later = Request(ut_datetime=START + datetime.timedelta(seconds=900))
+        assert fingerprint(later, time_tolerance=900) != binned[0]
+
+    def test_night_of_frames(self):
+        # 200 frames, 10s apart, starting on the hour
+        frames = night(200)
+        assert len(set(fingerprint(rq) for rq in frames)) == 200
+        assert len(set(fingerprint(rq, time_tolerance=3600)
+                       for rq in frames)) == 1
+        assert len(set(fingerprint(rq, time_tolerance=900)
+                       for rq in frames)) == 3
+
+    def test_descriptor_lists(self):
+        for caltype, names in CALIBRATION_DESCRIPTORS.items():
+            assert len(set(names)) == len(names), caltype
+            assert set(search_cache._CONFIGURATION).issubset(names), caltype
+            assert ('exposure_time' in names) == caltype.endswith('dark')
+
+    def test_descriptor_lists_match_rules(self):
+        # Every request descriptor the calibration rules read must be in
+        # the list of some caltype
+        cal = pytest.importorskip('gemini_calmgr.cal')
+        from recipe_system.cal_service.localmanager import extra_descript
+        known = set(extra_descript.values())
+        for names in CALIBRATION_DESCRIPTORS.values():
+            known.update(names)
+
+        used = set()
+        caldir = os.path.dirname(cal.__file__)
+        for fname in os.listdir(caldir):
+            if fname.startswith('calibration') and fname.endswith('.py'):
+                with open(os.path.join(caldir, fname)) as fd:
+                    used.update(re.findall(
+                        r"descriptors(?:\[|\.get\()\s*['\"](\w+)['\"]",
+                        fd.read()))
+        assert used, "no descriptors found in the calibration rules"
+        assert not used - known
+
+class TestProcessCalRequests:
+    """
+    Suite of tests for the deduplication and caching of the searches by
+    process_cal_requests().
+    """
+    @pytest.fixture
+    def calrequestlib(self, tmpdir, monkeypatch):
+        from recipe_system.cal_service import calrequestlib
+
+        class CalConf(object):
+            search_time_tolerance = 0
+
+        self.conf = CalConf()
+        self.searched = []
+        self.checksums = {}
+        self.path = str(tmpdir.join('calsearch.db'))
+
+        def calibration_search(rq):
+            self.searched.append(rq.descriptors['data_label'])
+            return ('http://archive/file/N20170913S0500_bias.fits',
+                    'md5-{}'.format(len(self.searched)))
+
+        def fetch_calibration(calurl, calmd5, caltype, session=None):
+            if calmd5 in self.checksums.get(calurl, [calmd5]):
+                return os.path.basename(calurl)
+            raise calrequestlib.ChecksumError("bad MD5 {}".format(calmd5))
+
+        monkeypatch.setattr(calrequestlib, 'calibration_search',
+                            calibration_search)
+        monkeypatch.setattr(calrequestlib, '_fetch_calibration',
+                            fetch_calibration)
+        monkeypatch.setattr(calrequestlib, 'get_calconf', lambda: self.conf)
+        monkeypatch.setattr(calrequestlib, 'is_local', lambda: False)
+        monkeypatch.setattr(calrequestlib, '_search_backend',
+                            lambda: 'archive')
+        monkeypatch.setattr(calrequestlib, '_max_connections', lambda: 1)
+        monkeypatch.setattr(calrequestlib, '_open_search_cache',
+                            lambda: CalSearchCache(self.path))
+        return calrequestlib
+
+    def test_exact_times_not_shared(self, calrequestlib):
+        frames = night(200)
+        records = calrequestlib.process_cal_requests(frames)
+        assert len(self.searched) == 200
+        assert len(records) == 200
+
+    def test_time_tolerance_shares_searches(self, calrequestlib):
+        self.conf.search_time_tolerance = 3600
+        frames = night(200)
+        records = calrequestlib.process_cal_requests(frames)
+        assert len(self.searched) == 1
+        assert set(records.values()) == set(['N20170913S0500_bias.fits'])
+        assert all(rq in records for rq in frames)
+
+        # The next batch of the night finds the result in the cache
+        records = calrequestlib.process_cal_requests(night(5))
+        assert len(self.searched) == 1
+        assert len(records) == 5
+
+    def test_checksum_mismatch_searches_again(self, calrequestlib):
+        self.conf.search_time_tolerance = 3600
+        calrequestlib.process_cal_requests(night(3))
+        assert len(self.searched) == 1
+
+        # The calibration was replaced since: search again, and cache that
+        url = 'http://archive/file/N20170913S0500_bias.fits'
+        self.checksums[url] = ['md5-2']
+        records = calrequestlib.process_cal_requests(night(3))
+        assert len(self.searched) == 2
+        assert len(records) == 3
+        assert CalSearchCache(self.path).get(
+            fingerprint(night(1)[0], 'archive', 3600)) == (url, 'md5-2')
+
+        # It keeps changing: no calibration, and no exception
+        self.checksums[url] = []
+        records = calrequestlib.process_cal_requests(night(3))
+        assert len(self.searched) == 3
+        assert records == {}
+
+class TestCalSearchCache:
+    """
+    Suite of tests for CalSearchCache.
+    """
+    def test_put_get_delete(self, tmpdir):
+        path = str(tmpdir.join('calsearch.db'))
+        cache = CalSearchCache(path)
+        assert cache.get('key') is None
+        cache.put('key', 'http://archive/file/bias.fits', 'abc')
+        assert cache.get('key') == ('http://archive/file/bias.fits', 'abc')
+        cache.put('key', 'http://archive/file/bias2.fits', 'def')
+        assert cache.get('key') == ('http://archive/file/bias2.fits', 'def')
+        cache.close()
+
+        # Shared through the file
+        cache = CalSearchCache(path)
+        assert cache.get('key') == ('http://archive/file/bias2.fits', 'def')
+        cache.delete('key')
+        assert cache.get('key') is None
+        cache.close()
+
+    def test_ttl(self, tmpdir, monkeypatch):
+        now = [1000000.]
+        monkeypatch.setattr(search_cache.time, 'time', lambda: now[0])
+        cache = CalSearchCache(str(tmpdir.join('calsearch.db')), ttl=60)
+        cache.put('old', 'http://archive/file/old.fits', 'abc')
+        now[0] += 30
+        cache.put('new', 'http://archive/file/new.fits', 'def')
+        now[0] += 40
+        assert cache.get('old') is None
+        assert cache.get('new') == ('http://archive/file/new.fits', 'def')
+
+        cache.expire()
+        rows = cache._db.execute("SELECT fingerprint FROM calsearch").fetchall()
+        assert rows == [('new',)]
+        now[0] += 30
+        assert cache.get('new') is None
+        cache.close()
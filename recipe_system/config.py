@@ -243,3 +243,49 @@ class ConfigObject(object):
                 pass
 
 globalConf = ConfigObject()
+
+# ------------------------------------------------------------------------------
+# BEGIN Setting up the parallel section for config files
+#
+# Controls how the primitives spread their per-extension work:
+#
+#     [parallel]
+#     workers = 4         # 1 => run serially
+#     processes = false   # use a pool of processes instead of threads
+PARALLEL_SECTION = 'parallel'
+
+globalConf.update_translation({
+    (PARALLEL_SECTION, 'workers'): int,
+    (PARALLEL_SECTION, 'processes'): bool
+})
+
+globalConf.update_exports({
+    PARALLEL_SECTION: ('workers', 'processes')
+})
+
+def get_parallel_conf():
+    """Returns the number of workers and the type of pool (`True` for
+    processes, `False` for threads) to be used for per-extension work. If
+    there's no `[parallel]` section, or the number of workers is not set, one
+    worker per CPU is used, with a pool of threads.
+    """
+    workers, processes = None, False
+    try:
+        section = globalConf[PARALLEL_SECTION]
+    except KeyError:
+        section = None
+    if section is not None:
+        workers = getattr(section, 'workers', None)
+        processes = getattr(section, 'processes', False)
+        if isinstance(processes, str):
+            processes = processes.lower() in ('1', 'yes', 'true', 'on')
+
+    if workers is None:
+        try:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+
+    return max(int(workers), 1), bool(processes)
+# END Setting up the parallel section for config files
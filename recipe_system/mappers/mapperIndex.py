@@ -0,0 +1,164 @@
+#
+#                                                        mappers.mapperIndex.py
+# ------------------------------------------------------------------------------
+"""
+A persistent index of the tagged recipe libraries and primitive classes in a
+data reduction package.
+
+Finding the best recipe or primitive set for a dataset requires the tags of
+every recipe library and primitive class in the instrument package. Importing
+all those modules on every call to reduce is slow, so the mappers build an
+index the first time, save it under INDEX_DIRECTORY, and afterwards import only
+the module that matched.
+
+An index is a dictionary:
+
+    {'version': INDEX_VERSION,
+     'package': <dotted package name>,
+     'path':    <package directory>,
+     'files':   {<path>: <mtime>, ...},
+     'entries': <list>}
+
+'files' holds the modules (and package directories) the entries were built
+from. If any of them has changed, been removed, or a module has been added to
+one of the directories, the index is rebuilt. 'entries' are built by, and only
+meaningful to, the mapper that owns the index.
+
+    load_index()   -- return the entries of a valid index, building it if needed.
+    source_files() -- the files to watch for a list of modules.
+
+"""
+import os
+import json
+import errno
+import tempfile
+
+from importlib import import_module
+
+from gempy.utils import logutils
+# ------------------------------------------------------------------------------
+INDEX_VERSION = 1
+INDEX_DIRECTORY = '~/.geminidr/mapper_index'
+
+log = logutils.get_logger(__name__)
+# ------------------------------------------------------------------------------
+def source_files(modules):
+    """
+    Returns the files whose modification times decide whether an index built
+    from `modules` is still valid: the modules themselves, and the
+    directories they live in (which change when a module is added).
+
+    Parameters
+    ----------
+    modules : <iterable> of <module>
+
+    Returns
+    -------
+    <set> of <str>
+
+    """
+    files = set()
+    for mod in modules:
+        path = getattr(mod, '__file__', None)
+        if path is None:
+            continue
+        path = os.path.abspath(path)
+        if path.endswith(('.pyc', '.pyo')) and os.path.exists(path[:-1]):
+            path = path[:-1]
+        files.add(path)
+        files.add(os.path.dirname(path))
+    return files
+
+def load_index(dotpackage, kind, builder, rebuild=False):
+    """
+    Returns the index entries of type `kind` for the package `dotpackage`,
+    from the saved index if it is still valid, or else calling `builder`
+    and saving the new index.
+
+    Parameters
+    ----------
+    dotpackage : <str>
+        Dotted name of the instrument package, e.g., 'geminidr.gmos'
+
+    kind : <str>
+        The kind of index, e.g., 'primitives'. Each kind is a separate file.
+
+    builder : <function>
+        Called without arguments, it must return a tuple (entries, files),
+        where 'entries' is JSON serializable, and 'files' are the paths
+        they depend on (see source_files()).
+
+    rebuild : <bool>
+        Ignore any saved index.
+
+    Returns
+    -------
+    <list> : the index entries
+
+    """
+    pkgpath = os.path.dirname(import_module(dotpackage).__file__)
+    index_file = _index_path(dotpackage, kind)
+    if not rebuild:
+        index = _read_index(index_file)
+        if _is_valid(index, dotpackage, pkgpath):
+            return index['entries']
+
+    entries, files = builder()
+    index = {'version': INDEX_VERSION,
+             'package': dotpackage,
+             'path': pkgpath,
+             'files': dict((path, _mtime(path)) for path in files),
+             'entries': entries}
+    _write_index(index_file, index)
+    return entries
+
+# ------------------------------------------------------------------------------
+def _index_path(dotpackage, kind):
+    dirname = os.path.expanduser(INDEX_DIRECTORY)
+    return os.path.join(dirname, "{}.{}.json".format(dotpackage, kind))
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _is_valid(index, dotpackage, pkgpath):
+    if not index:
+        return False
+    if index.get('version') != INDEX_VERSION:
+        return False
+    if index.get('package') != dotpackage or index.get('path') != pkgpath:
+        return False
+    for path, mtime in index['files'].items():
+        if mtime is None or _mtime(path) != mtime:
+            return False
+    return True
+
+def _read_index(index_file):
+    try:
+        with open(index_file) as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return None
+
+def _write_index(index_file, index):
+    """
+    Saves the index through a temporary file, so that concurrent reduce
+    processes never read a partial index. Failing to write it is not an
+    error; the index will just be rebuilt next time.
+    """
+    dirname = os.path.dirname(index_file)
+    try:
+        try:
+            os.makedirs(dirname)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(index, tmp)
+        os.rename(tmpname, index_file)
+    except (IOError, OSError) as err:
+        log.debug("Could not save the mapper index {}: {}".format(index_file,
+                                                                   err))
@@ -8,6 +8,8 @@ from importlib import import_module
 from inspect   import isclass
 
 from .baseMapper import Mapper
+from .mapperIndex import load_index
+from .mapperIndex import source_files
 
 from ..utils.mapper_utils import dotpath
 from ..utils.errors import PrimitivesNotFound
@@ -38,7 +40,9 @@ class PrimitiveMapper(Mapper):
     # Primtive search cascade
     def _retrieve_primitive_set(self):
         """
-        Start of the primitive class search cascade.
+        Start of the primitive class search cascade. The tagsets are read
+        from the package's primitives index, which is rebuilt if the module
+        of the best match no longer provides the class.
 
         Parameters
         ----------
@@ -51,20 +55,56 @@ class PrimitiveMapper(Mapper):
                   that best matched.
 
         """
-        matched_set = (set([]), None)
-        for pclass in self._get_tagged_primitives():
-            if pclass.tagset is None:
-                continue
+        for rebuild in (False, True):
+            entries = load_index(self.dotpackage, 'primitives',
+                                 self._build_primitive_index, rebuild=rebuild)
+            matched_set = (set([]), None)
+            for modname, clsname, tagset in entries:
+                if tagset is None:
+                    continue
 
-            if self.tags.issuperset(pclass.tagset):
-                isect = pclass.tagset
-                l1 = len(isect)
-                l2 = len(matched_set[0])
-                matched_set = (isect, pclass) if l1 > l2 else matched_set
-            else:
-                continue
+                tagset = set(tagset)
+                if self.tags.issuperset(tagset):
+                    l1 = len(tagset)
+                    l2 = len(matched_set[0])
+                    if l1 > l2:
+                        matched_set = (tagset, (modname, clsname))
+                else:
+                    continue
+
+            isect, winner = matched_set
+            if winner is None:
+                return matched_set
+
+            # Only the module of the best match is imported.
+            pclass = getattr(import_module(winner[0]), winner[1], None)
+            if pclass is not None:
+                return isect, pclass
+
+        return set([]), None
+
+    def _build_primitive_index(self):
+        """
+        Builds the primitives index for the package, by importing all of its
+        modules. See mappers.mapperIndex.
+
+        Returns
+        -------
+        <tuple> : (<list>, <set>)
+                  The entries [module, class name, tagset], in search order,
+                  and the source files they were built from.
+
+        """
+        entries = []
+        modules = [sys.modules.get(self.dotpackage)]
+        for pclass in self._get_tagged_primitives():
+            tagset = sorted(pclass.tagset) if pclass.tagset is not None else None
+            entries.append([pclass.__module__, pclass.__name__, tagset])
+            # The tagset can be inherited from classes in other modules
+            modules.extend(sys.modules.get(klass.__module__)
+                           for klass in pclass.__mro__)
 
-        return matched_set
+        return entries, source_files(mod for mod in modules if mod is not None)
 
     def _get_tagged_primitives(self):
         loaded_pkg = import_module(self.dotpackage)
@@ -1,11 +1,14 @@
 #
 #                                                        mappers.recipeMapper.py
 # ------------------------------------------------------------------------------
+import sys
 import pkgutil
 
 from importlib import import_module
 
 from .baseMapper import Mapper
+from .mapperIndex import load_index
+from .mapperIndex import source_files
 
 from ..utils.errors import ModeError
 from ..utils.errors import RecipeNotFound
@@ -53,25 +56,93 @@ class RecipeMapper(Mapper):
                   that best matched.
 
         """
-        matched_set = (set([]), None)
-        for rlib in self._get_tagged_recipes():
-            if hasattr(rlib, 'recipe_tags'):
-                if self.tags.issuperset(rlib.recipe_tags):
-                    isect = rlib.recipe_tags
-                    l1 = len(isect)
-                    l2 = len(matched_set[0])
-                    matched_set = (isect, rlib) if l1 > l2 else matched_set
+        for rebuild in (False, True):
+            entries = load_index(self.dotpackage, 'recipes',
+                                 self._build_recipe_index, rebuild=rebuild)
+            matched_set = (set([]), None)
+            for modname, recipe_tags, recipes in self._mode_entries(entries):
+                if recipe_tags is not None:
+                    recipe_tags = set(recipe_tags)
+                    if self.tags.issuperset(recipe_tags):
+                        l1 = len(recipe_tags)
+                        l2 = len(matched_set[0])
+                        if l1 > l2:
+                            matched_set = (recipe_tags, (modname, recipes))
+                    else:
+                        continue
                 else:
                     continue
-            else:
+
+            isection, rlib = matched_set
+            if rlib is None or self.recipename not in rlib[1]:
+                return isection, None
+
+            # Only the recipe library that matched is imported.
+            try:
+                return isection, getattr(import_module(rlib[0]), self.recipename)
+            except (ImportError, AttributeError):
+                continue
+
+        return set([]), None
+
+    def _mode_entries(self, entries):
+        """
+        Returns the index entries for the recipe mode package that matches
+        the requested mode.
+
+        """
+        for mode_pkg, libs in entries:
+            if mode_pkg in self.mode:
+                return libs
+
+        cerr = "No recipe mode package matched '{}'"
+        raise ModeError(cerr.format(self.mode))
+
+    def _build_recipe_index(self):
+        """
+        Builds the recipes index for the package, by importing the recipe
+        libraries of every mode. See mappers.mapperIndex.
+
+        Returns
+        -------
+        <tuple> : (<list>, <set>)
+                  The entries [mode, [[module, recipe_tags, recipe names],
+                  ...]], in search order, and the source files they were
+                  built from.
+
+        """
+        entries = []
+        modules = [sys.modules.get(self.dotpackage)]
+        loaded_pkg = import_module(self.dotpackage)
+        pkg_importer = pkgutil.ImpImporter(loaded_pkg.__path__[0])
+        for pkgname, ispkg in pkg_importer.iter_modules():
+            if ispkg and pkgname == RECIPEMARKER:
+                break
+        else:
+            return entries, source_files(modules)
+
+        recipe_pkg = import_module(dotpath(self.dotpackage, pkgname))
+        modules.append(recipe_pkg)
+        pkg_importer = pkgutil.ImpImporter(recipe_pkg.__path__[0])
+        for mode_pkg, ispkg in pkg_importer.iter_modules():
+            if not ispkg:
                 continue
 
-        isection, rlib = matched_set
-        try:
-            recipe_actual = getattr(rlib, self.recipename)
-        except AttributeError:
-            recipe_actual = None
-        return isection, recipe_actual
+            mode_lib = import_module(dotpath(recipe_pkg.__name__, mode_pkg))
+            modules.append(mode_lib)
+            libs = []
+            for mod, ispkg in self._generate_mode_libs(mode_lib):
+                rlib = import_module(dotpath(mode_lib.__name__, mod))
+                modules.append(rlib)
+                recipe_tags = getattr(rlib, 'recipe_tags', None)
+                if recipe_tags is not None:
+                    recipe_tags = sorted(recipe_tags)
+                recipes = [name for name in dir(rlib) if not name.startswith('_')
+                           and callable(getattr(rlib, name))]
+                libs.append([rlib.__name__, recipe_tags, recipes])
+            entries.append([mode_pkg, libs])
+
+        return entries, source_files(modules)
 
     def _get_tagged_recipes(self):
         loaded_pkg = import_module(self.dotpackage)
@@ -0,0 +1,315 @@
+#
+#                                                                 batchReduce.py
+# ------------------------------------------------------------------------------
+# the BatchReduce class. Used by the reduce, v2.0 cli, in batch mode.
+
+# ------------------------------------------------------------------------------
+from builtins import str
+from builtins import object
+# ------------------------------------------------------------------------------
+_version = '2.0.0 (beta)'
+# ------------------------------------------------------------------------------
+"""
+class BatchReduce {} provides one (1) public method:
+
+    runr()
+
+which runs many independent reductions, listed in a manifest file, in a pool
+of worker processes.
+
+Each non-blank line of the manifest holds the arguments of one reduce job,
+exactly as they would be given on the command line:
+
+    # Twilight flats and science, one job per line
+    N20170913S0153.fits N20170913S0154.fits -r makeProcessedFlat
+    N20170913S0200.fits -p stackFrames:reject_method=minmax
+    N20170913S0201.fits --suffix _red
+
+Options given on the batch command line (e.g., --qa, -p, --user_cal) apply to
+all jobs, and are overridden by those on each line.
+
+Jobs that share all their options but the input files are grouped, and handed
+to the workers in consecutive chunks. The workers are long-lived, so the
+interpreter, the astrodata/instrument imports and the recipe and primitive
+modules found by the mappers stay loaded from one job to the next.
+
+Every job writes its own log file, named after the batch log file, and the
+job's number and first input (e.g., reduce_0003_N20170913S0201.log). A
+summary with the exit status of every job is logged at the end.
+""".format(_version)
+# ---------------------------- Package Import ----------------------------------
+import os
+import time
+import shlex
+import signal
+import logging
+import traceback
+import multiprocessing
+
+from copy import deepcopy
+
+from gempy.utils import logutils
+
+from geminidr import parallel
+
+from recipe_system.config import globalConf, PARALLEL_SECTION
+
+from recipe_system.reduction.coreReduce import Reduce
+
+from recipe_system.utils.reduce_utils import buildParser
+from recipe_system.utils.reduce_utils import normalize_args
+from recipe_system.utils.reduce_utils import normalize_upload
+
+# ------------------------------------------------------------------------------
+log = logutils.get_logger(__name__)
+# ------------------------------------------------------------------------------
+# Options that make two jobs "compatible", i.e., everything but the inputs.
+GROUPING_OPTIONS = ('adpkg', 'drpkg', 'mode', 'recipename', 'userparam',
+                    'user_cal', 'upload', 'suffix')
+
+def _init_worker():
+    """
+    Initializer for the batch worker processes. The batch already runs one
+    job per CPU, so the primitives shouldn't spread their work over more
+    threads.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    globalConf.update(PARALLEL_SECTION, {'workers': 1})
+
+def _set_log(logfile, logmode):
+    """
+    Sends the log to a new file, closing the current one. logutils.config()
+    only drops the handlers, which would leak a file per job.
+    """
+    rootlog = logging.getLogger('')
+    for handler in rootlog.handlers:
+        handler.close()
+    logutils.config(mode=logmode, file_name=logfile)
+
+def _run_job(job):
+    """
+    Runs one reduce job in the current (worker) process.
+
+    Parameters
+    ----------
+    job : <BatchJob>
+
+    Returns
+    -------
+    <tuple> : (job number, exit status, elapsed time in seconds)
+
+    """
+    start = time.time()
+    # Jobs run side by side, so they only write to their own log file
+    _set_log(job.args.logfile, 'debug' if job.args.logmode == 'debug' else 'quiet')
+    try:
+        xstat = Reduce(job.args).runr()
+    except KeyboardInterrupt:
+        xstat = signal.SIGINT
+    except Exception as err:
+        logutils.get_logger(__name__).error(traceback.format_exc())
+        xstat = signal.SIGABRT
+    finally:
+        # Don't keep the job's extension pools alive in the idle worker
+        parallel.shutdown()
+    return job.number, xstat, time.time() - start
+
+def _run_chunk(chunk):
+    return [_run_job(job) for job in chunk]
+
+# ------------------------------------------------------------------------------
+class BatchJob(object):
+    """
+    One line of a batch manifest: the job number, the source line and the
+    reduce arguments (an argparse Namespace) for the job. If the line can't
+    be parsed, `args` is None and `error` gives the reason.
+    """
+    def __init__(self, number, line, args=None, error=None):
+        self.number = number
+        self.line   = line
+        self.args   = args
+        self.error  = error
+
+    @property
+    def name(self):
+        if self.args is not None and self.args.files:
+            return os.path.splitext(os.path.basename(self.args.files[0]))[0]
+        return 'job'
+
+    @property
+    def group_key(self):
+        return tuple(str(getattr(self.args, opt, None))
+                     for opt in GROUPING_OPTIONS)
+
+class BatchReduce(object):
+    """
+    The BatchReduce class runs the jobs listed in a batch manifest, using a
+    pool of worker processes. __init__ receives the parsed reduce arguments,
+    whose 'batch' attribute is the path to the manifest, and 'jobs' the
+    number of worker processes (None => one per CPU).
+
+    """
+    def __init__(self, sys_args):
+        self.args     = sys_args
+        self.manifest = sys_args.batch
+        self.nworkers = sys_args.jobs
+        if self.nworkers is None:
+            try:
+                self.nworkers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                self.nworkers = 1
+        self.nworkers = max(int(self.nworkers), 1)
+
+    def runr(self):
+        """
+        Run all the jobs in the manifest and log a summary.
+
+        Returns
+        -------
+        xstat : <int> exit code. 0 if all the jobs succeeded, or the exit code
+                of the first job that failed.
+
+        """
+        try:
+            jobs = self.read_manifest()
+        except IOError as err:
+            log.error(str(err))
+            return signal.SIGIO
+
+        if not jobs:
+            log.error("No jobs found in batch manifest {}".format(self.manifest))
+            return signal.SIGIO
+
+        results = {}
+        for job in jobs:
+            if job.args is None:
+                log.error("Batch job {} ({}): {}".format(job.number, job.line,
+                                                         job.error))
+                results[job.number] = (job.number, signal.SIGIO, 0.)
+
+        runnable = [job for job in jobs if job.args is not None]
+        chunks = self._chunks(runnable)
+        log.stdinfo("Running {} jobs from {}, {} at a time".format(
+            len(runnable), self.manifest, min(self.nworkers, len(chunks) or 1)))
+
+        if self.nworkers == 1 or len(chunks) < 2:
+            for chunk in chunks:
+                for job in chunk:
+                    result = _run_job(job)
+                    # The job has taken over the logging; give it back
+                    self._restore_log()
+                    self._finished(jobs, results, result)
+        else:
+            pool = multiprocessing.Pool(self.nworkers, _init_worker)
+            try:
+                for chunk_results in pool.imap_unordered(_run_chunk, chunks):
+                    for result in chunk_results:
+                        self._finished(jobs, results, result)
+                pool.close()
+            except KeyboardInterrupt:
+                log.error("Caught KeyboardInterrupt (^C) signal")
+                pool.terminate()
+                return signal.SIGINT
+            finally:
+                pool.join()
+
+        return self._summary(jobs, results)
+
+    def read_manifest(self):
+        """
+        Parses the manifest into a list of BatchJob objects. Each job starts
+        from a copy of the batch arguments (minus the input files), updated
+        with the arguments on its line.
+
+        Returns
+        -------
+        <list> of <BatchJob>
+
+        """
+        if not os.access(self.manifest, os.R_OK):
+            raise IOError("Cannot read batch manifest: {}".format(self.manifest))
+
+        base = deepcopy(self.args)
+        base.files = []
+        base.batch = None
+        base.jobs  = None
+
+        logroot, logext = os.path.splitext(self.args.logfile)
+        parser = buildParser(_version)
+        jobs = []
+        with open(self.manifest) as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                number = len(jobs) + 1
+                try:
+                    args = parser.parse_args(shlex.split(line, comments=True),
+                                             namespace=deepcopy(base))
+                except SystemExit:
+                    # argparse has already written the reason to stderr
+                    jobs.append(BatchJob(number, line, error="invalid arguments"))
+                    continue
+
+                args = normalize_args(args)
+                args.upload = normalize_upload(args.upload)
+                if not args.files:
+                    jobs.append(BatchJob(number, line, error="no input files"))
+                    continue
+                job = BatchJob(number, line, args)
+                args.logfile = "{}_{:04d}_{}{}".format(logroot, number, job.name,
+                                                       logext or '.log')
+                jobs.append(job)
+
+        return jobs
+
+    # -------------------------------- prive -----------------------------------
+    def _chunks(self, jobs):
+        """
+        Groups compatible jobs, and splits the groups in chunks to be sent to
+        the workers, small enough to keep all the workers busy.
+        """
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job.group_key, []).append(job)
+
+        chunks = []
+        for key in sorted(groups):
+            group = groups[key]
+            size = max(1, len(group) // (4 * self.nworkers))
+            chunks.extend(group[i:i+size] for i in range(0, len(group), size))
+        return chunks
+
+    def _finished(self, jobs, results, result):
+        results[result[0]] = result
+        job = jobs[result[0] - 1]
+        log.stdinfo("Batch job {} ({}) finished with status {}".format(
+            job.number, job.name, result[1]))
+
+    def _restore_log(self):
+        global log
+        _set_log(self.args.logfile, self.args.logmode)
+        log = logutils.get_logger(__name__)
+
+    def _summary(self, jobs, results):
+        xstat = 0
+        failed = 0
+        log.stdinfo("")
+        log.stdinfo("Batch summary for {}".format(self.manifest))
+        log.stdinfo("-" * 80)
+        log.stdinfo("{:>5}  {:<30} {:>6} {:>9}  {}".format(
+            "Job", "Name", "Status", "Time (s)", "Log"))
+        for job in jobs:
+            number, status, elapsed = results.get(job.number,
+                                                  (job.number, signal.SIGABRT, 0.))
+            logfile = job.args.logfile if job.args is not None else '-'
+            log.stdinfo("{:>5}  {:<30} {:>6} {:>9.1f}  {}".format(
+                number, job.name[:30], status, elapsed, logfile))
+            if status != 0:
+                failed += 1
+                if xstat == 0:
+                    xstat = status
+        log.stdinfo("-" * 80)
+        log.stdinfo("{} jobs, {} succeeded, {} failed".format(
+            len(jobs), len(jobs) - failed, failed))
+        return xstat
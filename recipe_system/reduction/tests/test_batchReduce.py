@@ -0,0 +1,123 @@
+# pytest suite
+"""
+Tests for the reduce --batch mode (BatchReduce), without running any
+reduction.
+
+To run:
+    1) py.test -v --capture=no
+"""
+import os
+
+import pytest
+
+from recipe_system.reduction import batchReduce
+from recipe_system.reduction.batchReduce import BatchReduce, _version
+from recipe_system.utils.reduce_utils import buildParser
+from recipe_system.utils.reduce_utils import normalize_args
+
+MANIFEST = """\
+# Flats first
+
+N20170913S0153.fits N20170913S0154.fits -r makeProcessedFlat
+   # indented comment
+N20170913S0200.fits -p stackFrames:reject_method=minmax
+N20170913S0201.fits --nosuchoption
+-r makeProcessedBias
+N20170913S0202.fits --suffix _line   # trailing comment
+"""
+
+def batch_args(tmpdir, manifest, *options):
+    path = str(tmpdir.join('batch.lst'))
+    with open(path, 'w') as fd:
+        fd.write(manifest)
+    args = buildParser(_version).parse_args(['--batch', path,
+                                             '--logfile',
+                                             str(tmpdir.join('batch.log'))]
+                                            + list(options))
+    return normalize_args(args)
+
+class TestBatchReduce:
+    """
+    Suite of tests for the manifest parsing, grouping and reporting of
+    BatchReduce.
+    """
+    def test_read_manifest(self, tmpdir):
+        jobs = BatchReduce(batch_args(tmpdir, MANIFEST)).read_manifest()
+        # Comments and blank lines are not jobs
+        assert [job.number for job in jobs] == [1, 2, 3, 4, 5]
+        assert jobs[0].args.files == ['N20170913S0153.fits',
+                                      'N20170913S0154.fits']
+        assert jobs[0].args.recipename == 'makeProcessedFlat'
+        assert jobs[1].args.userparam == ['stackFrames:reject_method=minmax']
+        assert jobs[4].args.files == ['N20170913S0202.fits']
+        assert jobs[4].args.suffix == '_line'
+
+    def test_bad_lines_reported(self, tmpdir):
+        jobs = BatchReduce(batch_args(tmpdir, MANIFEST)).read_manifest()
+        assert jobs[2].args is None
+        assert jobs[2].error == "invalid arguments"
+        assert jobs[2].line == "N20170913S0201.fits --nosuchoption"
+        assert jobs[3].args is None
+        assert jobs[3].error == "no input files"
+        assert all(job.args is not None for job in jobs[:2] + jobs[4:])
+
+    def test_line_options_override(self, tmpdir):
+        args = batch_args(tmpdir, MANIFEST, '-r', 'reduceScience',
+                          '--suffix', '_batch', '--qa')
+        jobs = BatchReduce(args).read_manifest()
+        assert jobs[0].args.recipename == 'makeProcessedFlat'
+        assert jobs[1].args.recipename == 'reduceScience'
+        assert jobs[1].args.suffix == '_batch'
+        assert jobs[4].args.suffix == '_line'
+        assert all(job.args.mode == jobs[0].args.mode
+                   for job in jobs if job.args is not None)
+        # The batch inputs and settings are not passed to the jobs
+        assert all(job.args.batch is None and job.args.jobs is None
+                   for job in jobs if job.args is not None)
+
+    def test_log_files(self, tmpdir):
+        jobs = BatchReduce(batch_args(tmpdir, MANIFEST)).read_manifest()
+        assert os.path.basename(jobs[0].args.logfile) == \
+               'batch_0001_N20170913S0153.log'
+        assert os.path.basename(jobs[4].args.logfile) == \
+               'batch_0005_N20170913S0202.log'
+
+    def test_grouping_and_chunks(self, tmpdir):
+        lines = ["S{:04d}.fits".format(i) for i in range(20)]
+        lines += ["F{:04d}.fits -r makeProcessedFlat".format(i)
+                  for i in range(6)]
+        args = batch_args(tmpdir, "\n".join(lines), '--jobs', '2')
+        batch = BatchReduce(args)
+        jobs = batch.read_manifest()
+        assert len(set(job.group_key for job in jobs)) == 2
+
+        chunks = batch._chunks(jobs)
+        # Chunks only hold compatible jobs, in manifest order
+        for chunk in chunks:
+            assert len(set(job.group_key for job in chunk)) == 1
+            numbers = [job.number for job in chunk]
+            assert numbers == sorted(numbers)
+        assert sorted(job.number for chunk in chunks for job in chunk) == \
+               list(range(1, 27))
+        # 4 chunks per worker, for each group
+        sizes = sorted(len(chunk) for chunk in chunks)
+        assert sizes == [1] * 6 + [2] * 10
+
+        batch.nworkers = 1
+        assert sorted(len(chunk) for chunk in batch._chunks(jobs)) == \
+               [1, 1, 1, 1, 1, 1, 5, 5, 5, 5]
+
+    def test_serial_run_reports_jobs(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(batchReduce, '_run_job',
+                            lambda job: (job.number, job.number % 2, 0.5))
+        args = batch_args(tmpdir, MANIFEST, '--jobs', '1')
+        assert BatchReduce(args).runr() == 1
+
+        with open(args.logfile) as fd:
+            text = fd.read()
+        for number, name, status in ((1, 'N20170913S0153', 1),
+                                     (2, 'N20170913S0200', 0),
+                                     (5, 'N20170913S0202', 1)):
+            assert "Batch job {} ({}) finished with status {}".format(
+                number, name, status) in text
+        assert "5 jobs, 1 succeeded, 4 failed" in text
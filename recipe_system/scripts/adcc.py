@@ -32,6 +32,14 @@ def buildArgs():
                         "i.e. http://localhost:<http-port>. "
                         "Default is 8777.")
 
+    parser.add_argument("--max-events", dest="max_events", default=None,
+                        type=int, help="Maximum number of events kept in "
+                        "memory. Older events are dropped, or moved to the "
+                        "--events-db database. Default is no limit.")
+
+    parser.add_argument("--events-db", dest="events_db", default=None,
+                        help="SQLite file for the events beyond --max-events.")
+
     args = parser.parse_args()
     return args
 
@@ -18,8 +18,6 @@ import sys
 
 from gempy.utils import logutils
 
-from recipe_system.reduction.coreReduce import Reduce
-
 from recipe_system.utils.reduce_utils import buildParser
 from recipe_system.utils.reduce_utils import normalize_args
 from recipe_system.utils.reduce_utils import normalize_upload
@@ -75,6 +73,10 @@ def main(args):
     :rtype:  <int>
 
     """
+    # Imported here, so that 'reduce -h' doesn't load the whole system
+    from recipe_system.reduction.coreReduce import Reduce
+    from recipe_system.reduction.batchReduce import BatchReduce
+
     global log
     estat = 0
     log = logutils.get_logger(__name__)
@@ -89,7 +91,10 @@ def main(args):
         pass
 
     log.stdinfo("\t\t\t--- reduce, v{} ---".format(_version))
-    r_reduce = Reduce(args)
+    if getattr(args, 'batch', None):
+        r_reduce = BatchReduce(args)
+    else:
+        r_reduce = Reduce(args)
     estat = r_reduce.runr()
     if estat != 0:
         log.stdinfo("\n\nreduce exit status: %d\n" % estat)
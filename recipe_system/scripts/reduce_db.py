@@ -20,6 +20,8 @@ from recipe_system.cal_service import load_calconf, update_calconf, get_calconf
 from recipe_system.cal_service.localmanager import LocalManager, LocalManagerError
 from recipe_system.cal_service.localmanager import ERROR_CANT_WIPE, ERROR_CANT_CREATE
 from recipe_system.cal_service.localmanager import ERROR_CANT_READ, ERROR_DIDNT_FIND
+from recipe_system.cal_service.localmanager import DEFAULT_BATCH_SIZE
+from recipe_system.cal_service.localmanager import fits_files
 import traceback
 
 def buildArgumentParser():
@@ -45,6 +47,14 @@ def buildArgumentParser():
                        help="If this option is active, directories will be "
                        "explored recursively. Otherwise, only the first "
                        "level will be searched for FITS files.")
+    p_add.add_argument('-j', '--jobs', dest='jobs', type=int, default=None,
+                       help="Number of processes reading the files (headers "
+                       "and MD5 sums) ahead of the ingestion. Default: "
+                       "number of CPUs.")
+    p_add.add_argument('-b', '--batch', dest='batch_size', type=int,
+                       default=DEFAULT_BATCH_SIZE,
+                       help="Number of files added per database transaction "
+                       "(default: {}).".format(DEFAULT_BATCH_SIZE))
 
     p_remove = sub.add_parser('remove', help="Remove files from the "
                               "calibration database. One or more files "
@@ -111,26 +121,33 @@ class Dispatcher(object):
             print("The 'standalone' flag is not active, meaning that remote calibrations will be downloaded")
 
     def _action_add(self, args):
+        paths = []
         for path in args.files:
-            try:
-                if isdir(path):
-                    # Do something about verbose...
-                    if args.walk:
-                        m = "Ingesting the files under {0}".format(path)
-                    else:
-                        m = "Ingesting the files at {0}".format(path)
-                    self._log(m)
-                    self._mgr.ingest_directory(path, walk=args.walk,
-                                               log=self._log)
+            if isdir(path):
+                # Do something about verbose...
+                if args.walk:
+                    m = "Ingesting the files under {0}".format(path)
                 else:
-                    self._mgr.ingest_file(path)
-                    self._log("Ingested {0}".format(path))
-            except IOError as e:
-                traceback.print_last()
-                print(e, file=sys.stderr)
-                return -1
+                    m = "Ingesting the files at {0}".format(path)
+                self._log(m)
+                paths.extend(fits_files(path, walk=args.walk))
+            else:
+                paths.append(path)
 
-        return 0
+        try:
+            stats = self._mgr.ingest_files(paths, jobs=args.jobs,
+                                           batch_size=args.batch_size,
+                                           log=self._log)
+        except IOError as e:
+            traceback.print_last()
+            print(e, file=sys.stderr)
+            return -1
+
+        rate = stats.files / stats.seconds if stats.seconds > 0 else 0
+        print("{s.ingested} files added, {s.skipped} unchanged, {s.failed} "
+              "failed, in {s.seconds:.1f}s ({rate:.1f} files/s)".format(
+                  s=stats, rate=rate))
+        return 1 if stats.failed else 0
 
     def _action_remove(self, args):
         for path in args.files:
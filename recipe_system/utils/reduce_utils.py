@@ -9,8 +9,7 @@ __version__ = "2.0.0 (beta)"
 from argparse import ArgumentParser
 from argparse import HelpFormatter
 
-import astrodata
-import gemini_instruments
+from gempy.utils.lazyimport import lazy_import
 
 from .reduceActions import PosArgAction
 from .reduceActions import BooleanAction
@@ -20,6 +19,8 @@ from .reduceActions import UnitaryArgumentAction
 
 from ..cal_service import localmanager_available
 
+# Only needed to check user calibrations; 'reduce -h' shouldn't load them.
+astrodata = lazy_import('astrodata', 'gemini_instruments')
 # ------------------------------------------------------------------------------
 class ReduceHelpFormatter(HelpFormatter):
     """
@@ -91,6 +92,20 @@ def buildParser(version):
                         "The package must be importable. E.g., "
                         "--adpkg soar_instruments ")
 
+    parser.add_argument("--batch", dest='batch', default=None,
+                        nargs="*", action=UnitaryArgumentAction,
+                        help="Run the jobs listed in a manifest file, "
+                        "concurrently. Each line of the manifest is a set of "
+                        "reduce arguments (input files, -r, -p, etc.) for one "
+                        "job; options given on the command line apply to all "
+                        "the jobs, unless overridden. Lines starting with '#' "
+                        "are ignored. E.g., --batch tonight.lst ")
+
+    parser.add_argument("--jobs", dest='jobs', default=None,
+                        nargs="*", action=UnitaryArgumentAction,
+                        help="Number of jobs to run concurrently in batch mode. "
+                        "Default is the number of CPUs. E.g., --jobs 8 ")
+
     parser.add_argument("--drpkg", dest='drpkg', default='geminidr',
                         nargs="*", action=UnitaryArgumentAction,
                         help="Specify another data reduction (dr) package. "
@@ -286,6 +301,10 @@ def normalize_args(args):
         args.logfile = args.logfile[0]
     if isinstance(args.suffix, list):
         args.suffix = args.suffix[0]
+    if isinstance(args.batch, list):
+        args.batch = args.batch[0]
+    if isinstance(args.jobs, list):
+        args.jobs = int(args.jobs[0])
     return args
 
 def normalize_upload(upload):